@@ -0,0 +1,172 @@
+"""
+Opening book of moves keyed by position hash, stored as a sorted file of fixed size entries that is read through mmap
+
+The entries use the Polyglot layout (16 bytes, big-endian: 64 bit key, 16 bit move, 16 bit weight and 32 bit learn
+field) with the board's own Zobrist hash as the key and the move key (see Move.key) as the move.  Build a book from PGN
+files with:
+
+    python -m ai.book games.pgn more.pgn --output book.bin --max-ply 20
+"""
+import argparse
+import bisect
+import collections
+import mmap
+import os
+import random
+import struct
+
+from board import Board
+from util.pgn import open_games
+
+ENTRY = struct.Struct('>QHHI')
+
+
+class OpeningBook:
+    """
+    Book file mapped into memory so the processes that open the same book share one copy of its pages
+    """
+    def __init__(self, path):
+        """ initializer
+
+        :param path: path of the book file
+        :return:
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size % ENTRY.size:
+            self._file.close()
+            raise ValueError("'{}' is not a book: its size is not a multiple of {} bytes".format(path, ENTRY.size))
+        # an empty file can't be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._keys = _Keys(self._map)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __reduce__(self):
+        # worker processes map the file again instead of copying it
+        return self.__class__, (self.path,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Unmap and close the book file
+
+        :return: None
+        """
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def entries(self, key):
+        """ Find the entries of a position by binary search
+
+        :param key: position hash
+        :return: list of (move key, weight)
+        """
+        entries = []
+        for i in range(bisect.bisect_left(self._keys, key), len(self._keys)):
+            entry_key, move, weight, _ = ENTRY.unpack_from(self._map, i * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((move, weight))
+        return entries
+
+    def moves(self, board):
+        """ Get the book moves of the current position that are valid moves
+
+        :param board: Board class
+        :return: list of (Move, weight)
+        """
+        weights = dict(self.entries(board.hash))
+        if not weights:
+            self.misses += 1
+            return []
+        self.hits += 1
+        return [(move, weights[move.key]) for move in board.valid_moves() if move.key in weights]
+
+    def choose(self, board, seed=None):
+        """ Pick one of the book moves of the current position with a chance in proportion to its weight
+
+        :param board: Board class
+        :param seed: seed for the choice so the same position gives the same move
+        :return: Move or None when the position is not in the book
+        """
+        moves = [(move, weight) for move, weight in self.moves(board) if weight > 0]
+        if not moves:
+            return None
+        # the order of the valid moves depends on the order pieces were moved so sort them first
+        moves.sort(key=lambda m: m[0].key)
+        rng = random if seed is None else random.Random(seed)
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+
+class _Keys:
+    """
+    Sequence of the keys of a book's entries for bisect
+    """
+    def __init__(self, data):
+        self._data = data
+        self._length = len(data) // ENTRY.size
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        return ENTRY.unpack_from(self._data, i * ENTRY.size)[0]
+
+
+def build(games, path, max_ply=20, board_class=Board):
+    """ Write a book of the moves played in the first moves of games
+
+    A move is weighted by the results it led to for the side that played it: 2 for a win, 1 for a draw (or an unknown
+    result) and 0 for a loss.  Weights are scaled down to fit in 16 bits.  Only the moves of a game before one that
+    can't be read or played are added.
+
+    :param games: iterable of Game (see util.pgn)
+    :param path: path of the book file to write
+    :param max_ply: number of moves of each game to add
+    :param board_class: class of board to replay on
+    :return: number of entries written
+    """
+    weights = collections.Counter()
+    for game in games:
+        points = {'1-0': (2, 0), '0-1': (0, 2)}.get(game.result, (1, 1))
+        try:
+            board = game.board(board_class)
+            key, player = board.hash, board.current_player
+            for ply, (board, move, _) in enumerate(game.replay(board_class)):
+                if ply >= max_ply:
+                    break
+                weights[key, move.key] += points[player.value]
+                key, player = board.hash, board.current_player
+        except ValueError:
+            # an illegal move (PGNError) or a bad FEN tag: keep the moves played before it
+            pass
+
+    scale = max(1, -(-max(weights.values(), default=0) // 0xFFFF))
+    with open(path, 'wb') as f:
+        for (key, move), weight in sorted(weights.items()):
+            f.write(ENTRY.pack(key, move, -(-weight // scale), 0))
+    return len(weights)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='PGN files')
+    parser.add_argument('--output', required=True, help='book file to write')
+    parser.add_argument('--max-ply', type=int, default=20, help='number of moves of each game to add')
+    args = parser.parse_args()
+    entries = build((game for path in args.paths for game in open_games(path)), args.output, args.max_ply)
+    print('wrote {} entries to {}'.format(entries, args.output))
+
+
+if __name__ == '__main__':
+    main()
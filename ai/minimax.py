@@ -1,4 +1,344 @@
 # http://en.wikipedia.org/wiki/Alpha%E2%80%93beta_pruning
+import contextlib
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from ai.transposition import TranspositionTable
+from util.enums import Bound
+
+MAX_DEPTH = 64  # deepest iteration of iterative deepening when only a time limit is given
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time budget runs out
+    """
+    pass
+
+
+class SearchStats:
+    """
+    Counts the work done by a search and optionally profiles it
+
+    The search reports every node it enters and leaves so callbacks can watch the search (raising SearchTimeout from
+    on_enter stops it and restores the board).  Use capture() around the search to also count the move generation
+    of the board, time the search and run the profilers.
+    """
+    def __init__(self, on_enter=None, on_exit=None, profile=False, trace_memory=False):
+        """ initializer
+
+        :param on_enter: callback(game, depth, alpha, beta) called when the search enters a node
+        :param on_exit: callback(game, depth, score) called when the search leaves a node
+        :param profile: run cProfile while capturing (see profile_report)
+        :param trace_memory: trace memory allocations with tracemalloc while capturing (see memory_report)
+        :return:
+        """
+        self.on_enter = on_enter
+        self.on_exit = on_exit
+        self.profile = cProfile.Profile() if profile else None
+        self.trace_memory = trace_memory
+        self.nodes = 0  # positions searched by alphabeta (including leaves and transposition table cutoffs)
+        self.leaves = 0  # positions evaluated because the game is over or the maximum depth is reached
+        self.cutoffs = []  # nodes pruned indexed by [ply]
+        self.table_probes = 0  # transposition table lookups
+        self.table_hits = 0  # lookups that found the position
+        self.table_cutoffs = 0  # lookups that ended the search of the position
+        self.tablebase_hits = 0  # positions scored from the endgame tables
+        self.move_generations = 0  # valid move generations of the board (captured positions only)
+        self.legal_checks = 0  # moves checked for legality by the board (captured positions only)
+        self.make_unmake = 0  # moves made and undone to check their legality (captured positions only)
+        self.seconds = 0.0  # time spent capturing
+        self.position = None  # encoded root position of the last capture (hex string)
+        self.memory_peak = None  # peak traced memory in bytes of the last capture
+        self.memory_snapshot = None  # tracemalloc snapshot taken at the end of the last capture
+
+    def enter(self, game, depth, alpha, beta):
+        """ Record that the search entered a node
+
+        :param game: game object being searched
+        :param depth: current depth in tree
+        :param alpha: minimum score maximizing player will get
+        :param beta: maximum score minimizing player will get
+        :return: None
+        """
+        self.nodes += 1
+        if self.on_enter is not None:
+            self.on_enter(game, depth, alpha, beta)
+
+    def exit(self, game, depth, score):
+        """ Record that the search left a node
+
+        :param game: game object being searched
+        :param depth: current depth in tree
+        :param score: score of the node
+        :return: None
+        """
+        if self.on_exit is not None:
+            self.on_exit(game, depth, score)
+
+    def cutoff(self, ply):
+        """ Record a node that was pruned
+
+        :param ply: depth in the search tree
+        :return: None
+        """
+        while len(self.cutoffs) <= ply:
+            self.cutoffs.append(0)
+        self.cutoffs[ply] += 1
+
+    @contextlib.contextmanager
+    def capture(self, game):
+        """ Context manager that attaches the stats to a game so its move generation is counted, times the search
+        and runs the profilers that are enabled
+
+        :param game: board to search
+        :return: context manager
+        """
+        previous = game.stats
+        game.stats = self
+        self.position = game.encode().hex() if hasattr(game, 'encode') else None
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if self.profile is not None:
+            self.profile.enable()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.seconds += time.perf_counter() - start
+            if self.profile is not None:
+                self.profile.disable()
+            if self.trace_memory:
+                self.memory_peak = tracemalloc.get_traced_memory()[1]
+                self.memory_snapshot = tracemalloc.take_snapshot()
+            if tracing:
+                tracemalloc.stop()
+            game.stats = previous
+
+    def profile_report(self, limit=20, sort='cumulative'):
+        """ Get the profile of the captured searches
+
+        :param limit: number of functions to list
+        :param sort: pstats sort key
+        :return: str
+        """
+        if self.profile is None:
+            raise ValueError('profiling is not enabled')
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def memory_report(self, limit=10):
+        """ Get the lines that allocated the most memory during the last capture
+
+        :param limit: number of lines to list
+        :return: str
+        """
+        if self.memory_snapshot is None:
+            raise ValueError('memory tracing is not enabled')
+        lines = ['peak: {} bytes'.format(self.memory_peak)]
+        for stat in self.memory_snapshot.statistics('lineno')[:limit]:
+            lines.append(str(stat))
+        return '\n'.join(lines)
+
+    def stats(self):
+        """ Get the counters
+
+        :return: dict
+        """
+        return {
+            'nodes': self.nodes,
+            'leaves': self.leaves,
+            'cutoffs': list(self.cutoffs),
+            'table_probes': self.table_probes,
+            'table_hits': self.table_hits,
+            'table_cutoffs': self.table_cutoffs,
+            'tablebase_hits': self.tablebase_hits,
+            'move_generations': self.move_generations,
+            'legal_checks': self.legal_checks,
+            'make_unmake': self.make_unmake,
+            'seconds': self.seconds,
+            'position': self.position,
+        }
+
+
+class MoveOrdering:
+    """
+    Orders moves so the moves most likely to cause a cutoff are searched first and keeps the killer moves, history
+    table and cutoff statistics of one search
+
+    Order: transposition table move, captures by most valuable victim / least valuable attacker (MVV-LVA),
+    promotions, killer moves of the ply, then quiet moves by history score.
+    """
+    KILLERS = 2  # killer moves kept per ply
+    TABLE_MOVE = 3000000
+    CAPTURE = 2000000
+    PROMOTION = 1500000
+    KILLER = 1000000
+    KING_ATTACKER = 10  # attacker value of the king for LVA (its VALUE of 0 would put its captures first)
+
+    def __init__(self):
+        """ initializer
+
+        :return:
+        """
+        self.killers = []  # killer move keys indexed by [ply]
+        self.history = {}  # history score keyed by (player value, move key)
+        self.cutoffs = 0  # nodes that were pruned
+        self.first_move_cutoffs = 0  # nodes that were pruned by the first move searched
+
+    def score(self, move, ply, table_move=None):
+        """ Get the ordering score of a move (higher is searched first)
+
+        :param move: Move class
+        :param ply: depth in the search tree
+        :param table_move: move key of the transposition table's best move
+        :return: integer
+        """
+        key = move.key
+        if key == table_move:
+            return self.TABLE_MOVE
+        if move.captured_piece is not None:
+            return self.CAPTURE + 10 * move.captured_piece.VALUE - (move.piece.VALUE or self.KING_ATTACKER)
+        if move.promotion:
+            return self.PROMOTION + move.promotion_piece_class.VALUE
+        if ply < len(self.killers) and key in self.killers[ply]:
+            return self.KILLER
+        return self.history.get((move.piece.player.value, key), 0)
+
+    def order(self, moves, ply, table_move=None):
+        """ Sort moves in place so the most promising are first
+
+        :param moves: list of moves
+        :param ply: depth in the search tree
+        :param table_move: move key of the transposition table's best move
+        :return: None
+        """
+        moves.sort(key=lambda m: self.score(m, ply, table_move), reverse=True)
+
+    def cutoff(self, move, ply, index, remaining):
+        """ Record the move that caused a node to be pruned
+
+        :param move: Move class
+        :param ply: depth in the search tree
+        :param index: position of the move in the ordered moves
+        :param remaining: depth left to search below the node
+        :return: None
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        if move.captured_piece is None and not move.promotion:
+            key = move.key
+            while len(self.killers) <= ply:
+                self.killers.append([])
+            killers = self.killers[ply]
+            if key not in killers:
+                killers.insert(0, key)
+                del killers[self.KILLERS:]
+            history_key = (move.piece.player.value, key)
+            self.history[history_key] = self.history.get(history_key, 0) + remaining * remaining
+
+    @property
+    def cutoff_rate(self):
+        """ Fraction of pruned nodes that were pruned by the first move searched
+
+        :return: float
+        """
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def stats(self):
+        """ Get the cutoff statistics
+
+        :return: dict
+        """
+        return {
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'cutoff_rate': self.cutoff_rate,
+        }
+
+
+class Quiescence:
+    """
+    Extends the search past the horizon with captures and promotions until the position is quiet so the heuristic is
+    not taken in the middle of an exchange
+
+    The side to move may stand pat (keep the heuristic value) instead of capturing.  A side in check searches all of
+    its moves since standing pat is not an option.
+    """
+    def __init__(self, max_depth=8):
+        """ initializer
+
+        :param max_depth: maximum number of plies to extend past the horizon
+        :return:
+        """
+        self.max_depth = max_depth
+        self.nodes = 0  # nodes searched by the quiescence search
+
+    def search(self, game, player, depth, alpha, beta, ordering=None, ply=0):
+        """ Search captures and promotions from a position at the horizon
+
+        :param game: game object with heuristic_value, valid_moves and check
+        :param player: maximizing player
+        :param depth: current depth in tree
+        :param alpha: minimum score maximizing player will get
+        :param beta: maximum score minimizing player will get
+        :param ordering: MoveOrdering used to order the moves (defaults to most valuable capture first)
+        :param ply: plies searched past the horizon
+        :return: score
+        """
+        self.nodes += 1
+        maximizing = game.current_player == player
+        stand_pat = game.heuristic_value(player, depth)
+        in_check = game.check(game.current_player)
+        if ply >= self.max_depth:
+            return stand_pat
+
+        if in_check:
+            best_score = -float('inf') if maximizing else float('inf')
+            moves = list(game.valid_moves())
+            if not moves:
+                return stand_pat
+        else:
+            # standing pat is at least as good as the heuristic value
+            best_score = stand_pat
+            if maximizing:
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha, stand_pat)
+            else:
+                if stand_pat <= alpha:
+                    return stand_pat
+                beta = min(beta, stand_pat)
+            moves = [m for m in game.valid_moves() if m.captured_piece is not None or m.promotion]
+
+        if ordering is not None:
+            ordering.order(moves, depth)
+        else:
+            moves.sort(key=lambda m: 0 if m.captured_piece is None else m.captured_piece.VALUE, reverse=True)
+
+        for move in moves:
+            game.move(move)
+            try:
+                score = self.search(game, player, depth + 1, alpha, beta, ordering, ply + 1)
+            finally:
+                game.undo_move()
+
+            if maximizing:
+                best_score = max(best_score, score)
+                alpha = max(alpha, score)
+            else:
+                best_score = min(best_score, score)
+                beta = min(beta, score)
+            if alpha >= beta:
+                break
+        return best_score
 
 
 def minimax(game, player, depth, max_depth):
@@ -29,7 +369,8 @@ def minimax(game, player, depth, max_depth):
     return best_score, best_moves
 
 
-def alphabeta(game, player, depth, max_depth, alpha, beta):
+def alphabeta(game, player, depth, max_depth, alpha, beta, table=None, deadline=None, ordering=None,
+              quiescence=None, stats=None, tablebases=None):
     """ Alpha beta minimax algorithm
 
     :param game: game object with game_over, heuristic_value, and valid_moves methods
@@ -38,25 +379,92 @@ def alphabeta(game, player, depth, max_depth, alpha, beta):
     :param max_depth: maximum depth in tree to search
     :param alpha: minimum score maximizing player will get
     :param beta: maximum score minimizing player will get
+    :param table: TranspositionTable used to reuse results of positions already searched (game needs a hash)
+    :param deadline: time.monotonic() value after which SearchTimeout is raised (the game is restored first)
+    :param ordering: MoveOrdering used to order the moves of each node
+    :param quiescence: Quiescence used to search captures and promotions past max_depth (defaults to the heuristic)
+    :param stats: SearchStats that counts the work of the search and is told when nodes are entered and left
+    :param tablebases: Tablebases whose exact scores end the search of the positions in its tables
     :return:  score, list of moves
     """
+    if deadline is not None and time.monotonic() >= deadline:
+        raise SearchTimeout()
+    if stats is not None:
+        stats.enter(game, depth, alpha, beta)
+
+    entry = None
+    if table is not None:
+        key = game.hash
+        alpha_original, beta_original = alpha, beta
+        entry = table.probe(key)
+        if stats is not None:
+            stats.table_probes += 1
+            stats.table_hits += entry is not None
+        # a stored result that searched at least as deep can end the search (the root still needs its moves); the
+        # evaluation divides by the ply it is made at so a score stored at another ply only gives its move
+        if entry is not None and depth > 0 and entry.depth >= max_depth - depth and entry.ply == depth:
+            score, bound = _flip(entry.score, entry.bound, game.current_player == player)
+            if bound is Bound.EXACT or \
+                    (bound is Bound.LOWER and score >= beta) or (bound is Bound.UPPER and score <= alpha):
+                if stats is not None:
+                    stats.table_cutoffs += 1
+                    stats.exit(game, depth, score)
+                return score, []
+
     # base case - game over or depth exceeded
-    if game.game_over() or depth >= max_depth:
-        return game.heuristic_value(player, depth), []
+    game_over = game.game_over()
+    if tablebases is not None and depth > 0 and not game_over:
+        # an ending in the tables is scored exactly (the root still needs its moves)
+        score = tablebases.score(game, player, depth)
+        if score is not None:
+            if stats is not None:
+                stats.tablebase_hits += 1
+                stats.exit(game, depth, score)
+            return score, []
+    if game_over or depth >= max_depth:
+        if stats is not None:
+            stats.leaves += 1
+        if quiescence is not None and not game_over:
+            # the search window bounds the quiescence score
+            score = quiescence.search(game, player, depth, alpha, beta, ordering)
+            if score <= alpha:
+                bound = Bound.UPPER
+            elif score >= beta:
+                bound = Bound.LOWER
+            else:
+                bound = Bound.EXACT
+        else:
+            score = game.heuristic_value(player, depth)
+            bound = Bound.EXACT
+        if table is not None:
+            stored, bound = _flip(score, bound, game.current_player == player)
+            table.store(key, max_depth - depth, bound, stored, ply=depth)
+        if stats is not None:
+            stats.exit(game, depth, score)
+        return score, []
+
+    moves = list(game.valid_moves())
+    if ordering is not None:
+        ordering.order(moves, depth, None if entry is None else entry.move)
+    elif entry is not None:
+        # try the stored best move first
+        moves.sort(key=lambda m: m.key != entry.move)
 
     # init best score to worst possible
     best_score = -float('inf') if game.current_player == player else float('inf')
     best_moves = []
 
     # loop all moves
-    for move in list(game.valid_moves()):
+    for index, move in enumerate(moves):
         # make move
         game.move(move)
-        # recurse
-        score, _ = alphabeta(game, player, depth+1, max_depth, alpha, beta)
-
-        # undo moves
-        game.undo_move()
+        try:
+            # recurse
+            score, _ = alphabeta(game, player, depth+1, max_depth, alpha, beta, table, deadline, ordering,
+                                 quiescence, stats, tablebases)
+        finally:
+            # undo moves
+            game.undo_move()
 
         # save the best scores
         if game.current_player == player:
@@ -76,6 +484,106 @@ def alphabeta(game, player, depth, max_depth, alpha, beta):
 
         # prune branch if the minimum score the max player gets exceeds the max score the min player gets
         if alpha >= beta:
+            if ordering is not None:
+                ordering.cutoff(move, depth, index, max_depth - depth)
+            if stats is not None:
+                stats.cutoff(depth)
             break
 
-    return best_score, best_moves
\ No newline at end of file
+    if table is not None:
+        if best_score <= alpha_original:
+            bound = Bound.UPPER
+        elif best_score >= beta_original:
+            bound = Bound.LOWER
+        else:
+            bound = Bound.EXACT
+        score, bound = _flip(best_score, bound, game.current_player == player)
+        table.store(key, max_depth - depth, bound, score, best_moves[0].key, depth)
+
+    if stats is not None:
+        stats.exit(game, depth, best_score)
+    return best_score, best_moves
+
+
+def iterative_deepening(game, player, max_depth=None, time_limit=None, table=None, ordering=None, quiescence=None,
+                        stats=None, tablebases=None, on_iteration=None):
+    """ Search with alpha beta at increasing depths until the maximum depth is searched or the time limit runs out
+
+    Each iteration stores its results in the transposition table so the next iteration tries the previous best line
+    first (every node on the line tries its stored best move first).  The first iteration always completes.
+
+    :param game: game object with game_over, heuristic_value, valid_moves and hash
+    :param player: maximizing player
+    :param max_depth: deepest iteration to search (defaults to MAX_DEPTH)
+    :param time_limit: seconds to search for (defaults to no limit)
+    :param table: TranspositionTable (defaults to a new table)
+    :param ordering: MoveOrdering shared by the iterations (defaults to a new ordering)
+    :param quiescence: Quiescence used past the horizon of each iteration (defaults to the heuristic)
+    :param stats: SearchStats that counts the work of every iteration
+    :param tablebases: Tablebases that scores the endings in its tables exactly
+    :param on_iteration: callback(depth, score, moves) called when an iteration completes
+    :return: score, list of moves, depth of the last completed iteration
+    """
+    max_depth = MAX_DEPTH if max_depth is None else max_depth
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    table = TranspositionTable() if table is None else table
+    ordering = MoveOrdering() if ordering is None else ordering
+
+    score, moves = alphabeta(game, player, 0, 1, -float('inf'), float('inf'), table, ordering=ordering,
+                             quiescence=quiescence, stats=stats, tablebases=tablebases)
+    completed = 1
+    if on_iteration is not None:
+        on_iteration(completed, score, moves)
+    while moves and completed < max_depth:
+        try:
+            score, moves = alphabeta(game, player, 0, completed + 1, -float('inf'), float('inf'), table, deadline,
+                                     ordering, quiescence, stats, tablebases)
+        except SearchTimeout:
+            break
+        completed += 1
+        if on_iteration is not None:
+            on_iteration(completed, score, moves)
+    return score, moves, completed
+
+
+def principal_variation(game, table, max_length=MAX_DEPTH):
+    """ Follow the stored best moves in a transposition table from the current position
+
+    :param game: game object with valid_moves, move, undo_move and hash
+    :param table: TranspositionTable
+    :param max_length: maximum number of moves
+    :return: list of moves
+    """
+    line = []
+    seen = set()
+    while len(line) < max_length and game.hash not in seen:
+        seen.add(game.hash)
+        entry = table.probe(game.hash)
+        if entry is None or entry.move is None:
+            break
+        move = game.move_from_key(entry.move)
+        if move is None:
+            break
+        line.append(move)
+        game.move(move)
+    for _ in line:
+        game.undo_move()
+    return line
+
+
+def _flip(score, bound, maximizing):
+    """ Convert a score between the maximizing player's view used by the search and the side to move's view stored in
+    the transposition table (the conversion is its own inverse)
+
+    :param score: score
+    :param bound: Bound enum
+    :param maximizing: boolean if the side to move is the maximizing player
+    :return: score, Bound enum
+    """
+    if maximizing:
+        return score, bound
+    if bound is Bound.LOWER:
+        return -score, Bound.UPPER
+    if bound is Bound.UPPER:
+        return -score, Bound.LOWER
+    return -score, bound
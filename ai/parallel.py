@@ -0,0 +1,132 @@
+import atexit
+import concurrent.futures
+import math
+import os
+
+from ai.minimax import alphabeta, MoveOrdering
+from ai.transposition import TranspositionTable
+
+_executors = {}  # process pools kept between searches keyed by number of workers
+
+
+def executor(workers=None):
+    """ Get the process pool used by parallel searches (pools are created once and reused by later searches)
+
+    :param workers: number of worker processes (defaults to the number of cpus)
+    :return: ProcessPoolExecutor
+    """
+    workers = os.cpu_count() if workers is None else workers
+    if workers not in _executors:
+        _executors[workers] = concurrent.futures.ProcessPoolExecutor(workers)
+    return _executors[workers]
+
+
+def shutdown(workers=None):
+    """ Shut down the process pools so their worker processes exit (a later search creates a new pool)
+
+    :param workers: number of worker processes of the pool to shut down (defaults to every pool)
+    :return: None
+    """
+    for count in list(_executors) if workers is None else [workers]:
+        pool = _executors.pop(count, None)
+        if pool is not None:
+            pool.shutdown()
+
+
+atexit.register(shutdown)
+
+
+def _search_move(board_class, data, key, max_depth, alpha, quiescence, tablebases):
+    """ Search one root move in a worker process
+
+    The position is rebuilt from its encoded form and searched with a new transposition table so the result does not
+    depend on which moves the worker searched before.
+
+    :param board_class: class of the board to decode
+    :param data: position encoded with Board.encode
+    :param key: move key of the root move
+    :param max_depth: maximum depth in tree to search
+    :param alpha: minimum score the root player will get
+    :param quiescence: Quiescence copy used past max_depth (or None)
+    :param tablebases: Tablebases that scores the endings in its tables exactly (or None)
+    :return: score, quiescence nodes searched
+    """
+    game = board_class.decode(data)
+    player = game.current_player
+    game.move(game.move_from_key(key))
+    nodes = 0 if quiescence is None else quiescence.nodes
+    score, _ = alphabeta(game, player, 1, max_depth, alpha, float('inf'), TranspositionTable(),
+                         ordering=MoveOrdering(), quiescence=quiescence, tablebases=tablebases)
+    return score, 0 if quiescence is None else quiescence.nodes - nodes
+
+
+def parallel_search(game, max_depth, workers=None, table=None, ordering=None, quiescence=None, stats=None,
+                    tablebases=None):
+    """ Alpha beta search for the current player that splits the root moves between worker processes
+
+    The root moves are ordered by a one move search and the first is searched in this process to get a bound, then
+    the other moves are searched by the workers with that bound.  Results are combined in move order so the best
+    moves are the same no matter which worker finishes first.
+
+    :param game: board with encode and decode
+    :param max_depth: maximum depth in tree to search
+    :param workers: number of worker processes (defaults to the number of cpus)
+    :param table: TranspositionTable used by the search of the first move
+    :param ordering: MoveOrdering used to order the root moves and search the first move
+    :param quiescence: Quiescence used past max_depth (workers add the nodes they search)
+    :param stats: SearchStats that counts the work done in this process
+    :param tablebases: Tablebases that scores the endings in its tables exactly (workers map the same files)
+    :return: score, list of moves
+    """
+    player = game.current_player
+    moves = list(game.valid_moves())
+    if not moves or max_depth < 1:
+        return alphabeta(game, player, 0, max_depth, -float('inf'), float('inf'), table, ordering=ordering,
+                         quiescence=quiescence, stats=stats, tablebases=tablebases)
+
+    ordering = MoveOrdering() if ordering is None else ordering
+    # start from an order that only depends on the position (the generated order depends on the move history)
+    moves.sort(key=lambda m: m.key)
+    ordering.order(moves, 0)
+    if max_depth > 1:
+        # the workers only get the bound of the first move so order the moves by a one move search first
+        scores = []
+        for move in moves:
+            game.move(move)
+            try:
+                score, _ = alphabeta(game, player, 1, 1, -float('inf'), float('inf'), quiescence=quiescence,
+                                     stats=stats, tablebases=tablebases)
+            finally:
+                game.undo_move()
+            scores.append(score)
+        moves = [move for _, move in sorted(zip(scores, moves), key=lambda x: x[0], reverse=True)]
+
+    game.move(moves[0])
+    try:
+        best_score, _ = alphabeta(game, player, 1, max_depth, -float('inf'), float('inf'), table,
+                                  ordering=ordering, quiescence=quiescence, stats=stats, tablebases=tablebases)
+    finally:
+        game.undo_move()
+
+    # a move that fails low returns a score at or below the bound so keep the bound just below the score of the first
+    # move to tell moves that are as good apart from moves that are worse
+    alpha = math.nextafter(best_score, -float('inf'))
+    data = game.encode()
+    pool = executor(workers)
+    futures = [pool.submit(_search_move, game.__class__, data, move.key, max_depth, alpha, quiescence,
+                           tablebases) for move in moves[1:]]
+    best_moves = [moves[0]]
+    try:
+        for move, future in zip(moves[1:], futures):
+            score, nodes = future.result()
+            if quiescence is not None:
+                quiescence.nodes += nodes
+            if score > best_score:
+                best_score = score
+                best_moves = [move]
+            elif score == best_score:
+                best_moves.append(move)
+    finally:
+        for future in futures:
+            future.cancel()
+    return best_score, best_moves
@@ -0,0 +1,534 @@
+"""
+Endgame tables of a king and up to two pieces against a lone king, generated by retrograde analysis and read through
+mmap
+
+A table holds one byte per position for each side to move: 0 for a draw (or a position that can't occur) and otherwise
+the number of plies to mate plus one (the side with the pieces wins and the lone king loses).  Positions are indexed
+by the squares of the kings and the pieces as seen from the side with the pieces, so one table answers for both
+colours.  Castling rights are ignored.  Generate tables (the tables of the endings reached by captures and promotions
+are generated first) with:
+
+    python -m ai.tablebase KQK KRK KPK --directory tables
+
+and look up a position with:
+
+    python -m ai.tablebase --directory tables --probe '8/8/8/4k3/8/8/8/4KQ2 w - - 0 1'
+"""
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import time
+
+from board import Board
+from piece import King, Queen, Rook, Bishop, Knight, Pawn
+from util.enums import Player
+
+ORDER = (Queen, Rook, Bishop, Knight, Pawn)  # order of the pieces in a signature and in the index
+LETTERS = {Queen: 'Q', Rook: 'R', Bishop: 'B', Knight: 'N', Pawn: 'P'}
+MAX_PIECES = 2  # pieces besides the kings (4 piece endings)
+DRAWN = {(), (Bishop,), (Knight,)}  # endings that can't be won so have no table
+HEADER = struct.Struct('4s4s')  # magic and the signature padded with spaces
+MAGIC = b'TBv1'
+WIN_SCORE = 100000  # score of a won ending (less the plies to mate) below a checkmate in the heuristic
+
+_KING = [frozenset(loc.index for loc in targets) for targets in King.TARGETS]
+_KNIGHT = [frozenset(loc.index for loc in targets) for targets in Knight.TARGETS]
+_PAWN = [frozenset(loc.index for loc in targets) for targets in Pawn.ATTACKS[Player.WHITE.value]]
+_RAYS = {cls: [[[loc.index for loc in ray] for ray in rays] for rays in cls.RAYS] for cls in (Queen, Rook, Bishop)}
+
+
+def _lines(rays):
+    """ Get the squares between a square and every square a slider reaches from it on an empty board
+
+    :param rays: rays of the slider indexed by square index
+    :return: list of dicts of target square to tuple of squares between indexed by square index
+    """
+    lines = []
+    for square_rays in rays:
+        between = {}
+        for ray in square_rays:
+            for i, target in enumerate(ray):
+                between[target] = tuple(ray[:i])
+        lines.append(between)
+    return lines
+
+
+_LINES = {cls: _lines(rays) for cls, rays in _RAYS.items()}
+
+
+def parse(signature):
+    """ Get the pieces of an ending from its name
+
+    :param signature: name such as 'KQK' or 'KBNK' (the side with the pieces first)
+    :return: tuple of piece classes in ORDER
+    """
+    classes = {letter: cls for cls, letter in LETTERS.items()}
+    letters = signature.upper()
+    if len(letters) < 2 or letters[0] != 'K' or letters[-1] != 'K' or any(c not in classes for c in letters[1:-1]):
+        raise ValueError("'{}' is not an ending of a king and pieces against a lone king".format(signature))
+    pieces = tuple(sorted((classes[c] for c in letters[1:-1]), key=ORDER.index))
+    if len(pieces) > MAX_PIECES:
+        raise ValueError("'{}' has more than {} pieces besides the kings".format(signature, MAX_PIECES))
+    return pieces
+
+
+def name(pieces):
+    """ Get the name of an ending
+
+    :param pieces: piece classes of the side with the pieces
+    :return: str
+    """
+    return 'K' + ''.join(LETTERS[cls] for cls in sorted(pieces, key=ORDER.index)) + 'K'
+
+
+def dependencies(pieces):
+    """ Get the endings reached from an ending by a capture or a promotion
+
+    :param pieces: tuple of piece classes in ORDER
+    :return: set of tuples of piece classes in ORDER (endings that can't be won are left out)
+    """
+    reached = set()
+    for i, cls in enumerate(pieces):
+        rest = pieces[:i] + pieces[i + 1:]
+        reached.add(rest)
+        if cls is Pawn:
+            reached.update(tuple(sorted(rest + (promotion,), key=ORDER.index)) for promotion in Pawn.PROMOTIONS)
+    return reached - DRAWN
+
+
+def _index(king, opponent_king, squares):
+    """ Get the index of a position in a table
+
+    :param king: square index of the king of the side with the pieces
+    :param opponent_king: square index of the lone king
+    :param squares: square indexes of the pieces in the order of the signature
+    :return: integer
+    """
+    index = king | opponent_king << 6
+    for i, square in enumerate(squares):
+        index |= square << 12 + 6 * i
+    return index
+
+
+def _attacks(cls, square, target, occupied):
+    """ Check if a piece of the side with the pieces attacks a square
+
+    :param cls: piece class
+    :param square: square index of the piece
+    :param target: square index to check
+    :param occupied: set of occupied square indexes
+    :return: boolean
+    """
+    if cls is Knight:
+        return target in _KNIGHT[square]
+    if cls is Pawn:
+        return target in _PAWN[square]
+    between = _LINES[cls][square].get(target)
+    return between is not None and occupied.isdisjoint(between)
+
+
+class Tablebases:
+    """
+    Directory of table files mapped into memory so the processes that probe the same tables share one copy of their
+    pages
+    """
+    def __init__(self, directory):
+        """ initializer
+
+        :param directory: directory of the table files (named like KQK.tb)
+        :return:
+        """
+        self.directory = directory
+        self._tables = {}  # piece classes to (file, mmap) or None when there is no table
+        self.hits = 0
+        self.misses = 0
+
+    def __reduce__(self):
+        # worker processes map the files again instead of copying them
+        return self.__class__, (self.directory,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Unmap and close the table files
+
+        :return: None
+        """
+        for table in self._tables.values():
+            if table is not None:
+                table[1].close()
+                table[0].close()
+        self._tables = {}
+
+    def path(self, pieces):
+        """ Get the path of the table file of an ending
+
+        :param pieces: tuple of piece classes in ORDER
+        :return: str
+        """
+        return os.path.join(self.directory, name(pieces) + '.tb')
+
+    def _table(self, pieces):
+        """ Map the table of an ending the first time it is needed
+
+        :param pieces: tuple of piece classes in ORDER
+        :return: mmap or None when there is no table file
+        """
+        if pieces not in self._tables:
+            path = self.path(pieces)
+            if not os.path.exists(path):
+                self._tables[pieces] = None
+                return None
+            f = open(path, 'rb')
+            size = os.fstat(f.fileno()).st_size
+            magic, signature = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or signature.decode().strip() != name(pieces) or \
+                    size != HEADER.size + 2 * 64 ** (2 + len(pieces)):
+                f.close()
+                raise ValueError("'{}' is not a table of {}".format(path, name(pieces)))
+            self._tables[pieces] = f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        table = self._tables[pieces]
+        return None if table is None else table[1]
+
+    def value(self, pieces, strong_to_move, king, opponent_king, squares):
+        """ Look up a position in the table of its ending
+
+        :param pieces: tuple of piece classes in ORDER
+        :param strong_to_move: boolean if the side with the pieces is to move
+        :param king: square index of the king of the side with the pieces
+        :param opponent_king: square index of the lone king
+        :param squares: square indexes of the pieces in the order of pieces
+        :return: plies to mate plus one, 0 for a draw or None when there is no table
+        """
+        if pieces in DRAWN:
+            return 0
+        table = self._table(pieces)
+        if table is None:
+            return None
+        size = 64 ** (2 + len(pieces))
+        return table[HEADER.size + (0 if strong_to_move else size) + _index(king, opponent_king, squares)]
+
+    def probe(self, board):
+        """ Look up the current position
+
+        :param board: Board class
+        :return: (1 for a win, 0 for a draw or -1 for a loss of the side to move, plies to mate) or None when the
+            position is not in a table
+        """
+        kings = [None, None]
+        pieces = ([], [])
+        count = 0
+        for piece in board.pieces():
+            if isinstance(piece, King):
+                kings[piece.player.value] = piece.location.index
+                continue
+            count += 1
+            if count > MAX_PIECES:
+                self.misses += 1
+                return None
+            pieces[piece.player.value].append((ORDER.index(piece.__class__), piece.location.index))
+        strong = Player.BLACK if pieces[Player.BLACK.value] else Player.WHITE
+        if pieces[strong.opponent().value]:
+            self.misses += 1
+            return None
+
+        # the table is seen from the side with the pieces as white so flip the ranks when it is black
+        flip = 56 if strong is Player.BLACK else 0
+        placed = sorted(pieces[strong.value])
+        value = self.value(tuple(ORDER[order] for order, _ in placed), board.current_player == strong,
+                           kings[strong.value] ^ flip, kings[strong.opponent().value] ^ flip,
+                           [square ^ flip for _, square in placed])
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if value == 0:
+            return 0, 0
+        return 1 if board.current_player == strong else -1, value - 1
+
+    def score(self, board, player, depth):
+        """ Score the current position from its table like the board's heuristic_value
+
+        :param board: Board class
+        :param player: maximizing player
+        :param depth: current depth in the search tree
+        :return: value of the position or None when it is not in a table
+        """
+        probed = self.probe(board)
+        if probed is None:
+            return None
+        result, plies = probed
+        # prefer shorter mates and lower depth in the search tree
+        val = result * (WIN_SCORE - plies) / (depth + 1)
+        return val if board.current_player == player else -val
+
+    def best_moves(self, board):
+        """ Get the moves that keep the best result of the current position (the shortest mate when winning and the
+        longest when losing)
+
+        :param board: Board class
+        :return: list of Move or None when the position (or a position it leads to) is not in a table
+        """
+        if self.probe(board) is None:
+            return None
+        best, moves = None, []
+        for move in list(board.valid_moves()):
+            board.move(move)
+            try:
+                probed = self.probe(board)
+            finally:
+                board.undo_move()
+            if probed is None:
+                return None
+            result, plies = -probed[0], probed[1]
+            key = (result, -result * plies)
+            if best is None or key > best:
+                best, moves = key, [move]
+            elif key == best:
+                moves.append(move)
+        return moves
+
+
+def generate(pieces, tablebases=None):
+    """ Generate the tables of an ending of a king and pieces against a lone king by retrograde analysis
+
+    Every position is set up once to count the moves of the lone king and find the checkmates.  Then, ply by ply,
+    the positions lost in n plies give the positions won in n + 1 by undoing a move of the side with the pieces, and
+    the positions won in n give the positions lost in n + 1 by undoing a move of the lone king when every move of the
+    lone king leads to a won position.  Captures and promotions lead to other endings that are looked up in their
+    tables.
+
+    :param pieces: tuple of piece classes in ORDER
+    :param tablebases: Tablebases with the tables of the endings reached by captures and promotions
+    :return: (bytearray of the side with the pieces to move, bytearray of the lone king to move)
+    """
+    missing = [name(reached) for reached in dependencies(pieces)
+               if tablebases is None or tablebases.value(reached, True, 0, 0, [0] * len(reached)) is None]
+    if missing:
+        raise ValueError('{} needs the tables of {}'.format(name(pieces), ', '.join(sorted(missing))))
+    # without tables every ending reached can't be won
+    lookup = (lambda *args: 0) if tablebases is None else tablebases.value
+
+    size = 64 ** (2 + len(pieces))
+    strong, weak = bytearray(size), bytearray(size)
+    moves_left = bytearray(size)  # lone king moves not yet known to lose (0 once the position is decided)
+    checks = bytearray(size)  # 1 where the lone king is in check (illegal with the side with the pieces to move)
+    lost = {}  # plies to positions of the lone king to move lost in that many plies
+    won = {}  # plies to positions of the side with the pieces to move won in that many plies
+    promotions = {}  # plies to positions won in that many plies by a promotion
+    captures = {}  # plies to positions of the lone king to move with a capture leading to a win in that many plies
+
+    for squares in itertools.product(range(64), repeat=len(pieces)):
+        if len(set(squares)) < len(squares) or \
+                any(cls is Pawn and not 8 <= square < 56 for cls, square in zip(pieces, squares)):
+            continue
+        placed = list(zip(pieces, squares))
+        for opponent_king in range(64):
+            if opponent_king in squares:
+                continue
+            for king in range(64):
+                if king == opponent_king or king in squares or king in _KING[opponent_king]:
+                    continue
+                index = _index(king, opponent_king, squares)
+                occupied = {king, opponent_king, *squares}
+                check = any(_attacks(cls, square, opponent_king, occupied) for cls, square in placed)
+                checks[index] = check
+
+                if not check:
+                    # the side with the pieces to move is only legal when the lone king is not in check
+                    for i, (cls, square) in enumerate(placed):
+                        if cls is not Pawn or square < 48 or square + 8 in occupied:
+                            continue
+                        for promotion in Pawn.PROMOTIONS:
+                            reached = sorted(placed[:i] + [(promotion, square + 8)] + placed[i + 1:],
+                                             key=lambda p: ORDER.index(p[0]))
+                            value = lookup(tuple(c for c, _ in reached), False, king, opponent_king,
+                                           [s for _, s in reached])
+                            if value:
+                                promotions.setdefault(value, []).append(index)
+
+                count = 0
+                escapes = False
+                occupied.discard(opponent_king)
+                for target in _KING[opponent_king]:
+                    if target == king or target in _KING[king]:
+                        continue
+                    if target in squares:
+                        i = squares.index(target)
+                        rest = placed[:i] + placed[i + 1:]
+                        if any(_attacks(cls, square, target, occupied) for cls, square in rest):
+                            continue
+                        value = lookup(tuple(c for c, _ in rest), True, king, target,
+                                       [s for _, s in rest])
+                        if value:
+                            captures.setdefault(value - 1, []).append(index)
+                        else:
+                            escapes = True
+                    elif any(_attacks(cls, square, target, occupied) for cls, square in placed):
+                        continue
+                    count += 1
+
+                if escapes:
+                    continue
+                if count:
+                    moves_left[index] = count
+                elif check:
+                    weak[index] = 1
+                    lost.setdefault(0, []).append(index)
+
+    def lose(positions, plies):
+        # one more move of the lone king leads to a win
+        for index in positions:
+            if moves_left[index]:
+                moves_left[index] -= 1
+                if not moves_left[index]:
+                    weak[index] = plies + 2
+                    lost.setdefault(plies + 1, []).append(index)
+
+    plies = 0
+    while lost or won or promotions or captures:
+        if plies > 253:
+            raise ValueError('{} has mates longer than a table can hold'.format(name(pieces)))
+        if plies % 2 == 0:
+            for index in lost.pop(plies, []):
+                for previous in _unmoves(pieces, index):
+                    if not strong[previous] and not checks[previous]:
+                        strong[previous] = plies + 2
+                        won.setdefault(plies + 1, []).append(previous)
+        else:
+            for index in promotions.pop(plies, []):
+                if not strong[index]:
+                    strong[index] = plies + 1
+                    won.setdefault(plies, []).append(index)
+            for index in won.pop(plies, []):
+                lose(_king_unmoves(pieces, index), plies)
+            lose(captures.pop(plies, []), plies)
+        plies += 1
+    return strong, weak
+
+
+def _decode(pieces, index):
+    """ Get the squares of a position from its index
+
+    :param pieces: tuple of piece classes in ORDER
+    :param index: index in the table
+    :return: king square, lone king square, list of piece squares
+    """
+    return index & 63, index >> 6 & 63, [index >> 12 + 6 * i & 63 for i in range(len(pieces))]
+
+
+def _unmoves(pieces, index):
+    """ Get the positions of the side with the pieces to move that lead to a position of the lone king to move by a
+    move of the side with the pieces (other than a promotion), including positions where the lone king is in check
+
+    :param pieces: tuple of piece classes in ORDER
+    :param index: index of the position of the lone king to move
+    :return: generator of indexes
+    """
+    king, opponent_king, squares = _decode(pieces, index)
+    occupied = {king, opponent_king, *squares}
+    for origin in _KING[king]:
+        if origin not in occupied and origin not in _KING[opponent_king]:
+            yield index - king + origin
+
+    for i, (cls, square) in enumerate(zip(pieces, squares)):
+        shift = 12 + 6 * i
+        if cls is Pawn:
+            if square - 8 >= 8 and square - 8 not in occupied:
+                yield index - (8 << shift)
+                if 24 <= square < 32 and square - 16 not in occupied:
+                    yield index - (16 << shift)
+        elif cls is Knight:
+            for origin in _KNIGHT[square]:
+                if origin not in occupied:
+                    yield index + (origin - square << shift)
+        else:
+            for ray in _RAYS[cls][square]:
+                for origin in ray:
+                    if origin in occupied:
+                        break
+                    yield index + (origin - square << shift)
+
+
+def _king_unmoves(pieces, index):
+    """ Get the positions of the lone king to move that lead to a position of the side with the pieces to move by a
+    move of the lone king (other than a capture)
+
+    :param pieces: tuple of piece classes in ORDER
+    :param index: index of the position of the side with the pieces to move
+    :return: generator of indexes
+    """
+    king, opponent_king, squares = _decode(pieces, index)
+    for origin in _KING[opponent_king]:
+        if origin != king and origin not in squares and origin not in _KING[king]:
+            yield _index(king, origin, squares)
+
+
+def write(pieces, path, tablebases=None):
+    """ Generate the tables of an ending and write them to a file
+
+    :param pieces: tuple of piece classes in ORDER
+    :param path: path of the table file to write
+    :param tablebases: Tablebases with the tables of the endings reached by captures and promotions
+    :return: number of positions won by the side with the pieces to move
+    """
+    strong, weak = generate(pieces, tablebases)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, name(pieces).encode().ljust(4)))
+        f.write(strong)
+        f.write(weak)
+    return len(strong) - strong.count(0)
+
+
+def build(signatures, directory):
+    """ Generate the tables of endings that are not in a directory yet (with the tables they need first)
+
+    :param signatures: names of endings such as 'KQK'
+    :param directory: directory of the table files
+    :return: list of (name, positions won, seconds) of the generated tables
+    """
+    os.makedirs(directory, exist_ok=True)
+    generated = []
+    with Tablebases(directory) as tablebases:
+        def visit(pieces):
+            if pieces in DRAWN or os.path.exists(tablebases.path(pieces)):
+                return
+            for reached in sorted(dependencies(pieces), key=lambda p: (len(p), [ORDER.index(cls) for cls in p])):
+                visit(reached)
+            start = time.perf_counter()
+            won = write(pieces, tablebases.path(pieces), tablebases)
+            generated.append((name(pieces), won, time.perf_counter() - start))
+
+        for signature in signatures:
+            visit(parse(signature))
+    return generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('signatures', nargs='*', help='endings such as KQK or KBNK')
+    parser.add_argument('--directory', required=True, help='directory of the table files')
+    parser.add_argument('--probe', metavar='FEN', help='position to look up')
+    args = parser.parse_args()
+    for signature, won, seconds in build(args.signatures, args.directory):
+        print('{}: {} won positions in {:.1f} seconds'.format(signature, won, seconds))
+    if args.probe is not None:
+        board = Board.from_fen(args.probe)
+        with Tablebases(args.directory) as tablebases:
+            probed = tablebases.probe(board)
+            if probed is None:
+                print('not in the tables')
+                return
+            result, plies = probed
+            print('draw' if not result else '{} in {} plies'.format('win' if result > 0 else 'loss', plies))
+            print('best moves: ' + ' '.join(sorted(str(move) for move in tablebases.best_moves(board))))
+
+
+if __name__ == '__main__':
+    main()
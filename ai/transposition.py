@@ -0,0 +1,102 @@
+import collections
+
+# stored search result for a position
+Entry = collections.namedtuple('Entry', ['key', 'depth', 'bound', 'score', 'move', 'ply', 'age'])
+
+
+class TranspositionTable:
+    """
+    Fixed size table of search results keyed by position hash
+
+    The table is split into buckets of two slots.  The first slot keeps the deepest search of the bucket (it is only
+    replaced by a search at least as deep or by a newer search) and the second slot always takes the latest result
+    that did not fit in the first.
+    """
+    ENTRY_SIZE = 200  # approximate bytes used by one stored entry (tuple, ints, score and list slot)
+    BUCKET_SLOTS = 2
+
+    def __init__(self, size_mb=16):
+        """ initializer
+
+        :param size_mb: memory budget in megabytes
+        :return:
+        """
+        self.buckets = max(1, int(size_mb * 1024 * 1024) // (self.ENTRY_SIZE * self.BUCKET_SLOTS))
+        self._entries = [None] * (self.buckets * self.BUCKET_SLOTS)
+        self._age = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0  # stores that replaced the result of a different position
+        self.stores = 0
+
+    def __len__(self):
+        return sum(1 for e in self._entries if e is not None)
+
+    def new_search(self):
+        """ Start a new search so results of previous searches can be replaced even if they are deeper
+
+        :return: None
+        """
+        self._age += 1
+
+    def clear(self):
+        """ Remove all entries and reset the counters
+
+        :return: None
+        """
+        self._entries = [None] * (self.buckets * self.BUCKET_SLOTS)
+        self._age = 0
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def probe(self, key):
+        """ Look up the stored result for a position
+
+        :param key: position hash
+        :return: Entry or None
+        """
+        i = (key % self.buckets) * self.BUCKET_SLOTS
+        for entry in (self._entries[i], self._entries[i + 1]):
+            if entry is not None and entry.key == key:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, score, move=None, ply=0):
+        """ Store the result of a search
+
+        :param key: position hash
+        :param depth: depth searched below the position
+        :param bound: Bound enum of the score
+        :param score: score of the position
+        :param move: move key of the best move (see Move.key) or None
+        :param ply: plies from the search's root to the position (scores of other plies are scaled differently)
+        :return: None
+        """
+        self.stores += 1
+        i = (key % self.buckets) * self.BUCKET_SLOTS
+        entry = Entry(key, depth, bound, score, move, ply, self._age)
+        deepest = self._entries[i]
+        if deepest is None or deepest.key == key or deepest.age != self._age or depth >= deepest.depth:
+            slot = i
+        else:
+            slot = i + 1
+        replaced = self._entries[slot]
+        if replaced is not None and replaced.key != key:
+            self.collisions += 1
+        self._entries[slot] = entry
+
+    def stats(self):
+        """ Get the table counters
+
+        :return: dict
+        """
+        probes = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'hit_rate': self.hits / probes if probes else 0.0,
+        }
@@ -0,0 +1,176 @@
+"""
+Load the game server (see util.server) with many connections each playing several games at once, playing random moves
+against the server's ai, and report moves/sec and the round trip latency of a move and the ai's answer
+
+    python -m benchmark.load --port 8765 --connections 8 --games 4 --plies 40
+    python -m benchmark.load --serve --workers 2 --connections 8 --games 4
+"""
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+from util.server import GameServer, Latency
+
+
+class Connection:
+    """
+    Client connection that sends commands and hands the responses to the game they are about
+    """
+    def __init__(self, reader, writer):
+        """ initializer
+
+        :param reader: StreamReader
+        :param writer: StreamWriter
+        :return:
+        """
+        self.reader = reader
+        self.writer = writer
+        self.games = collections.defaultdict(asyncio.Queue)  # game number to queue of response words
+        self.replies = asyncio.Queue()  # responses that are not about a game (game, stats and errors)
+        self._task = asyncio.ensure_future(self._read())
+
+    @classmethod
+    async def open(cls, host='127.0.0.1', port=8765, path=None):
+        """ Connect to a server
+
+        :param host: host of the server
+        :param port: TCP port of the server
+        :param path: Unix socket path of the server instead of TCP
+        :return: Connection
+        """
+        if path is not None:
+            return cls(*await asyncio.open_unix_connection(path))
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def _read(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            words = line.decode().split(None, 2)
+            if words[0] in ('moved', 'ai', 'over', 'closed', 'moves', 'score', 'board') or \
+                    (words[0] == 'error' and words[1] in self.games):
+                await self.games[words[1]].put(words)
+            else:
+                await self.replies.put(words)
+
+    def send(self, line):
+        self.writer.write(line.encode() + b'\n')
+
+    async def request(self, line):
+        """ Send a command that is not about a game and wait for its response
+
+        :param line: command
+        :return: list of response words
+        """
+        self.send(line)
+        await self.writer.drain()
+        return await self.replies.get()
+
+    async def close(self):
+        self.send('quit')
+        await self.writer.drain()
+        await self._task
+        self.writer.close()
+
+
+async def play(connection, plies, depth, latency):
+    """ Play a game of random moves against the ai
+
+    :param connection: Connection
+    :param plies: maximum number of moves of both sides
+    :param depth: depth the ai searches
+    :param latency: Latency of a move and the ai's answer
+    :return: number of moves played
+    """
+    words = await connection.request('new white {}'.format(depth))
+    if words[0] != 'game':
+        raise RuntimeError(' '.join(words))
+    game = words[1]
+    responses = connection.games[game]
+    played = 0
+    while played < plies:
+        start = time.perf_counter()
+        connection.send('move {} r'.format(game))
+        if (await responses.get())[0] != 'moved':
+            break
+        played += 1
+        if (await responses.get())[0] != 'ai':
+            break
+        played += 1
+        latency.add(time.perf_counter() - start)
+    connection.send('close {}'.format(game))
+    # skip the end of game and errors of a move sent after the ai ended the game
+    while (await responses.get())[0] != 'closed':
+        pass
+    del connection.games[game]
+    return played
+
+
+async def load(host='127.0.0.1', port=8765, path=None, connections=8, games=4, plies=40, depth=1):
+    """ Play games on many connections at once
+
+    :param host: host of the server
+    :param port: TCP port of the server
+    :param path: Unix socket path of the server instead of TCP
+    :param connections: number of connections
+    :param games: number of games played at once on each connection
+    :param plies: maximum number of moves of each game
+    :param depth: depth the ai searches
+    :return: dict of results with the server's stats
+    """
+    latency = Latency(window=100000)
+    opened = [await Connection.open(host, port, path) for _ in range(connections)]
+    start = time.perf_counter()
+    moves = await asyncio.gather(*[play(c, plies, depth, latency) for c in opened for _ in range(games)])
+    seconds = time.perf_counter() - start
+    stats = json.loads(' '.join((await opened[0].request('stats'))[1:]))
+    for connection in opened:
+        await connection.close()
+    return {
+        'games': len(moves),
+        'moves': sum(moves),
+        'seconds': seconds,
+        'moves/sec': sum(moves) / seconds if seconds else 0,
+        'latency': latency.summary(),
+        'server': stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='host of the server')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port of the server')
+    parser.add_argument('--unix', help='Unix socket path of the server instead of TCP')
+    parser.add_argument('--serve', action='store_true', help='start a server in this process on a free port')
+    parser.add_argument('--workers', type=int, help='worker processes of the server started with --serve')
+    parser.add_argument('--connections', type=int, default=8, help='number of connections')
+    parser.add_argument('--games', type=int, default=4, help='number of games played at once on each connection')
+    parser.add_argument('--plies', type=int, default=40, help='maximum number of moves of each game')
+    parser.add_argument('--depth', type=int, default=1, help='depth the ai searches')
+    args = parser.parse_args()
+
+    async def run():
+        if not args.serve:
+            return await load(args.host, args.port, args.unix, args.connections, args.games, args.plies, args.depth)
+        server = GameServer(args.workers, max_depth=args.depth)
+        await server.start()
+        try:
+            host, port = server.address[:2]
+            return await load(host, port, None, args.connections, args.games, args.plies, args.depth)
+        finally:
+            await server.close()
+
+    results = asyncio.run(run())
+    print('{games} games, {moves} moves in {seconds:.2f} seconds: {moves/sec:.0f} moves/sec'.format(**results))
+    print('move and ai answer latency (ms): ' + ', '.join(
+        '{} {}'.format(key, value) for key, value in results['latency'].items() if key != 'count'))
+    for name, summary in results['server']['latency'].items():
+        print('server {:<8} (ms): '.format(name) + ', '.join(
+            '{} {}'.format(key, value) for key, value in summary.items()))
+
+
+if __name__ == '__main__':
+    main()
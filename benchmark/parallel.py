@@ -0,0 +1,96 @@
+"""
+Benchmark the parallel root search against the serial search
+
+    python -m benchmark.parallel --depth 3 --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+from ai.minimax import alphabeta, MoveOrdering, Quiescence
+from ai.parallel import executor, parallel_search
+from board import Board
+from util.input_parser import parse
+
+# opening positions reached by these moves from the starting position
+POSITIONS = {
+    'italian': ['e2 e4', 'e7 e5', 'g1 f3', 'b8 c6', 'f1 c4', 'g8 f6', 'd2 d3', 'f8 c5'],
+    'queens gambit': ['d2 d4', 'd7 d5', 'c2 c4', 'e7 e6', 'b1 c3', 'g8 f6', 'c1 g5', 'f8 e7'],
+    'sicilian': ['e2 e4', 'c7 c5', 'g1 f3', 'd7 d6', 'd2 d4', 'c5 d4', 'f3 d4', 'g8 f6', 'b1 c3', 'a7 a6'],
+}
+
+
+def position(moves):
+    """ Create a board by playing moves from the starting position
+
+    :param moves: list of move strings
+    :return: Board
+    """
+    board = Board()
+    for move in moves:
+        board.move(parse(board, move))
+    return board
+
+
+def serial(board, depth):
+    """ Search a position in this process
+
+    :param board: Board
+    :param depth: depth to search
+    :return: seconds, score, list of moves
+    """
+    start = time.perf_counter()
+    score, moves = alphabeta(board, board.current_player, 0, depth, -float('inf'), float('inf'),
+                             ordering=MoveOrdering(), quiescence=Quiescence())
+    return time.perf_counter() - start, score, moves
+
+
+def parallel(board, depth, workers):
+    """ Search a position with the parallel root search
+
+    :param board: Board
+    :param depth: depth to search
+    :param workers: number of worker processes
+    :return: seconds, score, list of moves
+    """
+    # start the worker processes before timing the search
+    pool = executor(workers)
+    for future in [pool.submit(int) for _ in range(workers)]:
+        future.result()
+    start = time.perf_counter()
+    score, moves = parallel_search(board, depth, workers, quiescence=Quiescence())
+    return time.perf_counter() - start, score, moves
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depth', type=int, default=3, help='depth to search')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count()],
+                        help='worker counts to compare')
+    args = parser.parse_args()
+    workers = sorted(set(args.workers))
+
+    print('{} cpus, depth {}'.format(os.cpu_count(), args.depth))
+    print('{:<16}{:>10}{:>10}{:>10}{:>10}'.format('position', 'workers', 'seconds', 'speedup', 'vs serial'))
+    for name, moves in POSITIONS.items():
+        board = position(moves)
+        seconds, score, _ = serial(board, args.depth)
+        print('{:<16}{:>10}{:>10.2f}{:>10}{:>10}'.format(name, 'serial', seconds, '', ''))
+        base = None
+        best = None
+        for count in workers:
+            elapsed, parallel_score, parallel_moves = parallel(board, args.depth, count)
+            base = elapsed if base is None else base
+            print('{:<16}{:>10}{:>10.2f}{:>10.2f}{:>10.2f}'.format(
+                name, count, elapsed, base / elapsed, seconds / elapsed))
+            if parallel_score != score:
+                raise AssertionError('{}: {} workers scored {} but the serial search scored {}'
+                                     .format(name, count, parallel_score, score))
+            best = sorted(map(str, parallel_moves)) if best is None else best
+            if sorted(map(str, parallel_moves)) != best:
+                raise AssertionError('{}: {} workers chose {} but {} workers chose {}'
+                                     .format(name, count, sorted(map(str, parallel_moves)), workers[0], best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Count move generation nodes (perft) of the reference positions, checking the counts and reporting nodes per second
+
+    python -m benchmark.perft --max-nodes 100000
+    python -m benchmark.perft --board BitBoard --position kiwipete --depth 3 --divide
+    python -m benchmark.perft --compare --position kiwipete --depth 3
+"""
+import argparse
+import sys
+import time
+
+from benchmark.positions import PERFT
+from board import Board, BitBoard
+
+BOARDS = {'Board': Board, 'BitBoard': BitBoard}
+
+
+class PerftMismatch(Exception):
+    pass
+
+
+def run(name, board_class, depths, divide=False):
+    """ Run perft on a reference position and check the counts
+
+    :param name: name of the position in PERFT
+    :param board_class: class of board to run on
+    :param depths: depths to run
+    :param divide: print the count after each first move of the deepest depth
+    :return: list of (depth, nodes, seconds)
+    """
+    fen, expected = PERFT[name]
+    board = board_class.from_fen(fen)
+    results = []
+    for depth in depths:
+        start = time.perf_counter()
+        nodes = board.perft(depth)
+        seconds = time.perf_counter() - start
+        results.append((depth, nodes, seconds))
+        print('{:<12}{:>6}{:>12}{:>10.2f}{:>12.0f}'.format(name, depth, nodes, seconds, nodes / seconds))
+        if nodes != expected[depth - 1]:
+            if divide:
+                for move, count in sorted(board.divide(depth).items()):
+                    print('  {}: {}'.format(move, count))
+            raise PerftMismatch('{} depth {}: counted {} positions but expected {}'
+                                .format(name, depth, nodes, expected[depth - 1]))
+    if divide and depths:
+        for move, count in sorted(board.divide(depths[-1]).items()):
+            print('  {}: {}'.format(move, count))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--board', choices=sorted(BOARDS), default='Board', help='board class to run on')
+    parser.add_argument('--position', choices=sorted(PERFT), action='append', help='positions to run (default all)')
+    parser.add_argument('--depth', type=int, help='run this depth only')
+    parser.add_argument('--max-nodes', type=int, default=100000,
+                        help='run every depth up to this many expected positions (ignored with --depth)')
+    parser.add_argument('--divide', action='store_true', help='print the count after each first move')
+    parser.add_argument('--compare', action='store_true',
+                        help='run every board class and report how much faster each is than Board')
+    args = parser.parse_args()
+
+    totals = {}
+    try:
+        for board_name in sorted(BOARDS) if args.compare else [args.board]:
+            total_nodes, total_seconds = 0, 0
+            if args.compare:
+                print(board_name)
+            print('{:<12}{:>6}{:>12}{:>10}{:>12}'.format('position', 'depth', 'nodes', 'seconds', 'nodes/sec'))
+            for name in args.position or PERFT:
+                expected = PERFT[name][1]
+                if args.depth is not None:
+                    if not 1 <= args.depth <= len(expected):
+                        parser.error('{} has counts for depths 1 to {}'.format(name, len(expected)))
+                    depths = [args.depth]
+                else:
+                    depths = [d for d, count in enumerate(expected, 1) if count <= args.max_nodes]
+                for _, nodes, seconds in run(name, BOARDS[board_name], depths, args.divide):
+                    total_nodes += nodes
+                    total_seconds += seconds
+            print('{:<12}{:>6}{:>12}{:>10.2f}{:>12.0f}'.format('total', '', total_nodes, total_seconds,
+                                                             total_nodes / total_seconds if total_seconds else 0))
+            totals[board_name] = total_seconds
+    except PerftMismatch as e:
+        print('MISMATCH: {}'.format(e), file=sys.stderr)
+        sys.exit(1)
+    if args.compare:
+        for board_name, seconds in sorted(totals.items()):
+            print('{:<12}{:>6.2f}x Board'.format(board_name, totals['Board'] / seconds if seconds else 0))
+
+
+if __name__ == '__main__':
+    main()
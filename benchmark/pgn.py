@@ -0,0 +1,67 @@
+"""
+Stream the games of a PGN file and replay their moves, reporting games/sec and moves/sec for reading the file alone and
+for reading it and replaying every move on a board
+
+    python -m benchmark.pgn
+    python -m benchmark.pgn --board BitBoard --repeat 5 games.pgn
+"""
+import argparse
+import itertools
+import os
+import time
+
+from board import Board, BitBoard
+from util.pgn import open_games
+
+BOARDS = {'Board': Board, 'BitBoard': BitBoard}
+SAMPLE = os.path.join(os.path.dirname(__file__), 'games.pgn')
+
+
+def read(path, repeat=1):
+    """ Read the games of a PGN file without replaying them
+
+    :param path: path of the PGN file
+    :param repeat: number of times to read the file
+    :return: games, moves, seconds
+    """
+    games = moves = 0
+    start = time.perf_counter()
+    for game in itertools.chain.from_iterable(open_games(path) for _ in range(repeat)):
+        games += 1
+        moves += len(game.moves)
+    return games, moves, time.perf_counter() - start
+
+
+def replay(path, board_class, repeat=1):
+    """ Read the games of a PGN file and replay their moves
+
+    :param path: path of the PGN file
+    :param board_class: class of board to replay on
+    :param repeat: number of times to read the file
+    :return: games, moves, seconds
+    """
+    games = moves = 0
+    start = time.perf_counter()
+    for game in itertools.chain.from_iterable(open_games(path) for _ in range(repeat)):
+        games += 1
+        for _ in game.replay(board_class):
+            moves += 1
+    return games, moves, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', nargs='?', default=SAMPLE, help='PGN file (default the bundled sample of games)')
+    parser.add_argument('--board', choices=sorted(BOARDS), default='Board', help='board class to replay on')
+    parser.add_argument('--repeat', type=int, default=1, help='number of times to read the file')
+    args = parser.parse_args()
+
+    print('{:<10}{:>8}{:>10}{:>10}{:>12}{:>12}'.format('stage', 'games', 'moves', 'seconds', 'games/sec', 'moves/sec'))
+    for stage, (games, moves, seconds) in [('read', read(args.path, args.repeat)),
+                                           ('replay', replay(args.path, BOARDS[args.board], args.repeat))]:
+        print('{:<10}{:>8}{:>10}{:>10.2f}{:>12.0f}{:>12.0f}'.format(stage, games, moves, seconds, games / seconds,
+                                                                    moves / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+Reference positions for the benchmarks
+"""
+# perft reference positions: (FEN, expected number of positions indexed by depth - 1)
+# (positions and counts from https://www.chessprogramming.org/Perft_Results)
+PERFT = {
+    'start': ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+              [20, 400, 8902, 197281, 4865609]),
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                 [48, 2039, 97862, 4085603]),
+    'position 3': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+                   [14, 191, 2812, 43238, 674624]),
+    'position 4': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+                   [6, 264, 9467, 422333]),
+    'position 5': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+                   [44, 1486, 62379, 2103487]),
+    'position 6': ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+                   [46, 2079, 89890, 3894594]),
+}
+
+# search benchmark positions: (FEN, depth to search)
+SEARCH = {
+    'italian': ('r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 0 5', 4),
+    'queens gambit': ('rnbqk2r/ppp1bppp/4pn2/3p2B1/2PP4/2N5/PP2PPPP/R2QKBNR w KQkq - 0 5', 4),
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', 3),
+    'sicilian': ('rnbqkb1r/1p2pppp/p2p1n2/8/3NP3/2N5/PPP2PPP/R1BQKB1R w KQkq - 0 6', 4),
+    'rook endgame': ('8/8/3k4/3p4/8/3PK3/8/R6r w - - 0 1', 4),
+    'pawn endgame': ('8/5pk1/6p1/8/3P4/4PK2/8/8 w - - 0 1', 5),
+    'lucena': ('1K1k4/1P6/8/8/8/8/r7/2R5 w - - 0 1', 4),
+}
+
@@ -0,0 +1,181 @@
+"""
+Search the benchmark positions at fixed depths and report nodes, nodes/sec, time to depth, effective branching factor
+and cutoff ratios, optionally writing the results as JSON and comparing them to a stored baseline
+
+The stored baseline only keeps what does not depend on the machine (nodes, scores and moves) and its node counts
+and scores must match exactly.  Nodes/sec is only checked when a tolerance is given, against results recorded on the
+same machine:
+
+    python -m benchmark.search --baseline
+    python -m benchmark.search --output results.json
+    python -m benchmark.search --baseline results.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from ai.minimax import alphabeta, MoveOrdering, Quiescence, SearchStats
+from ai.transposition import TranspositionTable
+from benchmark.positions import SEARCH
+from board import Board, BitBoard
+
+BOARDS = {'Board': Board, 'BitBoard': BitBoard}
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+TIMINGS = ('seconds', 'time_to_depth', 'nodes_per_second')  # results that depend on the machine
+
+
+def search(board, depth, seed=0):
+    """ Search a position one depth at a time (like iterative deepening) recording every iteration
+
+    :param board: Board
+    :param depth: deepest iteration
+    :param seed: seed for choosing between equally good moves
+    :return: dict of results
+    """
+    table = TranspositionTable()
+    ordering = MoveOrdering()
+    quiescence = Quiescence()
+    iterations = []
+    elapsed = 0
+    score, moves = None, []
+    for d in range(1, depth + 1):
+        stats = SearchStats()
+        nodes, cutoffs = quiescence.nodes, ordering.cutoffs
+        start = time.perf_counter()
+        score, moves = alphabeta(board, board.current_player, 0, d, -float('inf'), float('inf'), table,
+                                 ordering=ordering, quiescence=quiescence, stats=stats)
+        seconds = time.perf_counter() - start
+        elapsed += seconds
+        total = stats.nodes + quiescence.nodes - nodes
+        iterations.append({
+            'depth': d,
+            'nodes': stats.nodes,
+            'leaves': stats.leaves,
+            'quiescence_nodes': quiescence.nodes - nodes,
+            'seconds': seconds,
+            'time_to_depth': elapsed,
+            'nodes_per_second': total / seconds if seconds else 0.0,
+            # growth of the tree from the previous iteration
+            'branching_factor': stats.nodes / iterations[-1]['nodes'] if iterations else float(stats.nodes),
+            'cutoffs': ordering.cutoffs - cutoffs,
+        })
+    moves = sorted(moves, key=lambda m: m.key)
+    return {
+        'depth': depth,
+        'score': score,
+        'moves': [str(m) for m in moves],
+        'move': str(random.Random(seed).choice(moves)) if moves else None,
+        'nodes': sum(i['nodes'] + i['quiescence_nodes'] for i in iterations),
+        'seconds': elapsed,
+        'nodes_per_second': sum(i['nodes'] + i['quiescence_nodes'] for i in iterations) / elapsed if elapsed else 0.0,
+        'effective_branching_factor': iterations[-1]['nodes'] ** (1 / depth),
+        'cutoffs': ordering.cutoffs,
+        'first_move_cutoff_rate': ordering.cutoff_rate,
+        'iterations': iterations,
+    }
+
+
+def strip_timings(results):
+    """ Remove the results that depend on the machine so they can be stored as a baseline
+
+    :param results: dict of results keyed by position name
+    :return: dict of results keyed by position name
+    """
+    stripped = {}
+    for name, result in results.items():
+        result = {k: v for k, v in result.items() if k not in TIMINGS}
+        result['iterations'] = [{k: v for k, v in i.items() if k not in TIMINGS} for i in result['iterations']]
+        stripped[name] = result
+    return stripped
+
+
+def compare(results, baseline, tolerance=None):
+    """ Compare results to a baseline printing the changes
+
+    The node counts of a position only change when the search or evaluation changes so they must match exactly.
+    Nodes/sec depends on the machine and the load on it so it is only reported, unless a tolerance is given and the
+    baseline was recorded with its timings (on the same machine).
+
+    :param results: dict of results keyed by position name
+    :param baseline: dict of baseline results keyed by position name
+    :param tolerance: fraction nodes/sec may drop before it counts as a regression (None to only report it)
+    :return: list of regression messages
+    """
+    regressions = []
+    print('{:<16}{:>12}{:>12}{:>10}{:>12}{:>12}{:>10}'.format(
+        'position', 'nodes', 'baseline', 'change', 'nodes/sec', 'baseline', 'change'))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or base['depth'] != result['depth']:
+            print('{:<16} no baseline at depth {}'.format(name, result['depth']))
+            continue
+        node_change = result['nodes'] / base['nodes'] - 1
+        if 'nodes_per_second' in base:
+            speed_change = result['nodes_per_second'] / base['nodes_per_second'] - 1
+            print('{:<16}{:>12}{:>12}{:>+10.1%}{:>12.0f}{:>12.0f}{:>+10.1%}'.format(
+                name, result['nodes'], base['nodes'], node_change, result['nodes_per_second'],
+                base['nodes_per_second'], speed_change))
+        else:
+            speed_change = None
+            print('{:<16}{:>12}{:>12}{:>+10.1%}{:>12.0f}{:>12}{:>10}'.format(
+                name, result['nodes'], base['nodes'], node_change, result['nodes_per_second'], '-', '-'))
+        if result['nodes'] != base['nodes'] or result['score'] != base['score']:
+            regressions.append('{}: searched {} nodes scoring {} but the baseline searched {} nodes scoring {}'
+                               .format(name, result['nodes'], result['score'], base['nodes'], base['score']))
+        if tolerance is not None and speed_change is not None and speed_change < -tolerance:
+            regressions.append('{}: {:.0f} nodes/sec is {:.1%} slower than the baseline'
+                               .format(name, result['nodes_per_second'], -speed_change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--board', choices=sorted(BOARDS), default='Board', help='board class to search on')
+    parser.add_argument('--position', choices=sorted(SEARCH), action='append', help='positions to run (default all)')
+    parser.add_argument('--depth', type=int, help='search every position to this depth (default per position)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for choosing between equally good moves')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--no-timings', action='store_true',
+                        help='leave the machine dependent timings out of the output (to store it as the baseline)')
+    parser.add_argument('--baseline', nargs='?', const=BASELINE, help='compare to this JSON file of results')
+    parser.add_argument('--tolerance', type=float,
+                        help='fraction nodes/sec may drop before it counts as a regression (only checked when given, '
+                             'against a baseline recorded on this machine)')
+    args = parser.parse_args()
+
+    results = {}
+    print('{:<16}{:>6}{:>10}{:>10}{:>12}{:>10}{:>8}{:>10}  {}'.format(
+        'position', 'depth', 'nodes', 'seconds', 'nodes/sec', 'ttd', 'ebf', 'cut rate', 'move'))
+    for name in args.position or SEARCH:
+        fen, depth = SEARCH[name]
+        depth = depth if args.depth is None else args.depth
+        result = search(BOARDS[args.board].from_fen(fen), depth, args.seed)
+        result['board'] = args.board
+        results[name] = result
+        for i in result['iterations']:
+            print('{:<16}{:>6}{:>10}{:>10.2f}{:>12.0f}{:>10.2f}{:>8.2f}'.format(
+                name, i['depth'], i['nodes'] + i['quiescence_nodes'], i['seconds'], i['nodes_per_second'],
+                i['time_to_depth'], i['branching_factor']))
+        print('{:<16}{:>6}{:>10}{:>10.2f}{:>12.0f}{:>10}{:>8.2f}{:>10.2f}  {}'.format(
+            name, 'total', result['nodes'], result['seconds'], result['nodes_per_second'], '',
+            result['effective_branching_factor'], result['first_move_cutoff_rate'], result['move']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(strip_timings(results) if args.no_timings else results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print('REGRESSION: {}'.format(regression), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+Play a match between two engine configurations in worker processes and report the score, the Elo difference with its
+95% error bars, the average time per move and nodes/sec of each engine
+
+Engines are given as comma separated options: depth, time (seconds per move instead of a fixed depth), quiescence
+(maximum plies, 0 turns it off), mobility (0 or 1), table (transposition table megabytes, 0 for none), book (path
+of an opening book) and tablebases (directory of endgame tables).
+
+    python -m benchmark.tournament --engine depth=2 --engine depth=2,quiescence=0 --games 20 --workers 4
+"""
+import argparse
+import collections
+import math
+import random
+import time
+
+import ai.parallel
+from ai.book import OpeningBook
+from ai.minimax import Quiescence, SearchStats
+from ai.tablebase import Tablebases
+from ai.transposition import TranspositionTable
+from board import Board, BitBoard
+from piece import King, Bishop, Knight, Pawn
+from util.enums import Player
+from util.pgn import Game
+
+BOARDS = {'Board': Board, 'BitBoard': BitBoard}
+
+
+class Engine:
+    """
+    Search configuration of one side of a match
+    """
+    def __init__(self, name, depth=2, time_limit=None, quiescence=8, mobility=False, table=0, book=None,
+                 tablebases=None):
+        """ initializer
+
+        :param name: name of the engine
+        :param depth: depth to search (the maximum depth when there is a time limit)
+        :param time_limit: seconds to search each move for (searches to the depth when None)
+        :param quiescence: maximum plies searched past the depth (0 for none)
+        :param mobility: count valid moves in the heuristic value
+        :param table: transposition table size in megabytes kept for the whole game (0 for none)
+        :param book: OpeningBook to play from while the position is in it
+        :param tablebases: Tablebases to play the endings in its tables from and score them in the search
+        :return:
+        """
+        self.name = name
+        self.depth = depth
+        self.time_limit = time_limit
+        self.quiescence = quiescence
+        self.mobility = mobility
+        self.table = table
+        self.book = book
+        self.tablebases = tablebases
+
+    def __repr__(self):
+        return 'Engine({})'.format(self.name)
+
+    @classmethod
+    def from_string(cls, text):
+        """ Create an engine from comma separated options (e.g. depth=3,quiescence=0)
+
+        :param text: str
+        :return: Engine
+        """
+        options = {}
+        for option in filter(None, text.split(',')):
+            key, _, value = option.partition('=')
+            if key == 'time':
+                options['time_limit'] = float(value)
+                options.setdefault('depth', None)
+            elif key in ('depth', 'quiescence', 'table'):
+                options[key] = int(value)
+            elif key == 'mobility':
+                options[key] = bool(int(value))
+            elif key == 'book':
+                options[key] = OpeningBook(value)
+            elif key == 'tablebases':
+                options[key] = Tablebases(value)
+            else:
+                raise ValueError("'{}' is not an engine option".format(option))
+        return cls(text, **options)
+
+    def new_game(self):
+        """ Create the state kept between the moves of a game
+
+        :return: TranspositionTable or None
+        """
+        return TranspositionTable(self.table) if self.table else None
+
+    def move(self, board, table, seed):
+        """ Search for a move
+
+        :param board: Board
+        :param table: state created by new_game
+        :param seed: seed for choosing between equally good moves
+        :return: Move, nodes searched
+        """
+        board.mobility = self.mobility
+        quiescence = Quiescence(self.quiescence)
+        stats = SearchStats()
+        move = board.recommended_move(self.depth, table, self.time_limit, quiescence=quiescence, seed=seed,
+                                      stats=stats, book=self.book, tablebases=self.tablebases)
+        return move, stats.nodes + quiescence.nodes
+
+
+def insufficient_material(board):
+    """ Check if neither player has the pieces to checkmate (kings with at most one bishop or knight between them)
+
+    :param board: Board
+    :return: boolean
+    """
+    others = [p for p in board.pieces() if p.__class__ is not King]
+    return not others or (len(others) == 1 and others[0].__class__ in (Bishop, Knight))
+
+
+def play_game(white, black, seed, opening=4, max_moves=300, adjudicate=5, adjudicate_moves=8, board_class=Board):
+    """ Play a game between two engines from an opening of random moves
+
+    The game ends on checkmate, stalemate, threefold repetition, the fifty move rule or insufficient material.  A side
+    that is ahead by the adjudication material for long enough wins and a game that reaches the move cap is a draw.
+
+    :param white: Engine playing white
+    :param black: Engine playing black
+    :param seed: seed of the opening and of the choices between equally good moves
+    :param opening: number of random moves played before the engines take over
+    :param max_moves: maximum number of moves (plies) in the game
+    :param adjudicate: material points a side must be ahead by to be adjudicated the winner (0 to not adjudicate)
+    :param adjudicate_moves: number of moves in a row a side must stay ahead by the adjudication material
+    :param board_class: class of board to play on
+    :return: dict of results
+    """
+    rng = random.Random(seed)
+    board = board_class()
+    engines = {Player.WHITE: white, Player.BLACK: black}
+    tables = {player: engine.new_game() for player, engine in engines.items()}
+    seconds = {player: 0.0 for player in Player}
+    nodes = {player: 0 for player in Player}
+    moves = {player: 0 for player in Player}
+    repetitions = collections.Counter([board.hash])
+    ply = 0
+    quiet = 0  # moves since the last capture or pawn move
+    ahead = 0  # moves in a row a side has been ahead by the adjudication material (positive for white)
+    while True:
+        check, draw, checkmate = board.status()
+        if checkmate:
+            result, reason = ('0-1' if board.current_player == Player.WHITE else '1-0'), 'checkmate'
+        elif draw:
+            result, reason = '1/2-1/2', 'stalemate'
+        elif repetitions[board.hash] >= 3:
+            result, reason = '1/2-1/2', 'repetition'
+        elif quiet >= 100:
+            result, reason = '1/2-1/2', 'fifty moves'
+        elif insufficient_material(board):
+            result, reason = '1/2-1/2', 'insufficient material'
+        elif adjudicate and abs(ahead) >= adjudicate_moves:
+            result, reason = ('1-0' if ahead > 0 else '0-1'), 'adjudication'
+        elif ply >= max_moves:
+            result, reason = '1/2-1/2', 'move cap'
+        else:
+            result = None
+        if result is not None:
+            break
+
+        player = board.current_player
+        if ply < opening:
+            move = rng.choice(list(board.valid_moves()))
+        else:
+            start = time.perf_counter()
+            move, searched = engines[player].move(board, tables[player], rng.randrange(1 << 32))
+            seconds[player] += time.perf_counter() - start
+            nodes[player] += searched
+            moves[player] += 1
+        quiet = 0 if move.captured_piece is not None or move.piece.__class__ is Pawn else quiet + 1
+        board.move(move)
+        ply += 1
+        repetitions[board.hash] += 1
+
+        material = board.score(Player.WHITE, captured=False) - board.score(Player.BLACK, captured=False)
+        if adjudicate and abs(material) >= adjudicate:
+            ahead = ahead + 1 if ahead * material > 0 else int(math.copysign(1, material))
+        else:
+            ahead = 0
+
+    game = Game.from_board(board, {'White': white.name, 'Black': black.name, 'Round': str(seed)}, result)
+    return {
+        'white': white.name,
+        'black': black.name,
+        'seed': seed,
+        'result': result,
+        'reason': reason,
+        'plies': ply,
+        'seconds': {engines[p].name: seconds[p] for p in Player},
+        'nodes': {engines[p].name: nodes[p] for p in Player},
+        'moves': {engines[p].name: moves[p] for p in Player},
+        'pgn': game.pgn(),
+    }
+
+
+def _play_games(engine, opponent, seeds, options):
+    """ Play games in a worker process
+
+    :param engine: Engine playing white in even games
+    :param opponent: Engine playing black in even games
+    :param seeds: list of (game number, seed)
+    :param options: dict of play_game keyword arguments
+    :return: list of dicts of results
+    """
+    results = []
+    for number, seed in seeds:
+        white, black = (engine, opponent) if number % 2 == 0 else (opponent, engine)
+        results.append(play_game(white, black, seed, **options))
+    return results
+
+
+def match(engine, opponent, games, seed=0, workers=None, **options):
+    """ Play a match of games between two engines, swapping colors after each game (each pair of games starts from
+    the same opening)
+
+    :param engine: Engine
+    :param opponent: Engine
+    :param games: number of games
+    :param seed: seed of the first pair of games (pairs use consecutive seeds)
+    :param workers: number of worker processes (plays in this process when None)
+    :param options: play_game keyword arguments
+    :return: generator of dicts of results in game order
+    """
+    seeds = [(number, seed + number // 2) for number in range(games)]
+    if workers is None:
+        for number_seed in seeds:
+            yield from _play_games(engine, opponent, [number_seed], options)
+        return
+    pool = ai.parallel.executor(workers)
+    futures = [pool.submit(_play_games, engine, opponent, [number_seed], options) for number_seed in seeds]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def elo(wins, draws, losses):
+    """ Estimate the Elo difference from a match score with its 95% confidence interval
+
+    :param wins: number of games won
+    :param draws: number of games drawn
+    :param losses: number of games lost
+    :return: Elo difference, lower bound, upper bound (infinite when the score is all wins or all losses)
+    """
+    def difference(score):
+        if score <= 0:
+            return -float('inf')
+        if score >= 1:
+            return float('inf')
+        return 400 * math.log10(score / (1 - score))
+
+    games = wins + draws + losses
+    if not games:
+        return 0.0, -float('inf'), float('inf')
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return difference(score), difference(score - margin), difference(score + margin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engine', action='append', required=True, help='engine options (given twice)')
+    parser.add_argument('--games', type=int, default=10, help='number of games')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first pair of games')
+    parser.add_argument('--workers', type=int, help='number of worker processes (default play in this process)')
+    parser.add_argument('--opening', type=int, default=4, help='number of random moves each game starts with')
+    parser.add_argument('--max-moves', type=int, default=300, help='moves (plies) before a game is a draw')
+    parser.add_argument('--adjudicate', type=int, default=5,
+                        help='material points ahead that wins a game when kept for --adjudicate-moves (0 for never)')
+    parser.add_argument('--adjudicate-moves', type=int, default=8,
+                        help='moves in a row a side must stay ahead to be adjudicated the winner')
+    parser.add_argument('--board', choices=sorted(BOARDS), default='Board', help='board class to play on')
+    parser.add_argument('--pgn', help='write the games to this PGN file')
+    args = parser.parse_args()
+    if len(args.engine) != 2:
+        parser.error('give exactly two engines')
+    engine, opponent = [Engine.from_string(text) for text in args.engine]
+    if engine.name == opponent.name:
+        opponent.name += ' (2)'
+
+    pgn = None if args.pgn is None else open(args.pgn, 'w')
+    score = {engine.name: [0, 0, 0] for engine in (engine, opponent)}  # wins, draws, losses
+    reasons = collections.Counter()
+    seconds = collections.Counter()
+    nodes = collections.Counter()
+    moves = collections.Counter()
+    start = time.perf_counter()
+    try:
+        print('{:>6}  {:<24}{:<24}{:<10}{:<24}{:>6}'.format('game', 'white', 'black', 'result', 'reason', 'plies'))
+        for number, result in enumerate(match(engine, opponent, args.games, args.seed, args.workers,
+                                              opening=args.opening, max_moves=args.max_moves,
+                                              adjudicate=args.adjudicate, adjudicate_moves=args.adjudicate_moves,
+                                              board_class=BOARDS[args.board]), 1):
+            print('{:>6}  {:<24}{:<24}{:<10}{:<24}{:>6}'.format(number, result['white'], result['black'],
+                                                                result['result'], result['reason'], result['plies']))
+            white, black = score[result['white']], score[result['black']]
+            if result['result'] == '1-0':
+                white[0] += 1
+                black[2] += 1
+            elif result['result'] == '0-1':
+                white[2] += 1
+                black[0] += 1
+            else:
+                white[1] += 1
+                black[1] += 1
+            reasons[result['reason']] += 1
+            seconds.update(result['seconds'])
+            nodes.update(result['nodes'])
+            moves.update(result['moves'])
+            if pgn is not None:
+                pgn.write(result['pgn'] + '\n')
+    finally:
+        if pgn is not None:
+            pgn.close()
+
+    print()
+    print('{} games in {:.1f} seconds: {}'.format(args.games, time.perf_counter() - start,
+                                                  ', '.join('{} {}'.format(n, r) for r, n in reasons.most_common())))
+    print('{:<24}{:>7}{:>7}{:>7}{:>8}{:>12}{:>12}'.format('engine', 'wins', 'draws', 'losses', 'score',
+                                                          'sec/move', 'nodes/sec'))
+    for e in (engine, opponent):
+        wins, draws, losses = score[e.name]
+        games = wins + draws + losses
+        print('{:<24}{:>7}{:>7}{:>7}{:>8.1%}{:>12.3f}{:>12.0f}'.format(
+            e.name, wins, draws, losses, (wins + draws / 2) / games if games else 0,
+            seconds[e.name] / moves[e.name] if moves[e.name] else 0,
+            nodes[e.name] / seconds[e.name] if seconds[e.name] else 0))
+    difference, low, high = elo(*score[engine.name])
+    print('Elo difference of {} over {}: {:+.0f} (95% interval {:+.0f} to {:+.0f})'.format(
+        engine.name, opponent.name, difference, low, high))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from board.board import Board
+from board.bitboard import BitBoard
 from board.location import Location
 
-__all__ = [Board, Location]
+__all__ = [Board, BitBoard, Location]
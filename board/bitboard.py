@@ -0,0 +1,408 @@
+from board.board import Board
+from board.location import Location
+from board.move import Move
+from piece import King, Queen, Rook, Bishop, Knight, Pawn
+from util.enums import Player, Side
+
+# interned locations indexed by square (square = location index, a1 = 0, h8 = 63)
+SQUARES = Location.SQUARES
+ALL = (1 << 64) - 1  # bitboard of every square
+
+# sliding directions as (rows, cols) offsets
+NORTH, EAST, NORTH_EAST, NORTH_WEST = (1, 0), (0, 1), (1, 1), (1, -1)
+SOUTH, WEST, SOUTH_WEST, SOUTH_EAST = (-1, 0), (0, -1), (-1, -1), (-1, 1)
+POSITIVE_DIRECTIONS = [NORTH, EAST, NORTH_EAST, NORTH_WEST]  # square index increases along the ray
+ROOK_DIRECTIONS = [NORTH, SOUTH, EAST, WEST]
+BISHOP_DIRECTIONS = [NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST]
+
+
+def mask(locations):
+    """ Create a bitboard from locations
+
+    :param locations: Location iterable
+    :return: bitboard
+    """
+    bitboard = 0
+    for location in locations:
+        bitboard |= 1 << location.index
+    return bitboard
+
+
+KNIGHT_ATTACKS = [mask(targets) for targets in Knight.TARGETS]
+KING_ATTACKS = [mask(targets) for targets in King.TARGETS]
+# squares attacked by a pawn indexed by [player.value][square]
+PAWN_ATTACKS = [[mask(targets) for targets in table] for table in Pawn.ATTACKS]
+RAYS = {direction: [mask(rays[0]) for rays in Location.rays([direction])]
+        for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+# (ray table, ascending) pairs for each kind of sliding piece
+ROOK_RAYS = [(RAYS[d], d in POSITIVE_DIRECTIONS) for d in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(RAYS[d], d in POSITIVE_DIRECTIONS) for d in BISHOP_DIRECTIONS]
+QUEEN_RAYS = ROOK_RAYS + BISHOP_RAYS
+
+
+def sliding_attacks(sq, rays, occupied):
+    """ Get the squares attacked by a sliding piece, stopping at (and including) the first occupied square
+
+    :param sq: integer square of the sliding piece
+    :param rays: list of (ray table, ascending) pairs that the piece slides along (e.g. ROOK_RAYS)
+    :param occupied: bitboard of all occupied squares
+    :return: bitboard
+    """
+    attacks = 0
+    for table, ascending in rays:
+        ray = table[sq]
+        blockers = ray & occupied
+        if blockers:
+            if ascending:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= table[first]
+        attacks |= ray
+    return attacks
+
+
+def squares(bitboard):
+    """ Iterate the set squares of a bitboard in ascending order
+
+    :param bitboard: integer
+    :return: integer square generator
+    """
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+
+def population(bitboard):
+    """ Count the set squares of a bitboard
+
+    :param bitboard: integer
+    :return: integer
+    """
+    return bin(bitboard).count('1')
+
+
+def _nearest(bitboard, ascending):
+    """ Get the square of a ray's bitboard closest to the ray's origin
+
+    :param bitboard: bitboard of squares on one ray
+    :param ascending: boolean if the square index increases along the ray
+    :return: integer square or -1 when the bitboard is empty
+    """
+    if ascending:
+        return (bitboard & -bitboard).bit_length() - 1
+    return bitboard.bit_length() - 1
+
+
+class BitBoard(Board):
+    """
+    Chess board that mirrors its pieces into 64-bit integer bitboards (one per piece type and player) so that move
+    generation and check detection are computed with bit operations instead of walking the piece objects
+
+    Attacks are found from the bitboards when they are needed so the board keeps no attack maps.
+    """
+    __slots__ = ('_bitboards', '_occupied')
+    ATTACK_MAPS = False
+
+    def __init__(self, new_game=True):
+        """ initializer
+
+        :param new_game: initialize a new game with pieces
+        :return:
+        """
+        # bitboards indexed by [player.value][piece class]
+        self._bitboards = [{c: 0 for c in self.PIECE_CLASSES} for _ in Player]
+        # occupancy masks indexed by [player.value]
+        self._occupied = [0 for _ in Player]
+        super().__init__(new_game)
+
+    def _place_piece(self, piece):
+        super()._place_piece(piece)
+        self._toggle(piece)
+
+    def _lift_piece(self, piece):
+        super()._lift_piece(piece)
+        self._toggle(piece)
+
+    def _toggle(self, piece):
+        """ Flip the bit of a piece's location in its bitboard and occupancy mask
+
+        :param piece: Piece class
+        :return: None
+        """
+        bit = 1 << piece.location.index
+        self._bitboards[piece.player.value][piece.__class__] ^= bit
+        self._occupied[piece.player.value] ^= bit
+
+    def bitboard(self, piece_class, player):
+        """ Get the bitboard for a piece type and player
+
+        :param piece_class: class of piece
+        :param player: Player enum
+        :return: integer bitboard
+        """
+        return self._bitboards[player.value][piece_class]
+
+    def occupied(self, player=None):
+        """ Get the occupancy mask for a player
+
+        :param player: Player enum (defaults to both players)
+        :return: integer bitboard
+        """
+        if player is None:
+            return self._occupied[0] | self._occupied[1]
+        return self._occupied[player.value]
+
+    def square_attacked(self, sq, player, occupied=None, exclude=0):
+        """ Check if a square is attacked by a given player
+
+        :param sq: integer square
+        :param player: attacking Player enum
+        :param occupied: bitboard of occupied squares (defaults to the current occupancy)
+        :param exclude: bitboard of attacking pieces to ignore (e.g. pieces that would be captured)
+        :return: boolean
+        """
+        boards = self._bitboards[player.value]
+        keep = ~exclude
+        if KNIGHT_ATTACKS[sq] & boards[Knight] & keep:
+            return True
+        if KING_ATTACKS[sq] & boards[King] & keep:
+            return True
+        # a pawn attacks sq from the squares that a pawn of the other player would attack from sq
+        if PAWN_ATTACKS[1 - player.value][sq] & boards[Pawn] & keep:
+            return True
+        if occupied is None:
+            occupied = self._occupied[0] | self._occupied[1]
+        rooks = (boards[Rook] | boards[Queen]) & keep
+        if rooks and sliding_attacks(sq, ROOK_RAYS, occupied) & rooks:
+            return True
+        bishops = (boards[Bishop] | boards[Queen]) & keep
+        if bishops and sliding_attacks(sq, BISHOP_RAYS, occupied) & bishops:
+            return True
+        return False
+
+    def attacked(self, location, player):
+        """ Check if a location is attacked by a given player
+
+        :param location: Location class
+        :param player: attacking Player enum
+        :return: boolean
+        """
+        return self.square_attacked(location.index, player)
+
+    def check(self, player, location=None):
+        """ Check if a given player is in check
+
+        :param player: Player enum
+        :param location: Location Class (defaults to current location of king)
+        :return: boolean
+        """
+        if location is None:
+            sq = self._bitboards[player.value][King].bit_length() - 1
+        else:
+            sq = location.index
+        return self.square_attacked(sq, player.opponent())
+
+    def legality(self, player):
+        """ Find what limits the moves of a player from the bitboards: the pieces checking the king, the squares that
+        capture or block a check and the pieces pinned to the king
+
+        :param player: Player enum
+        :return: tuple of (king, checkers, blocks, pins) where checkers is a bitboard of the pieces checking the king,
+                 blocks a bitboard of the squares that capture or block a single check and pins a dict of the square of
+                 a pinned piece to the bitboard of squares it can move to
+        """
+        king = self.king(player)
+        opponent = self._bitboards[1 - player.value]
+        own = self._occupied[player.value]
+        occupied = own | self._occupied[1 - player.value]
+        sq = king.location.index
+        checkers = (KNIGHT_ATTACKS[sq] & opponent[Knight]) | (PAWN_ATTACKS[player.value][sq] & opponent[Pawn])
+        blocks = checkers
+        pins = {}
+        for rays, sliders in ((ROOK_RAYS, opponent[Rook] | opponent[Queen]),
+                              (BISHOP_RAYS, opponent[Bishop] | opponent[Queen])):
+            if not sliders:
+                continue
+            for table, ascending in rays:
+                ray = table[sq]
+                if not ray & sliders:
+                    continue
+                blockers = ray & occupied
+                first = _nearest(blockers, ascending)
+                bit = 1 << first
+                if bit & sliders:
+                    # sliding check: the squares in between block it
+                    checkers |= bit
+                    blocks |= ray ^ table[first]
+                elif bit & own:
+                    second = _nearest(blockers ^ bit, ascending)
+                    if second >= 0 and (1 << second) & sliders:
+                        pins[first] = ray ^ table[second]
+        return king, checkers, blocks, pins
+
+    def legal(self, move, legality):
+        """ Check if a move is valid using the check and pin bitboards of the player
+
+        The king's new square and an en passant capture are tested for attacks on the occupancy the move leaves behind
+        rather than by making the move.
+
+        :param move: Move
+        :param legality: tuple returned by legality() for the player making the move
+        :return: boolean
+        """
+        king, checkers, blocks, pins = legality
+        if self.stats is not None:
+            self.stats.legal_checks += 1
+        piece = move.piece
+        to = move.new_location.index
+        if piece is king:
+            opponent = king.player.opponent()
+            if move.castle:
+                # the king can't castle out of or through check
+                if checkers:
+                    return False
+                if move.castle_side == Side.KING:
+                    through = to - 1
+                elif move.castle_side == Side.QUEEN:
+                    through = to + 1
+                else:
+                    raise ValueError('uh oh!!! not sure what happened')
+                if self.square_attacked(through, opponent):
+                    return False
+            # the king does not block a sliding check along the line it retreats on
+            occupied = (self._occupied[0] | self._occupied[1]) ^ (1 << move.old_location.index)
+            captured = 0 if move.captured_piece is None else 1 << to
+            return not self.square_attacked(to, opponent, occupied, captured)
+        # only the king can move out of double check
+        if checkers & (checkers - 1):
+            return False
+        fr = move.old_location.index
+        if move.en_passant:
+            # en passant removes two pieces from a row so test the king against the occupancy after the capture
+            captured = 1 << move.captured_piece.location.index
+            occupied = ((self._occupied[0] | self._occupied[1]) ^ (1 << fr) ^ captured) | (1 << to)
+            sq = king.location.index
+            return not self.square_attacked(sq, king.player.opponent(), occupied, captured)
+        bit = 1 << to
+        if fr in pins and not pins[fr] & bit:
+            return False
+        if checkers:
+            return bool(blocks & bit)
+        return True
+
+    def valid_moves(self):
+        """ Get all valid moves for the current player
+
+        The targets of each piece are masked with the squares that answer a check and the line of its pin so only the
+        king's moves and en passant captures are tested one at a time.
+
+        :return: Move generator
+        """
+        if self.stats is not None:
+            self.stats.move_generations += 1
+        return self._generate(self.current_player, self.legality(self.current_player))
+
+    def possible_moves(self, player):
+        """ Get all possible moves for a given player (these are not validated)
+
+        :param player: Player enum
+        :return: Move generator
+        """
+        return self._generate(player)
+
+    def _generate(self, player, legality=None):
+        """ Generate the moves of a player
+
+        :param player: Player enum
+        :param legality: tuple returned by legality() to only generate valid moves (None for every possible move)
+        :return: Move generator
+        """
+        own = self._occupied[player.value]
+        occupied = own | self._occupied[1 - player.value]
+        pieces_by_location = self._pieces_by_location
+        allowed, pins, double_check = ALL, {}, False
+        if legality is not None:
+            king, checkers, blocks, pins = legality
+            if checkers:
+                allowed = blocks
+                double_check = bool(checkers & (checkers - 1))
+        for p in list(self.pieces(player=player)):
+            piece_class = p.__class__
+            sq = p.location.index
+            if piece_class is King:
+                for target in squares(KING_ATTACKS[sq] & ~own):
+                    loc = SQUARES[target]
+                    move = Move(p, loc, pieces_by_location[loc])
+                    if legality is None or self.legal(move, legality):
+                        yield move
+                for move in p.castle_moves():
+                    if legality is None or self.legal(move, legality):
+                        yield move
+                continue
+            # only the king can move out of double check
+            if double_check:
+                continue
+            mask = allowed & pins.get(sq, ALL)
+            if piece_class is Pawn:
+                for move in self._pawn_moves(p, sq, occupied):
+                    if move.en_passant:
+                        if legality is None or self.legal(move, legality):
+                            yield move
+                    elif mask >> move.new_location.index & 1:
+                        yield move
+                continue
+            elif piece_class is Knight:
+                targets = KNIGHT_ATTACKS[sq]
+            elif piece_class is Bishop:
+                targets = sliding_attacks(sq, BISHOP_RAYS, occupied)
+            elif piece_class is Rook:
+                targets = sliding_attacks(sq, ROOK_RAYS, occupied)
+            else:
+                targets = sliding_attacks(sq, QUEEN_RAYS, occupied)
+            for target in squares(targets & ~own & mask):
+                loc = SQUARES[target]
+                yield Move(p, loc, pieces_by_location[loc])
+
+    def _pawn_moves(self, pawn, sq, occupied):
+        """ Get all possible moves for a pawn (these are not validated)
+
+        :param pawn: Pawn
+        :param sq: integer square of the pawn
+        :param occupied: bitboard of all occupied squares
+        :return: Move generator
+        """
+        player = pawn.player
+        pieces_by_location = self._pieces_by_location
+        step = 8 * pawn.direction
+
+        # attacking moves
+        for target in squares(PAWN_ATTACKS[player.value][sq] & self._occupied[1 - player.value]):
+            loc = SQUARES[target]
+            if loc.end_of_row:
+                for t in pawn.PROMOTIONS:
+                    yield Move.create_promotion(pawn, loc, t, pieces_by_location[loc])
+            else:
+                yield Move(pawn, loc, pieces_by_location[loc])
+
+        # single and double moves forward
+        up1 = sq + step
+        if 0 <= up1 < 64 and not occupied & (1 << up1):
+            loc = SQUARES[up1]
+            if loc.end_of_row:
+                for t in pawn.PROMOTIONS:
+                    yield Move.create_promotion(pawn, loc, t)
+            else:
+                yield Move(pawn, loc)
+                up2 = up1 + step
+                if not pawn.moved and 0 <= up2 < 64 and not occupied & (1 << up2):
+                    yield Move(pawn, SQUARES[up2])
+
+        # en passant
+        last_move = self.last_move()
+        if last_move is not None and last_move.piece.__class__ is Pawn and last_move.piece.player != player:
+            target = last_move.piece
+            if abs(last_move.old_location.row - last_move.new_location.row) == 2 and \
+                    target.location.row == pawn.location.row and abs(target.location.index - sq) == 1:
+                yield Move.create_en_passant(pawn, SQUARES[target.location.index + step], target)
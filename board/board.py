@@ -1,15 +1,34 @@
 from board.location import Location
+from board.move import Move
 from util.character_map import CharacterMap
 from piece import King, Queen, Rook, Bishop, Knight, Pawn
+from piece.base import MultipleMovePiece
 from util.enums import Player, Side
+from board import zobrist, evaluation
 import ai.minimax
+import ai.parallel
+import itertools
 import random
+import contextlib
 
 
 class Board:
     """
     Chess board class containing chess pieces and methods to make valid moves during game play
     """
+    __slots__ = ('_pieces_by_location', '_pieces', '_pieces_by_player', '_pieces_by_type', '_promoted_pawns',
+                 '_captured_pieces', '_captured_value', '_moves', '_attack_counts', '_attackers', '_attacks', '_hash',
+                 '_castling_keys', '_en_passant_key', '_material', '_positional', '_status', 'mobility', 'stats',
+                 '_loading', '_halfmove_clock', '_fullmove_number', '_history_start', 'character_map',
+                 'current_player')
+    PIECE_CLASSES = [Pawn, Knight, Bishop, Rook, Queen, King]  # piece types in encoding order
+    FEN_PIECES = {'p': Pawn, 'n': Knight, 'b': Bishop, 'r': Rook, 'q': Queen, 'k': King}  # FEN letters (black)
+    START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+    ATTACK_MAPS = True  # keep the attack maps up to date (off for boards that find attacks another way)
+    # FEN letters of the piece classes indexed by [player.value]
+    _FEN_LETTERS = [{piece_class: c.upper() for c, piece_class in FEN_PIECES.items()},
+                    {piece_class: c for c, piece_class in FEN_PIECES.items()}]
+
     def __init__(self, new_game=True):
         """ initializer
 
@@ -18,9 +37,36 @@ class Board:
         """
         self._pieces_by_location = {l: None for l in Location.all()}
         self._pieces = []
-        self._promoted_pawns = []  # pawns that are removed due to being promoted
-        self._captured_pieces = []
+        # the pieces in play of each player indexed by [player.value] and of each player and type indexed by
+        # [player.value][piece class] (in the order of _pieces)
+        self._pieces_by_player = [[] for _ in Player]
+        self._pieces_by_type = [{piece_class: [] for piece_class in self.PIECE_CLASSES} for _ in Player]
+        # pawns that are removed due to being promoted and captured pieces in the order they left the board (dicts
+        # used as ordered sets so undoing a capture or promotion is O(1))
+        self._promoted_pawns = {}
+        self._captured_pieces = {}
+        self._captured_value = [0 for _ in Player]  # value of the captured pieces indexed by [player.value]
         self._moves = []  # history of moves
+        # attack maps: number of pieces of each player attacking a square indexed by [player.value][location.index],
+        # the pieces attacking a square indexed by [location.index], and the locations counted for each piece
+        self._attack_counts = [[0] * len(Location.SQUARES) for _ in Player]
+        self._attackers = [[] for _ in Location.SQUARES]  # lists: a square has few attackers and sets are large
+        self._attacks = {}
+        # zobrist key of the pieces, castling rights and en passant (the side to move is applied by the hash property)
+        self._hash = 0
+        self._castling_keys = [0 for _ in Player]  # castling rights keys included in _hash indexed by [player.value]
+        self._en_passant_key = 0  # en passant key included in _hash
+        # running evaluation totals of the pieces in play indexed by [player.value]: material and piece-square values
+        self._material = [0 for _ in Player]
+        self._positional = [0 for _ in Player]
+        self._status = None  # (hash, status) of the last position whose status was computed
+        self.mobility = False  # count valid moves in the heuristic value (generates every move at each leaf)
+        self.stats = None  # SearchStats counting move generation while a search is captured
+        self._loading = False  # pieces are being bulk loaded (attack maps and castling keys are built afterwards)
+        # FEN move counters of the position before the first move in the history that was played on this board
+        self._halfmove_clock = 0
+        self._fullmove_number = 1
+        self._history_start = 0  # number of moves in the history that set up the position (en passant)
         self.character_map = CharacterMap()  # piece character map
         self.current_player = Player.WHITE  # current player's turn
 
@@ -58,36 +104,358 @@ class Board:
         King(Location(1, 'e'), Player.WHITE, self)
         Queen(Location(1, 'd'), Player.WHITE, self)
 
+    def encode(self):
+        """ Serialize the position into a compact form that decode rebuilds it from (the move history is not kept)
+
+        Two header bytes hold the current player and mobility flag and the square of a pawn that just moved two rows
+        (plus one, zero for none) followed by two bytes for each piece: its square then its type, player and moved
+        flag.  The mobility flag is kept so a search of the decoded board evaluates like the encoded one.
+
+        :return: bytes
+        """
+        last_move = self.last_move()
+        en_passant = 0
+        if last_move is not None and last_move.piece.__class__ is Pawn and \
+                abs(last_move.old_location.row - last_move.new_location.row) == 2:
+            en_passant = last_move.new_location.index + 1
+        data = [self.current_player.value | self.mobility << 1, en_passant]
+        # pieces are kept in square order so the same position always decodes to the same piece order
+        for p in sorted(self._pieces, key=lambda p: p.location.index):
+            data.append(p.location.index)
+            data.append(self.PIECE_CLASSES.index(p.__class__) | p.player.value << 3 | p.moved << 4)
+        return bytes(data)
+
+    @classmethod
+    def decode(cls, data):
+        """ Create a board from the position serialized by encode
+
+        :param data: bytes
+        :return: Board
+        """
+        squares = Location.SQUARES
+        pieces = []
+        for i in range(2, len(data), 2):
+            flags = data[i + 1]
+            pieces.append((cls.PIECE_CLASSES[flags & 7], Player(flags >> 3 & 1), squares[data[i]], flags >> 4 & 1))
+        board = cls._load(pieces, Player(data[0] & 1), squares[data[1] - 1] if data[1] else None)
+        board.mobility = bool(data[0] >> 1 & 1)
+        return board
+
+    @classmethod
+    def from_fen(cls, fen):
+        """ Create a board from a FEN string
+
+        Castling rights and en passant are kept by the pieces and the move history: pawns off their starting row and
+        kings and rooks without castling rights are marked as moved and the pawn that can be captured en passant is
+        given its double move.  Castling rights of a king or rook that is not on its starting square can't be kept.
+
+        :param fen: FEN string (the move counters are optional)
+        :return: Board
+        """
+        fields = fen.split()
+        if not 4 <= len(fields) <= 6:
+            raise ValueError("'{}' is not a valid FEN: expected 4 to 6 fields".format(fen))
+        placement, side, castling, en_passant = fields[:4]
+        if side == 'w':
+            current_player = Player.WHITE
+        elif side == 'b':
+            current_player = Player.BLACK
+        else:
+            raise ValueError("'{}' is not a valid FEN: side to move must be w or b".format(fen))
+
+        # castling rights as the squares of the kings and rooks that have not moved
+        unmoved = set()
+        for c in castling:
+            if c == 'K':
+                unmoved.update(['e1', 'h1'])
+            elif c == 'Q':
+                unmoved.update(['e1', 'a1'])
+            elif c == 'k':
+                unmoved.update(['e8', 'h8'])
+            elif c == 'q':
+                unmoved.update(['e8', 'a8'])
+            elif c != '-':
+                raise ValueError("'{}' is not a valid FEN: unknown castling right '{}'".format(fen, c))
+
+        ranks = placement.split('/')
+        if len(ranks) != 8:
+            raise ValueError("'{}' is not a valid FEN: expected 8 rows".format(fen))
+        squares = Location.SQUARES
+        fen_pieces = cls.FEN_PIECES
+        pieces = []
+        for i, rank in enumerate(ranks):
+            index = (7 - i) * 8
+            end = index + 8
+            for c in rank:
+                if c in '12345678':
+                    index += int(c)
+                    continue
+                piece_class = fen_pieces.get(c.lower())
+                if piece_class is None or index >= end:
+                    raise ValueError("'{}' is not a valid FEN: bad row '{}'".format(fen, rank))
+                player = Player.BLACK if c.islower() else Player.WHITE
+                location = squares[index]
+                if piece_class is Pawn:
+                    moved = location._row != (1 if player == Player.WHITE else 6)
+                elif piece_class is King or piece_class is Rook:
+                    moved = location._str not in unmoved
+                else:
+                    moved = False
+                pieces.append((piece_class, player, location, moved))
+                index += 1
+            if index != end:
+                raise ValueError("'{}' is not a valid FEN: bad row '{}'".format(fen, rank))
+        for player in Player:
+            if sum(1 for piece_class, p, _, _ in pieces if piece_class is King and p == player) != 1:
+                raise ValueError("'{}' is not a valid FEN: {} must have one king".format(fen, player.name.lower()))
+
+        pawn = None
+        if en_passant != '-':
+            # the pawn that moved two rows is one row past the square it can be captured on
+            pawn = Location.from_string(en_passant).offset(-1 if current_player == Player.WHITE else 1, 0)
+
+        board = cls._load(pieces, current_player, pawn)
+        if len(fields) > 4:
+            board._halfmove_clock = int(fields[4])
+        if len(fields) > 5:
+            board._fullmove_number = int(fields[5])
+        return board
+
+    @classmethod
+    def _load(cls, pieces, current_player, en_passant=None):
+        """ Create a board from its pieces in one pass: the attack maps and castling keys are built once every piece
+        is placed instead of being updated as each piece is placed
+
+        :param pieces: iterable of (piece class, Player enum, Location, moved) tuples
+        :param current_player: Player enum to move
+        :param en_passant: Location of a pawn that just moved two rows (or None)
+        :return: Board
+        """
+        board = cls(False)
+        board._loading = True
+        pawn = None
+        for piece_class, player, location, moved in pieces:
+            if location is en_passant:
+                # start the pawn two rows back so the double move can be replayed
+                pawn = piece_class(location.offset(-2 if player == Player.WHITE else 2, 0), player, board)
+            else:
+                piece = piece_class(location, player, board)
+                piece._total_moves = int(moved)
+        board._loading = False
+        if board.ATTACK_MAPS:
+            for piece in board._pieces:
+                board._add_attacks(piece)
+        for player in Player:
+            board._update_castling_key(player)
+
+        if pawn is not None:
+            board.current_player = pawn.player
+            board.move(Move(pawn, en_passant))
+            board._history_start = len(board._moves)
+        board.current_player = current_player
+        return board
+
+    def to_fen(self):
+        """ Get the FEN string of the position
+
+        :return: str
+        """
+        letters = self._FEN_LETTERS
+        pieces_by_location = self._pieces_by_location
+        squares = Location.SQUARES
+        rows = []
+        for index in range(56, -1, -8):
+            text = ''
+            empty = 0
+            for location in squares[index:index + 8]:
+                p = pieces_by_location[location]
+                if p is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += letters[p.player.value][p.__class__]
+            rows.append(text + (str(empty) if empty else ''))
+
+        castling = ''
+        for player, rights in [(Player.WHITE, 'KQ'), (Player.BLACK, 'kq')]:
+            for king in self._pieces_by_type[player.value][King]:
+                if not king.moved:
+                    for side, c in zip([Side.KING, Side.QUEEN], rights):
+                        if king._get_unmoved_rook(side) is not None:
+                            castling += c
+
+        en_passant = '-'
+        last_move = self.last_move()
+        if last_move is not None and last_move.piece.__class__ is Pawn and \
+                abs(last_move.old_location.row - last_move.new_location.row) == 2:
+            en_passant = str(last_move.new_location.offset(-last_move.piece.direction, 0))
+
+        # count the moves played since the position was set up
+        moves = self._moves[self._history_start:]
+        halfmove_clock = 0
+        for move in reversed(moves):
+            if move.captured_piece is not None or move.piece.__class__ is Pawn:
+                break
+            halfmove_clock += 1
+        else:
+            halfmove_clock += self._halfmove_clock
+        black_first = (self.current_player == Player.BLACK) == (len(moves) % 2 == 0)
+        fullmove_number = self._fullmove_number + (len(moves) + black_first) // 2
+
+        return '{} {} {} {} {} {}'.format('/'.join(rows), 'w' if self.current_player == Player.WHITE else 'b',
+                                          castling or '-', en_passant, halfmove_clock, fullmove_number)
+
     def add_piece(self, piece):
         if not self.empty(piece.location):
             raise ValueError('board already contains a piece at {}'.format(piece.location))
-        self._pieces.append(piece)
-        self._pieces_by_location[piece.location] = piece
+        self._place_piece(piece)
 
     def undo_add_piece(self, piece):
         p = self.piece(piece.location)
         if p != piece:
             raise ValueError('this piece is not at the location')
-        self._pieces.remove(piece)
-        self._pieces_by_location[piece.location] = None
+        self._lift_piece(piece)
 
     def remove_piece(self, piece):
-        self._pieces.remove(piece)
-        self._pieces_by_location[piece.location] = None
+        self._lift_piece(piece)
 
     def undo_remove_piece(self, piece):
+        self._place_piece(piece)
+
+    def _place_piece(self, piece):
+        """ Put a piece on the board at its location (every piece added to the board passes through here)
+
+        :param piece: Piece class
+        :return: None
+        """
         self._pieces.append(piece)
+        self._pieces_by_player[piece.player.value].append(piece)
+        self._pieces_by_type[piece.player.value][piece.__class__].append(piece)
         self._pieces_by_location[piece.location] = piece
+        self._hash ^= zobrist.piece_key(piece)
+        self._material[piece.player.value] += piece.VALUE
+        self._positional[piece.player.value] += evaluation.positional_value(piece)
+        if self._loading:
+            return
+        if self.ATTACK_MAPS:
+            # sliding pieces that reached this location are now blocked by the piece
+            self._refresh_attacks(piece.location)
+            self._add_attacks(piece)
+        if piece.__class__ is King or piece.__class__ is Rook:
+            self._update_castling_key(piece.player)
+
+    def _lift_piece(self, piece):
+        """ Take a piece off of the board (every piece removed from the board passes through here)
+
+        :param piece: Piece class
+        :return: None
+        """
+        if self.ATTACK_MAPS:
+            self._remove_attacks(piece)
+        self._pieces.remove(piece)
+        self._pieces_by_player[piece.player.value].remove(piece)
+        self._pieces_by_type[piece.player.value][piece.__class__].remove(piece)
+        self._pieces_by_location[piece.location] = None
+        if self.ATTACK_MAPS:
+            # sliding pieces that were blocked by the piece now reach further
+            self._refresh_attacks(piece.location)
+        self._hash ^= zobrist.piece_key(piece)
+        self._material[piece.player.value] -= piece.VALUE
+        self._positional[piece.player.value] -= evaluation.positional_value(piece)
+        if piece.__class__ is King or piece.__class__ is Rook:
+            self._update_castling_key(piece.player)
+
+    def _update_castling_key(self, player):
+        """ Replace the castling rights key of a player in the hash (called when a king or rook changes)
+
+        :param player: Player enum
+        :return: None
+        """
+        key = 0
+        for king in self._pieces_by_type[player.value][King]:
+            if not king.moved:
+                for side in Side:
+                    if king._get_unmoved_rook(side) is not None:
+                        key ^= zobrist.CASTLING_KEYS[player.value][side.value]
+        self._hash ^= self._castling_keys[player.value] ^ key
+        self._castling_keys[player.value] = key
+
+    def _update_en_passant_key(self):
+        """ Replace the en passant key in the hash (called when the last move changes)
+
+        :return: None
+        """
+        key = 0
+        move = self.last_move()
+        if move is not None and move.piece.__class__ is Pawn and \
+                abs(move.old_location.row - move.new_location.row) == 2:
+            # only a pawn that can be attacked en passant changes the position
+            for col in [-1, 1]:
+                loc = move.new_location.offset(0, col)
+                p = None if loc is None else self.piece(loc, move.piece.player.opponent())
+                if p is not None and p.__class__ is Pawn:
+                    key = zobrist.EN_PASSANT_KEYS[move.new_location._col]
+        self._hash ^= self._en_passant_key ^ key
+        self._en_passant_key = key
+
+    @property
+    def hash(self):
+        """ Zobrist hash of the position (pieces, castling rights, en passant and side to move)
+
+        :return: 64 bit integer
+        """
+        if self.current_player == Player.BLACK:
+            return self._hash ^ zobrist.SIDE_KEY
+        return self._hash
+
+    def _add_attacks(self, piece):
+        """ Count the locations attacked by a piece in the attack maps
+
+        :param piece: Piece class
+        :return: None
+        """
+        locations = tuple(piece.controlled_locations())
+        self._attacks[piece] = locations
+        counts = self._attack_counts[piece.player.value]
+        attackers = self._attackers
+        for loc in locations:
+            counts[loc.index] += 1
+            attackers[loc.index].append(piece)
+
+    def _remove_attacks(self, piece):
+        """ Remove the locations attacked by a piece from the attack maps
+
+        :param piece: Piece class
+        :return: None
+        """
+        counts = self._attack_counts[piece.player.value]
+        attackers = self._attackers
+        for loc in self._attacks.pop(piece):
+            counts[loc.index] -= 1
+            attackers[loc.index].remove(piece)
+
+    def _refresh_attacks(self, location):
+        """ Recount the attacks of the sliding pieces whose rays reach a location (called when the location changes
+        between empty and occupied)
+
+        :param location: Location class
+        :return: None
+        """
+        for p in [p for p in self._attackers[location.index] if isinstance(p, MultipleMovePiece)]:
+            self._remove_attacks(p)
+            self._add_attacks(p)
 
     def capture_piece(self, piece):
         self.remove_piece(piece)
-        #self._pieces.remove(piece)
-        self._captured_pieces.append(piece)
+        self._captured_pieces[piece] = None
+        self._captured_value[piece.player.value] += piece.VALUE
 
     def undo_capture_piece(self, piece):
         self.undo_remove_piece(piece)
-        #self._pieces.append(piece)
-        self._captured_pieces.remove(piece)
+        del self._captured_pieces[piece]
+        self._captured_value[piece.player.value] -= piece.VALUE
 
     def move_piece(self, piece, new_location):
         if not self.empty(new_location):
@@ -108,7 +476,7 @@ class Board:
         # remove the pawn
         self.remove_piece(pawn)
         # store the pawn in promoted pieces
-        self._promoted_pawns.append(pawn)
+        self._promoted_pawns[pawn] = None
         # create the new piece
         promoted_piece_class(pawn.location, pawn.player, self)
 
@@ -124,7 +492,7 @@ class Board:
         # undo remove the pawn
         self.undo_remove_piece(pawn)
         # remove the pawn from promoted storage
-        self._promoted_pawns.remove(pawn)
+        del self._promoted_pawns[pawn]
 
     def move(self, move):
         """ Make a move on the board and update the current player to the next player.  Validation of the move
@@ -158,6 +526,7 @@ class Board:
 
         self.current_player = self.current_player.opponent()
         self._moves.append(move)
+        self._update_en_passant_key()
 
     def undo_move(self):
         """ Undo the previous move on the board and update the current player to the previous player
@@ -193,14 +562,18 @@ class Board:
             if move.captured_piece:
                 self.undo_capture_piece(move.captured_piece)
         self.current_player = self.current_player.opponent()
+        self._update_en_passant_key()
 
     def valid_moves(self):
         """ Get all valid moves for the current player
 
         :return: Move generator
         """
+        if self.stats is not None:
+            self.stats.move_generations += 1
+        legality = self.legality(self.current_player)
         for move in self.possible_moves(self.current_player):
-            if self.valid_move(move):
+            if self.legal(move, legality):
                 yield move
 
     def valid_move(self, move):
@@ -209,21 +582,98 @@ class Board:
         :param move: Move
         :return: boolean
         """
-        # castle moves can't move king through an attacked area
-        if move.castle:
-            if move.castle_side == Side.KING:
-                if self.check(self.current_player, move.new_location.offset(0, -1)):
+        return self.legal(move, self.legality(move.piece.player))
+
+    def move_from_key(self, key):
+        """ Find the valid move of the current player with a key (see Move.from_key)
+
+        :param key: integer key of the move
+        :return: Move or None if no valid move has the key
+        """
+        return Move.from_key(self, key)
+
+    def legality(self, player):
+        """ Find what limits the moves of a player: the pieces checking the king, the locations that block a check
+        and the pieces pinned to the king
+
+        :param player: Player enum
+        :return: tuple of (king, checkers, blocks, pins, behind) where checkers is a list of pieces checking the king,
+                 blocks a set of locations that block a sliding check, pins a dict of pinned piece to the set of
+                 locations it can move to, and behind a set of locations that a sliding checker attacks through the
+                 king
+        """
+        king = self.king(player)
+        opponent = player.opponent()
+        checkers = [p for p in self._attackers[king.location.index] if p.player == opponent]
+        blocks = set()
+        pins = {}
+        behind = set()
+        pieces_by_location = self._pieces_by_location
+        for vector, ray in zip(Queen.MOVE_VECTORS, Queen.RAYS[king.location.index]):
+            pinned = None
+            for i, loc in enumerate(ray):
+                p = pieces_by_location[loc]
+                if p is None:
+                    continue
+                if p.player == player:
+                    if pinned is not None:
+                        break
+                    pinned = p
+                    continue
+                if isinstance(p, MultipleMovePiece) and vector in p.MOVE_VECTORS:
+                    if pinned is None:
+                        # sliding check: the locations in between block it and the king can't retreat along the ray
+                        blocks.update(ray[:i])
+                        retreat = king.location.offset(-vector[0], -vector[1])
+                        if retreat is not None:
+                            behind.add(retreat)
+                    else:
+                        pins[pinned] = set(ray[:i + 1])
+                break
+        return king, checkers, blocks, pins, behind
+
+    def legal(self, move, legality):
+        """ Check if a move is valid using the check and pin information of the player
+
+        :param move: Move
+        :param legality: tuple returned by legality() for the player making the move
+        :return: boolean
+        """
+        king, checkers, blocks, pins, behind = legality
+        piece = move.piece
+        if self.stats is not None:
+            self.stats.legal_checks += 1
+        attacked = self._attack_counts[piece.player.opponent().value]
+        if piece is king:
+            if move.castle:
+                # the king can't castle out of or through check
+                if checkers:
                     return False
-            elif move.castle_side == Side.QUEEN:
-                if self.check(self.current_player, move.new_location.offset(0, 1)):
+                if move.castle_side == Side.KING:
+                    through = move.new_location.offset(0, -1)
+                elif move.castle_side == Side.QUEEN:
+                    through = move.new_location.offset(0, 1)
+                else:
+                    raise ValueError('uh oh!!! not sure what happened')
+                if attacked[through.index]:
                     return False
-            else:
-                raise ValueError('uh oh!!! not sure what happened')
-        # make the move and see if the player is in check
-        self.move(move)
-        check = self.check(self.current_player.opponent())
-        self.undo_move()
-        return not check
+            return not attacked[move.new_location.index] and move.new_location not in behind
+        # only the king can move out of double check
+        if len(checkers) > 1:
+            return False
+        # en passant removes two pieces from a row so test it by making the move
+        if move.en_passant:
+            if self.stats is not None:
+                self.stats.make_unmake += 1
+            self.move(move)
+            check = self.check(self.current_player.opponent())
+            self.undo_move()
+            return not check
+        if piece in pins and move.new_location not in pins[piece]:
+            return False
+        if checkers:
+            return move.captured_piece is checkers[0] or move.new_location in blocks
+        return True
 
     def score(self, player=None, captured=True):
         """ Get the score for a given player (defaults to the current player)
@@ -233,15 +683,18 @@ class Board:
         :return: score as integer
         """
         player = self.current_player if player is None else player
-        s = 0
-        if captured:
-            for p in self._captured_pieces:
-                if p.player != player:
-                    s += p.VALUE
-        else:
-            for p in self.pieces(player=player):
-                s += p.VALUE
-        return s
+        if not captured:
+            return self._material[player.value]
+        return self._captured_value[player.opponent().value]
+
+    def positional_score(self, player=None):
+        """ Get the sum of the piece-square values of a player's pieces in play (defaults to the current player)
+
+        :param player: Player Enum
+        :return: centipawns
+        """
+        player = self.current_player if player is None else player
+        return self._positional[player.value]
 
     def check(self, player, location=None):
         """ Check if a given player is in check
@@ -250,14 +703,27 @@ class Board:
         :param location: Location Class (defaults to current location of king)
         :return: boolean
         """
-        king = list(self.pieces(piece_class=King, player=player))[0]
-        return king.checked(location)
+        return self.king(player).checked(location)
+
+    def attacked(self, location, player):
+        """ Check if a location is attacked by a given player
+
+        :param location: Location class
+        :param player: attacking Player enum
+        :return: boolean
+        """
+        return self._attack_counts[player.value][location.index] > 0
 
     def status(self):
+        # the status is kept for the last position since the search asks for it again when evaluating
+        if self._status is not None and self._status[0] == self.hash:
+            return self._status[1]
         check = self.check(self.current_player)
-        valid_moves = len(list(self.valid_moves()))
-        draw = valid_moves == 0 and not check
-        checkmate = valid_moves == 0 and check
+        # only the existence of a valid move matters so stop at the first one
+        no_moves = next(self.valid_moves(), None) is None
+        draw = no_moves and not check
+        checkmate = no_moves and check
+        self._status = (self.hash, (check, draw, checkmate))
         return check, draw, checkmate
 
     def game_over(self):
@@ -267,17 +733,16 @@ class Board:
     def heuristic_value(self, player, depth):
         """ Calculate the heuristic_value of the game state for minimax algorithm
 
+        Material and piece-square values are running totals kept as pieces are placed and lifted so only the game
+        status is computed here; mobility is counted when enabled on the board.
+
         :param player: maximizing player
         :param depth: current depth in the search tree
         :return: value of current game state
         """
-        check = self.check(self.current_player)
-        valid_moves = len(list(self.valid_moves()))
-        draw = valid_moves == 0 and not check
-        checkmate = valid_moves == 0 and check
-
-        current_score = self.score(self.current_player, False)
-        opponent_score = self.score(self.current_player.opponent(), False)
+        check, draw, checkmate = self.status()
+        current, opponent = self.current_player.value, self.current_player.opponent().value
+        material = self._material[current] - self._material[opponent]
 
         val = 0
         if checkmate:
@@ -286,10 +751,14 @@ class Board:
         if draw:
             # a draw is undesirable if current player is beating the opponent
             # a draw is desirable if current player is losing
-            val += (current_score - opponent_score) * 1000
+            val += material * 1000
 
-        # more valid moves plus a better score spread is desirable
-        val += 1 * valid_moves + 10 * (current_score - opponent_score)
+        # a better score spread and better placed pieces are desirable
+        val += evaluation.MATERIAL_WEIGHT * material
+        val += evaluation.POSITIONAL_WEIGHT * (self._positional[current] - self._positional[opponent])
+        if self.mobility:
+            # more valid moves is desirable
+            val += evaluation.MOBILITY_WEIGHT * sum(1 for _ in self.valid_moves())
 
         # prefer lower depth in search tree
         val /= (depth + 1)
@@ -302,14 +771,100 @@ class Board:
         """
         return random.choice(list(self.valid_moves()))
 
-    def recommended_move(self, depth=2):
-        """ Use minimax ai to determine a move
+    def recommended_move(self, depth=None, table=None, time_limit=None, ordering=None, quiescence=None,
+                         workers=None, seed=None, stats=None, book=None, tablebases=None):
+        """ Use minimax ai to determine a move (or the opening book or the endgame tables when the position is in
+        them)
+
+        :param depth: Depth to search in minimax tree (defaults to 2 or no limit when a time limit is given)
+        :param table: TranspositionTable to keep search results in between searches (optional)
+        :param time_limit: seconds to search for; deepens iteratively and returns the deepest completed search
+        :param ordering: MoveOrdering that collects the search's cutoff statistics (defaults to a new ordering)
+        :param quiescence: Quiescence that searches captures past the depth and counts its nodes (defaults to a new
+            quiescence search)
+        :param workers: number of processes to split the root moves between (searches in this process when None)
+        :param seed: seed for choosing between equally good moves so the same position gives the same move
+        :param stats: SearchStats that counts and profiles the search (the parallel search only counts the work done
+            in this process)
+        :param book: OpeningBook whose moves are played without searching while the position is in it
+        :param tablebases: Tablebases whose best moves are played without searching in the endings of its tables (the
+            search also scores the endings it reaches exactly)
+        :return: Move
+        """
+        if workers is not None and time_limit is not None:
+            raise ValueError('the parallel search searches to a fixed depth and does not take a time limit')
+        if book is not None:
+            move = book.choose(self, seed)
+            if move is not None:
+                return move
+        moves = None if tablebases is None else tablebases.best_moves(self)
+        if moves:
+            return self._choose(moves, seed)
+        if table is not None:
+            table.new_search()
+        ordering = ai.minimax.MoveOrdering() if ordering is None else ordering
+        quiescence = ai.minimax.Quiescence() if quiescence is None else quiescence
+        with contextlib.nullcontext() if stats is None else stats.capture(self):
+            if time_limit is not None:
+                score, moves, _ = ai.minimax.iterative_deepening(self, self.current_player, depth, time_limit, table,
+                                                                 ordering, quiescence, stats, tablebases)
+            elif workers is not None:
+                depth = 2 if depth is None else depth
+                score, moves = ai.parallel.parallel_search(self, depth, workers, table, ordering, quiescence, stats,
+                                                           tablebases)
+            else:
+                depth = 2 if depth is None else depth
+                score, moves = ai.minimax.alphabeta(self, self.current_player, 0, depth, -float('inf'), float('inf'),
+                                                    table, ordering=ordering, quiescence=quiescence, stats=stats,
+                                                    tablebases=tablebases)
+        return self._choose(moves, seed)
 
-        :param depth: Depth to search in minimax tree
+    @staticmethod
+    def _choose(moves, seed=None):
+        """ Pick one of equally good moves
+
+        :param moves: list of Move
+        :param seed: seed for the choice so the same moves give the same move
         :return: Move
         """
-        score, moves = ai.minimax.alphabeta(self, self.current_player, 0, depth, -float('inf'), float('inf'))
-        return random.choice(moves)
+        if seed is None:
+            return random.choice(moves)
+        # the order of equally good moves depends on the order pieces were moved so sort them first
+        return random.Random(seed).choice(sorted(moves, key=lambda m: m.key))
+
+    def perft(self, depth):
+        """ Count the positions reached by every sequence of valid moves of a given length (move generation test)
+
+        :param depth: number of moves
+        :return: number of positions
+        """
+        if depth == 0:
+            return 1
+        moves = list(self.valid_moves())
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.move(move)
+            nodes += self.perft(depth - 1)
+            self.undo_move()
+        return nodes
+
+    def divide(self, depth):
+        """ Count the positions reached after each valid move (perft split by the first move)
+
+        :param depth: number of moves including the first move
+        :return: dict of positions keyed by coordinate notation of the first move (e.g. e2e4 or a7a8q)
+        """
+        nodes = {}
+        for move in list(self.valid_moves()):
+            key = '{}{}'.format(move.old_location, move.new_location)
+            if move.promotion:
+                key += self.character_map.algebraic_notation(move.piece.player, move.promotion_piece_class).lower()
+            self.move(move)
+            nodes[key] = self.perft(depth - 1)
+            self.undo_move()
+        return nodes
 
     def draw(self):
         """ Check if the game is a draw (current player has no valid moves but is not in check)
@@ -337,24 +892,32 @@ class Board:
         return None
 
     def pieces(self, piece_class=None, player=None):
-        """ Search and return pieces that match the filters
+        """ Get the pieces in play that match the filters (from the indexes kept by player and type)
 
         :param piece_class: class of piece to return (defaults to all classes)
         :param player: Player Enum (defaults to both players)
-        :return: Piece generator
-        """
-        for p in self._pieces:
-            if piece_class is not None and player is not None:
-                if isinstance(p, piece_class) and p.player == player:
-                    yield p
-            elif piece_class is not None:
-                if isinstance(p, piece_class):
-                    yield p
-            elif player is not None:
-                if p.player == player:
-                    yield p
-            else:
-                yield p
+        :return: Piece iterator
+        """
+        if piece_class is None:
+            if player is None:
+                return iter(self._pieces)
+            return iter(self._pieces_by_player[player.value])
+        if piece_class not in self._pieces_by_type[0]:
+            # a base class (e.g. MultipleMovePiece) matches the pieces of every class derived from it
+            return (p for p in self.pieces(player=player) if isinstance(p, piece_class))
+        if player is None:
+            return itertools.chain(self._pieces_by_type[Player.WHITE.value][piece_class],
+                                   self._pieces_by_type[Player.BLACK.value][piece_class])
+        return iter(self._pieces_by_type[player.value][piece_class])
+
+    def king(self, player):
+        """ Get the king of a player
+
+        :param player: Player enum
+        :return: King or None if the player has no king
+        """
+        kings = self._pieces_by_type[player.value][King]
+        return kings[0] if kings else None
 
     def piece(self, location, player=None):
         """ Get the piece at a given location and player if it exists
@@ -378,7 +941,7 @@ class Board:
         return self.piece(location, player) is None
 
     def attacked_locations(self, player):
-        """ Get all locations that are under attack by a given player
+        """ Get all locations that are under attack by a given player (the locations a piece could move to)
 
         :param player: Player enum
         :return: Location generator
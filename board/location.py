@@ -4,26 +4,52 @@ from util.enums import Color
 class Location:
     """
     Location on a chessboard
+
+    There are only 64 locations; they are created once and interned so Location(row, col) always returns the same
+    object for the same square.  Each location has an integer square index (a1 = 0, b1 = 1, ..., h8 = 63).
     """
+    __slots__ = ('row', 'col', '_row', '_col', 'index', 'end_of_row', '_str', '_hash')
     ROWS = [1, 2, 3, 4, 5, 6, 7, 8]  # RANKS
     COLS = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']  # FILES
+    SQUARES = []  # interned locations indexed by square index
+    _INTERNED = {}  # interned locations keyed by (row, col)
 
-    def __init__(self, row, col):
-        """ initializer
+    def __new__(cls, row, col):
+        """ Get the interned location
 
         :param row: integer
         :param col: str
-        :return:
+        :return: Location
         """
+        try:
+            return cls._INTERNED[(row, col)]
+        except (KeyError, TypeError):
+            pass
+
         # validate the input
-        if row not in self.ROWS:
-            raise ValueError("'{}' is not a valid location")
-        elif col not in self.COLS:
-            raise ValueError("'{}' is not a valid location")
+        if row not in cls.ROWS:
+            raise ValueError("'{}' is not a valid location".format(row))
+        elif not isinstance(col, str) or col.lower() not in cls.COLS:
+            raise ValueError("'{}' is not a valid location".format(col))
+        return cls._INTERNED[(row, col.lower())]
 
-        self.row, self.col = row, col.lower()
-        self._row = self.ROWS.index(self.row)
-        self._col = self.COLS.index(self.col)
+    @classmethod
+    def _create(cls, row, col):
+        """ Create a new location (only used to build the interned table)
+
+        :param row: integer
+        :param col: str
+        :return: Location
+        """
+        self = object.__new__(cls)
+        self.row, self.col = row, col
+        self._row = cls.ROWS.index(row)
+        self._col = cls.COLS.index(col)
+        self.index = self._row * 8 + self._col
+        self.end_of_row = row == cls.ROWS[0] or row == cls.ROWS[-1]
+        self._str = '{}{}'.format(col, row)
+        self._hash = hash(self._str)  # equal to the hash of the string so str keys match (see __eq__)
+        return self
 
     @property
     def color(self):
@@ -31,8 +57,8 @@ class Location:
 
         :return: Color enum
         """
-        even_col = self.COLS.index(self.col) % 2 == 0
-        even_row = self.ROWS.index(self.row) % 2 == 0
+        even_col = self._col % 2 == 0
+        even_row = self._row % 2 == 0
         if even_row:
             return Color.BLACK if even_col else Color.WHITE
         else:
@@ -47,34 +73,37 @@ class Location:
         """
         col = self._col + cols
         row = self._row + rows
-        if 0 <= col < len(self.COLS) and 0 <= row < len(self.ROWS):
-            return Location(self.ROWS[row], self.COLS[col])
+        if 0 <= col < 8 and 0 <= row < 8:
+            return self.SQUARES[row * 8 + col]
         return None
 
-    @property
-    def end_of_row(self):
-        """ Check if the current location is on the top or bottom row of the board
-
-        :return: boolean
-        """
-        return self.row == self.ROWS[0] or self.row == self.ROWS[-1]
-
     def __repr__(self):
         return '{}({}, {})'.format(self.__class__.__name__, repr(self.row), repr(self.col))
 
     def __str__(self):
-        return '{}{}'.format(self.col, self.row)
+        return self._str
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __eq__(self, other):
-        if self.__class__ is other.__class__:  # hasattr(other, 'col') and hasattr(other, 'row'):
-            return (self.col, self.row) == (other.col, other.row)
+        if self is other:
+            return True
+        elif self.__class__ is other.__class__:
+            return False
         elif other.__class__ is str:
-            return str(self) == str(other)
+            return self._str == other
         return NotImplemented
 
+    def __reduce__(self):
+        return self.__class__, (self.row, self.col)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def __getitem__(self, index):
         if index == 0:
             return self.row
@@ -129,6 +158,44 @@ class Location:
 
     @classmethod
     def all(cls):
-        for row in cls.ROWS:
-            for col in cls.COLS:
-                yield cls(row, col)
\ No newline at end of file
+        yield from cls.SQUARES
+
+    @classmethod
+    def targets(cls, vectors):
+        """ Precompute the locations reached by a single step of each vector from every square
+
+        :param vectors: list of (rows, cols) offsets
+        :return: list indexed by square index of Location tuples
+        """
+        table = []
+        for location in cls.SQUARES:
+            table.append(tuple(t for t in (location.offset(row, col) for row, col in vectors) if t is not None))
+        return table
+
+    @classmethod
+    def rays(cls, vectors):
+        """ Precompute the rays (locations repeatedly stepping by a vector until the edge of the board) from every
+        square
+
+        :param vectors: list of (rows, cols) offsets
+        :return: list indexed by square index of tuples containing one Location tuple per vector
+        """
+        table = []
+        for location in cls.SQUARES:
+            rays = []
+            for row, col in vectors:
+                ray = []
+                loc = location.offset(row, col)
+                while loc is not None:
+                    ray.append(loc)
+                    loc = loc.offset(row, col)
+                rays.append(tuple(ray))
+            table.append(tuple(rays))
+        return table
+
+
+for _row in Location.ROWS:
+    for _col in Location.COLS:
+        Location._INTERNED[(_row, _col)] = Location._create(_row, _col)
+        Location.SQUARES.append(Location._INTERNED[(_row, _col)])
+del _row, _col
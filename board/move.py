@@ -1,10 +1,34 @@
+from board.location import Location
 from util.enums import Side
 
 
 class Move:
     """
     Data structure to hold needed information relating to a chess move
+
+    Moves are made for every position searched so they have no instance dict and only standard moves' fields are
+    stored; castling, en passant and promotion moves are subclasses made by the create_* methods that add their own
+    fields (the rest read the defaults below).  Each move has an integer key packing its from square, to square and
+    promotion (from | to << 6 | promotion << 12 where promotion is 0 or 1 + the index of the piece class in
+    Pawn.PROMOTIONS) that identifies it among the moves of its position; moves compare and hash by their key and
+    pieces, and Move.from_key finds the move of a position again from its key.
     """
+    __slots__ = ('piece', 'old_location', 'new_location', 'captured_piece', 'key')
+
+    # castling
+    castle = False
+    rook_piece = None
+    rook_old_location = None
+    rook_new_location = None
+    castle_side = None
+
+    # en passant
+    en_passant = False
+
+    # promotion
+    promotion = False
+    promotion_piece_class = None
+
     def __init__(self, piece, location, captured_piece=None):
         """ initializer
 
@@ -13,25 +37,11 @@ class Move:
         :param captured_piece: Piece class
         :return:
         """
-        # standard moves
         self.piece = piece
         self.old_location = piece.location
         self.new_location = location
         self.captured_piece = captured_piece
-
-        # castling
-        self.castle = False
-        self.rook_piece = None
-        self.rook_old_location = None
-        self.rook_new_location = None
-        self.castle_side = None
-
-        # en passant
-        self.en_passant = False
-
-        # promotion
-        self.promotion = False
-        self.promotion_piece_class = None
+        self.key = piece.location.index | location.index << 6
 
     def __str__(self):
         """ Long algebraic notation"""
@@ -53,14 +63,29 @@ class Move:
 
     def __eq__(self, other):
         if self.__class__ is other.__class__:
-            # compare all dict keys
-            o = vars(other)
-            for k, v in vars(self).items():
-                if k not in o or o[k] != v:
-                    return False
-            return True
+            # the key and the pieces decide the rest of the move
+            return self.key == other.key and self.piece is other.piece and self.captured_piece is other.captured_piece
         return NotImplemented
 
+    def __hash__(self):
+        return self.key
+
+    @classmethod
+    def from_key(cls, board, key):
+        """ Find the valid move of the current player with a key
+
+        :param board: Board class
+        :param key: integer key of the move (see Move.key)
+        :return: Move or None if no valid move has the key
+        """
+        piece = board.piece(Location.SQUARES[key & 63], board.current_player)
+        if piece is None:
+            return None
+        for move in piece.moves():
+            if move.key == key:
+                return move if board.valid_move(move) else None
+        return None
+
     @classmethod
     def create_castle(cls, king, king_location, rook, rook_location):
         """ Creates a castle move
@@ -70,8 +95,7 @@ class Move:
         :param rook_location: Location class for new location of rook
         :return: Move
         """
-        move = cls(king, king_location)
-        move.castle = True
+        move = CastleMove(king, king_location)
         move.rook_piece = rook
         move.rook_old_location = rook.location
         move.rook_new_location = rook_location
@@ -92,9 +116,7 @@ class Move:
         :param captured_pawn_piece: Pawn
         :return: Move
         """
-        move = cls(pawn_piece, pawn_new_location, captured_pawn_piece)
-        move.en_passant = True
-        return move
+        return EnPassantMove(pawn_piece, pawn_new_location, captured_pawn_piece)
 
     @classmethod
     def create_promotion(cls, pawn_piece, pawn_new_location, promoted_piece_class, captured_piece=None):
@@ -106,8 +128,31 @@ class Move:
         :param captured_piece: Piece class for any piece that is captured during move
         :return: Move
         """
-        move = cls(pawn_piece, pawn_new_location, captured_piece)
-        move.promotion = True
+        move = PromotionMove(pawn_piece, pawn_new_location, captured_piece)
         move.promotion_piece_class = promoted_piece_class
+        move.key |= (pawn_piece.PROMOTIONS.index(promoted_piece_class) + 1) << 12
         return move
 
+
+class CastleMove(Move):
+    """
+    King move of two squares that also moves a rook (see Move.create_castle)
+    """
+    __slots__ = ('rook_piece', 'rook_old_location', 'rook_new_location', 'castle_side')
+    castle = True
+
+
+class EnPassantMove(Move):
+    """
+    Pawn capture of a pawn that moved two squares past it (see Move.create_en_passant)
+    """
+    __slots__ = ()
+    en_passant = True
+
+
+class PromotionMove(Move):
+    """
+    Pawn move to the last row that replaces the pawn by another piece (see Move.create_promotion)
+    """
+    __slots__ = ('promotion_piece_class',)
+    promotion = True
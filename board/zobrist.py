@@ -0,0 +1,31 @@
+import random
+from board.location import Location
+from piece import King, Queen, Rook, Bishop, Knight, Pawn
+from util.enums import Player, Side
+
+# keys are generated from a fixed seed so hashes are identical across runs and processes
+_random = random.Random(0x5EED)
+
+
+def _key():
+    return _random.getrandbits(64)
+
+
+# keys for a piece on a square indexed by [player.value][piece class][location.index]
+PIECE_KEYS = [{piece_class: [_key() for _ in Location.SQUARES]
+               for piece_class in [Pawn, Knight, Bishop, Rook, Queen, King]} for _ in Player]
+# key for black to move
+SIDE_KEY = _key()
+# keys for castling rights indexed by [player.value][side.value]
+CASTLING_KEYS = [[_key() for _ in Side] for _ in Player]
+# keys for the column of a pawn that can be captured en passant indexed by [col index]
+EN_PASSANT_KEYS = [_key() for _ in Location.COLS]
+
+
+def piece_key(piece):
+    """ Get the key for a piece at its location
+
+    :param piece: Piece class
+    :return: 64 bit integer
+    """
+    return PIECE_KEYS[piece.player.value][piece.__class__][piece.location.index]
@@ -4,6 +4,8 @@ from util import input_parser
 import util.printer as printer
 from util.enums import Player
 
+AI_TIME_LIMIT = 5  # seconds the ai searches for each move
+
 if __name__ == '__main__':
     # get desired player or None for two player
     player = input_parser.player()
@@ -50,7 +52,7 @@ if __name__ == '__main__':
             # ai turn
             # move = board.random_move()
             print('ai thinking...')
-            move = board.recommended_move(3)
+            move = board.recommended_move(time_limit=AI_TIME_LIMIT)
             board.move(move)
             print('{} moved {}'.format(board.current_player.opponent(), board.last_move()))
             printer.print_board(board)
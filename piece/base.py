@@ -1,10 +1,14 @@
 from board.move import Move
+from board.location import Location
 
 
 class Piece:
     """
     Base class for all chess pieces
+
+    Pieces have no instance dict (every subclass declares its own, usually empty, __slots__).
     """
+    __slots__ = ('player', 'location', '_initial_position', 'board', '_total_moves')
     VALUE = 0  # value to be used for calculating score
 
     def __init__(self, location, player, board):
@@ -39,8 +43,9 @@ class Piece:
         :param undo: boolean that indicates if total moves should be increased or descreased
         :return:
         """
-        self.board.move_piece(self, location)
+        # update the total moves first so the board sees the piece's new moved state when it is placed
         self._total_moves += (-1 if undo else 1)
+        self.board.move_piece(self, location)
 
     def attacked_locations(self):
         """ Get all locations under attack by this piece
@@ -50,6 +55,15 @@ class Piece:
         """
         raise NotImplementedError
 
+    def controlled_locations(self):
+        """ Get all locations this piece attacks regardless of what occupies them (includes locations held by
+        teammates and sliding stops at the first piece in the way)
+
+        Sub classes should implement
+        :return: Location iterable
+        """
+        raise NotImplementedError
+
     def moves(self):
         """ Get all possible moves by this piece (unvalidated moves)
 
@@ -71,51 +85,77 @@ class SingleMovePiece(Piece):
     """
     Base class for chess pieces that make moves based on a single move offset (e.g. king)
     """
+    __slots__ = ()
     MOVE_VECTORS = []  # offsets that piece can move from current location
+    TARGETS = []  # locations reached by the move vectors indexed by square index (precomputed from MOVE_VECTORS)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.TARGETS = Location.targets(cls.MOVE_VECTORS)
 
     def attacked_locations(self):
         """ Get all locations under attack by this piece
 
         :return: Location generator
         """
-        for row, col in self.MOVE_VECTORS:
-            loc = self.location.offset(row, col)
-            if loc is not None:
-                p = self.board.piece(loc)
-                # location is empty or has enemy player
-                if p is None or p.player != self.player:
-                    yield loc
+        pieces_by_location = self.board._pieces_by_location
+        for loc in self.TARGETS[self.location.index]:
+            p = pieces_by_location[loc]
+            # location is empty or has enemy player
+            if p is None or p.player != self.player:
+                yield loc
+
+    def controlled_locations(self):
+        """ Get all locations this piece attacks regardless of what occupies them
+
+        :return: Location tuple
+        """
+        return self.TARGETS[self.location.index]
 
 
 class MultipleMovePiece(Piece):
     """
     Base class for chess pieces that make moves based on multiple move offset (continuous) (e.g. Queen)
     """
+    __slots__ = ()
     MOVE_VECTORS = []  # offsets that piece can move from current location
+    RAYS = []  # rays along the move vectors indexed by square index (precomputed from MOVE_VECTORS)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.RAYS = Location.rays(cls.MOVE_VECTORS)
 
     def attacked_locations(self):
         """ Get all locations under attack by this piece
 
         :return: Location generator
         """
-        # try each tuple in the move vectors
-        for row, col in self.MOVE_VECTORS:
-            loc = self.location
+        pieces_by_location = self.board._pieces_by_location
+        # try each ray from the current location
+        for ray in self.RAYS[self.location.index]:
             # continue until blocked or off the board
-            while True:
-                loc = loc.offset(row, col)
-                if loc is not None:
-                    p = self.board.piece(loc)
-                    # location is empty
-                    if p is None:
-                        yield loc
-                    # location is has an enemy player
-                    elif p.player != self.player:
-                        yield loc
-                        break
-                    # location contains a teammate
-                    else:
-                        break
-                # location if off of the board
+            for loc in ray:
+                p = pieces_by_location[loc]
+                # location is empty
+                if p is None:
+                    yield loc
+                # location is has an enemy player
+                elif p.player != self.player:
+                    yield loc
+                    break
+                # location contains a teammate
                 else:
-                    break
\ No newline at end of file
+                    break
+
+    def controlled_locations(self):
+        """ Get all locations this piece attacks regardless of what occupies them
+
+        :return: Location generator
+        """
+        pieces_by_location = self.board._pieces_by_location
+        for ray in self.RAYS[self.location.index]:
+            for loc in ray:
+                yield loc
+                # the first piece in the way blocks the rest of the ray
+                if pieces_by_location[loc] is not None:
+                    break
@@ -2,6 +2,7 @@ from piece.base import MultipleMovePiece
 
 
 class Bishop(MultipleMovePiece):
+    __slots__ = ()
     VALUE = 3
     MOVE_VECTORS = [
         (-1, -1),
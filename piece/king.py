@@ -6,6 +6,7 @@ from board.move import Move
 
 
 class King(SingleMovePiece):
+    __slots__ = ()
     MOVE_VECTORS = [
         (-1, -1),
         (-1, 1),
@@ -24,7 +25,7 @@ class King(SingleMovePiece):
         :return: boolean
         """
         location = self.location if location is None else location
-        return location in self.board.attacked_locations(self.player.opponent())
+        return self.board.attacked(location, self.player.opponent())
 
     def can_castle(self, side):
         """ Determine if a king can castle to a certain side
@@ -63,7 +64,13 @@ class King(SingleMovePiece):
         :return: Move generator
         """
         yield from super().moves()
+        yield from self.castle_moves()
 
+    def castle_moves(self):
+        """ Get the possible castle moves for this king (unvalidated moves)
+
+        :return: Move generator
+        """
         if self.can_castle(Side.KING):
             rook = self._get_unmoved_rook(Side.KING)
             yield Move.create_castle(self, self.location.offset(0, 2), rook, rook.location.offset(0, -2))
@@ -2,6 +2,7 @@ from piece.base import SingleMovePiece
 
 
 class Knight(SingleMovePiece):
+    __slots__ = ()
     VALUE = 3
     MOVE_VECTORS = [
         (-2, 1),
@@ -5,10 +5,15 @@ from piece.queen import Queen
 from piece.rook import Rook
 from util.enums import Player
 from board.move import Move
+from board.location import Location
 
 
 class Pawn(Piece):
+    __slots__ = ()
     VALUE = 1
+    PROMOTIONS = [Queen, Rook, Bishop, Knight]  # classes a pawn can be promoted to
+    # locations attacked by a pawn indexed by [player.value][square index]
+    ATTACKS = [Location.targets([(1, -1), (1, 1)]), Location.targets([(-1, -1), (-1, 1)])]
 
     @property
     def en_passant_vulnerable(self):
@@ -27,12 +32,18 @@ class Pawn(Piece):
 
         :return: Location generator
         """
-        for col in [-1, 1]:
-            loc = self.location.offset(self.direction, col)
+        for loc in self.ATTACKS[self.player.value][self.location.index]:
             # pawn can only attack when opponent is diagonal
-            if loc is not None and not self.board.empty(loc, player=self.player.opponent()):
+            if not self.board.empty(loc, player=self.player.opponent()):
                 yield loc
 
+    def controlled_locations(self):
+        """ Get all locations this piece attacks regardless of what occupies them
+
+        :return: Location tuple
+        """
+        return self.ATTACKS[self.player.value][self.location.index]
+
     def moves(self):
         """ Get all possible moves by this piece (unvalidated moves)
 
@@ -41,7 +52,7 @@ class Pawn(Piece):
         # check attacking moves for promotions
         for move in super().moves():
             if move.new_location.end_of_row:
-                for t in [Queen, Rook, Bishop, Knight]:
+                for t in self.PROMOTIONS:
                     yield Move.create_promotion(self, move.new_location, t, move.captured_piece)
             else:
                 yield move
@@ -52,7 +63,7 @@ class Pawn(Piece):
         if up1 and self.board.empty(up1):
             # check move for promotions
             if up1.end_of_row:
-                for t in [Queen, Rook, Bishop, Knight]:
+                for t in self.PROMOTIONS:
                     yield Move.create_promotion(self, up1, t)
             else:
                 # regular move
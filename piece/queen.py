@@ -2,6 +2,7 @@ from piece.base import MultipleMovePiece
 
 
 class Queen(MultipleMovePiece):
+    __slots__ = ()
     VALUE = 9
     MOVE_VECTORS = [
         (-1, -1),
@@ -2,6 +2,7 @@ from piece.base import MultipleMovePiece
 
 
 class Rook(MultipleMovePiece):
+    __slots__ = ()
     VALUE = 5
     MOVE_VECTORS = [
         (-1, 0),
@@ -1,7 +1,19 @@
+import contextlib
+import io
+import json
+import time
 from unittest import TestCase
 
-from board import Board
+from ai.minimax import alphabeta, iterative_deepening, principal_variation, SearchTimeout, MoveOrdering, \
+    Quiescence, SearchStats
+from ai.parallel import parallel_search, executor, shutdown
+from ai.transposition import TranspositionTable
+from benchmark import search
+from benchmark.positions import SEARCH
+from board import Board, Location
 from util.input_parser import parse
+from util.enums import Player
+from piece import King, Queen, Pawn
 
 
 class TestBoard(TestCase):
@@ -53,6 +65,239 @@ class TestBoard(TestCase):
         desired_move = parse(self.board, 'c8 e6')
         self.assertEquals(move, desired_move)
 
+    def test_search_timeout_restores_board(self):
+        self.batch_move(self.board, ['e2 e4', 'e7 e5'])
+        h, moves = self.board.hash, len(self.board._moves)
+        with self.assertRaises(SearchTimeout):
+            alphabeta(self.board, self.board.current_player, 0, 6, -float('inf'), float('inf'),
+                      deadline=time.monotonic() + 0.05)
+        self.assertEquals(self.board.hash, h)
+        self.assertEquals(len(self.board._moves), moves)
+
+    def test_iterative_deepening_max_depth(self):
+        table = TranspositionTable(1)
+        score, moves, depth = iterative_deepening(self.board, self.board.current_player, 2, table=table)
+        self.assertEquals(depth, 2)
+        expected, _ = alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'))
+        self.assertEquals(score, expected)
+        line = principal_variation(self.board, table)
+        self.assertEquals(len(line), 2)
+        self.assertTrue(line[0] in moves)
+
+    def test_iterative_deepening_time_limit(self):
+        self.batch_move(self.board, ['e2 e4', 'e7 e5'])
+        start = time.monotonic()
+        score, moves, depth = iterative_deepening(self.board, self.board.current_player, time_limit=0.5)
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertGreaterEqual(depth, 1)
+        self.assertTrue(moves)
+
+    def test_recommended_move_time_limit(self):
+        moves = [
+            'f2 f3',
+            'e7 e5',
+            'g2 g4',
+        ]
+        self.batch_move(self.board, moves)
+        move = self.board.recommended_move(time_limit=0.5)
+        self.assertEquals(move, parse(self.board, 'd8 h4'))
+
+    def test_ordering_mvv_lva(self):
+        self.batch_move(self.board, ['e2 e4', 'd7 d5', 'd1 g4', 'c8 g4', 'b1 c3', 'h7 h6'])
+        moves = list(self.board.valid_moves())
+        MoveOrdering().order(moves, 0)
+        # pawn takes pawn (e4xd5) before knight takes pawn (c3xd5); quiet moves last
+        self.assertEquals([str(m) for m in moves[:2]], ['e4xd5', 'Nc3xd5'])
+        self.assertTrue(all(m.captured_piece is None for m in moves[2:]))
+
+        # the king is the most valuable attacker so it captures after a pawn
+        board = Board.from_fen('4k3/8/8/8/8/3n4/2P1K3/8 w - - 0 1')
+        moves = list(board.valid_moves())
+        MoveOrdering().order(moves, 0)
+        self.assertEquals([m.piece.__class__ for m in moves[:2]], [Pawn, King])
+
+    def test_search_baseline(self):
+        # a change to the search or move ordering has to update benchmark/baseline.json with it
+        with open(search.BASELINE) as f:
+            baseline = json.load(f)
+        results = {}
+        for name in ['rook endgame', 'lucena']:
+            fen, depth = SEARCH[name]
+            results[name] = search.search(Board.from_fen(fen), depth)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(search.compare(results, baseline), [])
+        # the first iterations of a middlegame position (node counts only, the timings depend on the machine)
+        iterations = search.search(Board.from_fen(SEARCH['italian'][0]), 2)['iterations']
+        self.assertEqual([(i['nodes'], i['quiescence_nodes']) for i in iterations],
+                         [(i['nodes'], i['quiescence_nodes']) for i in baseline['italian']['iterations'][:2]])
+
+    def test_ordering_table_move_first(self):
+        moves = list(self.board.valid_moves())
+        move = parse(self.board, 'g2 g3')
+        MoveOrdering().order(moves, 0, move.key)
+        self.assertEquals(moves[0], move)
+
+    def test_ordering_killers_and_history(self):
+        ordering = MoveOrdering()
+        move = parse(self.board, 'g2 g3')
+        ordering.cutoff(move, 2, 0, 3)
+        self.assertEquals(ordering.score(move, 2), MoveOrdering.KILLER)
+        self.assertEquals(ordering.score(move, 1), 9)
+        ordering.cutoff(parse(self.board, 'a2 a3'), 2, 1, 1)
+        ordering.cutoff(parse(self.board, 'b2 b3'), 2, 1, 1)
+        self.assertEquals(len(ordering.killers[2]), MoveOrdering.KILLERS)
+        self.assertEquals(ordering.score(move, 2), 9)
+        self.assertEquals(ordering.cutoffs, 3)
+        self.assertAlmostEqual(ordering.cutoff_rate, 1 / 3)
+
+    def test_ordering_same_score(self):
+        self.batch_move(self.board, ['e2 e4', 'e7 e5', 'g1 f3'])
+        expected, _ = alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'))
+        ordering = MoveOrdering()
+        score, moves = alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'),
+                                 ordering=ordering)
+        self.assertEquals(score, expected)
+        self.assertGreater(ordering.cutoffs, 0)
+
+    def test_quiescence_avoids_defended_capture(self):
+        board = Board(False)
+        King(Location(1, 'a'), Player.WHITE, board)
+        Queen(Location(1, 'd'), Player.WHITE, board)
+        King(Location(8, 'h'), Player.BLACK, board)
+        Pawn(Location(5, 'd'), Player.BLACK, board)
+        Pawn(Location(6, 'e'), Player.BLACK, board)  # defends d5
+        capture = parse(board, 'd1 d5')
+
+        # the horizon is reached before the queen is recaptured
+        _, moves = alphabeta(board, Player.WHITE, 0, 1, -float('inf'), float('inf'))
+        self.assertEquals(moves, [capture])
+
+        quiescence = Quiescence()
+        _, moves = alphabeta(board, Player.WHITE, 0, 1, -float('inf'), float('inf'), quiescence=quiescence)
+        self.assertNotIn(capture, moves)
+        self.assertGreater(quiescence.nodes, 0)
+
+    def test_quiescence_stand_pat(self):
+        self.batch_move(self.board, ['e2 e4', 'e7 e5'])
+        quiescence = Quiescence()
+        score = quiescence.search(self.board, self.board.current_player, 0, -float('inf'), float('inf'))
+        self.assertEquals(score, self.board.heuristic_value(self.board.current_player, 0))
+        self.assertEquals(quiescence.nodes, 1)
+
+    def test_quiescence_max_depth(self):
+        self.batch_move(self.board, ['e2 e4', 'd7 d5'])
+        quiescence = Quiescence(0)
+        score = quiescence.search(self.board, self.board.current_player, 0, -float('inf'), float('inf'))
+        self.assertEquals(score, self.board.heuristic_value(self.board.current_player, 0))
+        self.assertEquals(quiescence.nodes, 1)
+        quiescence = Quiescence()
+        quiescence.search(self.board, self.board.current_player, 0, -float('inf'), float('inf'))
+        self.assertGreater(quiescence.nodes, 1)
+
+    def test_search_stats(self):
+        stats = SearchStats()
+        alphabeta(self.board, self.board.current_player, 0, 1, -float('inf'), float('inf'), stats=stats)
+        self.assertEquals((stats.nodes, stats.leaves), (21, 20))
+        stats = SearchStats()
+        iterative_deepening(self.board, self.board.current_player, 2, stats=stats)
+        self.assertGreater(stats.nodes, 21)
+        self.assertLess(stats.leaves, stats.nodes)
+
+    def test_search_stats_capture(self):
+        self.batch_move(self.board, ['e2 e4', 'e7 e5', 'g1 f3'])
+        table = TranspositionTable(1)
+        stats = SearchStats()
+        with stats.capture(self.board):
+            alphabeta(self.board, self.board.current_player, 0, 3, -float('inf'), float('inf'), table,
+                      ordering=MoveOrdering(), stats=stats)
+        self.assertIsNone(self.board.stats)
+        self.assertEquals(stats.table_probes, stats.nodes)
+        self.assertGreater(stats.table_hits, 0)
+        self.assertGreater(stats.cutoffs[1], 0)
+        self.assertGreater(stats.move_generations, 0)
+        self.assertGreater(stats.legal_checks, 0)
+        self.assertGreater(stats.seconds, 0)
+        self.assertEquals(Board.decode(bytes.fromhex(stats.position)).hash, self.board.hash)
+
+    def test_table_transposes_across_plies(self):
+        # the same position searched at the root and two plies deeper is scaled by the ply so the root's result must
+        # not end the deeper search
+        board = Board.from_fen('rnb1kbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+        player = board.current_player
+        expected, _ = alphabeta(board, player, 2, 3, -float('inf'), float('inf'))
+        table = TranspositionTable(1)
+        alphabeta(board, player, 0, 1, -float('inf'), float('inf'), table)
+        score, _ = alphabeta(board, player, 2, 3, -float('inf'), float('inf'), table)
+        self.assertEqual(score, expected)
+        self.assertEqual(table.probe(board.hash).ply, 2)
+
+    def test_search_stats_hooks(self):
+        entered, exited = [], []
+        stats = SearchStats(on_enter=lambda game, depth, alpha, beta: entered.append(depth),
+                            on_exit=lambda game, depth, score: exited.append(depth))
+        alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'), stats=stats)
+        self.assertEquals(len(entered), stats.nodes)
+        self.assertEquals(sorted(entered), sorted(exited))
+        self.assertEquals(exited[-1], 0)
+
+        # a hook can stop the search
+        def stop(game, depth, alpha, beta):
+            if depth == 2:
+                raise SearchTimeout()
+        h = self.board.hash
+        with self.assertRaises(SearchTimeout):
+            alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'),
+                      stats=SearchStats(on_enter=stop))
+        self.assertEquals(self.board.hash, h)
+
+    def test_search_stats_profile(self):
+        stats = SearchStats(profile=True, trace_memory=True)
+        self.board.recommended_move(1, stats=stats)
+        self.assertIn('alphabeta', stats.profile_report())
+        self.assertGreater(stats.memory_peak, 0)
+        self.assertIn('peak', stats.memory_report())
+        with self.assertRaises(ValueError):
+            SearchStats().profile_report()
+
+    def test_parallel_same_score(self):
+        self.batch_move(self.board, ['e2 e4', 'e7 e5', 'g1 f3', 'b8 c6'])
+        expected, _ = alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'),
+                                quiescence=Quiescence())
+        quiescence = Quiescence()
+        score, moves = parallel_search(self.board, 2, 2, quiescence=quiescence)
+        self.assertEquals(score, expected)
+        self.assertTrue(moves)
+        self.assertGreater(quiescence.nodes, 0)
+        # the result does not depend on the number of workers
+        self.assertEquals(parallel_search(self.board, 2, 1), parallel_search(self.board, 2, 2))
+        # the workers evaluate the moves with the board's mobility term too
+        self.board.mobility = True
+        expected, _ = alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'))
+        self.assertEqual(parallel_search(self.board, 2, 2)[0], expected)
+
+    def test_parallel_shutdown(self):
+        pool = executor(2)
+        self.assertIs(executor(2), pool)
+        pool.submit(int).result()
+        processes = list(pool._processes.values())
+        shutdown()
+        self.assertFalse(any(p.is_alive() for p in processes))
+        # a later search gets a new pool
+        self.assertIsNot(executor(2), pool)
+        self.batch_move(self.board, ['f2 f3', 'e7 e5', 'g2 g4'])
+        self.assertEqual(parallel_search(self.board, 2, 2)[1], [parse(self.board, 'd8 h4')])
+
+    def test_parallel_recommended_move(self):
+        self.batch_move(self.board, ['f2 f3', 'e7 e5', 'g2 g4'])
+        move = self.board.recommended_move(2, workers=2, seed=1)
+        self.assertEquals(move, parse(self.board, 'd8 h4'))
+        with self.assertRaises(ValueError):
+            self.board.recommended_move(2, workers=2, time_limit=1)
+
+    def test_recommended_move_seed(self):
+        moves = {str(self.board.recommended_move(1, seed=3)) for _ in range(5)}
+        self.assertEquals(len(moves), 1)
+
     def test_ai_game(self):
         # run to try and find failures
         while True:
@@ -0,0 +1,107 @@
+from unittest import TestCase
+
+from board import Board, BitBoard, Location
+from board.bitboard import squares, population, sliding_attacks, SQUARES, ROOK_RAYS, BISHOP_RAYS
+from util.input_parser import parse
+from util.enums import Player
+from piece import King, Queen, Rook, Pawn, Knight
+from tests import test_board
+
+
+class TestBitBoardGame(test_board.TestBoard):
+    """ Run the board tests against the bitboard backend """
+    def setUp(self):
+        self.board = BitBoard()
+        self.board2 = BitBoard(False)
+        King(Location(8, 'e'), Player.BLACK, self.board2)
+        King(Location(1, 'e'), Player.WHITE, self.board2)
+
+    def test_attack_maps(self):
+        # the bitboard backend keeps no attack maps and finds the attacked locations from its bitboards instead
+        self.batch_move(self.board, ['e2 e4', 'd7 d5', 'e4 d5', 'd8 d5', 'b1 c3', 'd5 e5', 'd1 e2', 'e5 e2'])
+        for player in Player:
+            self.assertEqual(self.board._attack_counts[player.value], [0] * 64)
+            expected = {loc for p in self.board.pieces(player=player) for loc in p.controlled_locations()}
+            self.assertEqual({loc for loc in Location.SQUARES if self.board.attacked(loc, player)}, expected)
+
+
+class TestBitBoard(TestCase):
+    def setUp(self):
+        self.board = BitBoard()
+
+    def batch_move(self, moves):
+        for move in moves:
+            self.board.move(parse(self.board, move))
+
+    def test_squares(self):
+        self.assertEqual(list(squares(0b10010001)), [0, 4, 7])
+        self.assertEqual(population(0b10010001), 3)
+
+    def test_sliding_attacks(self):
+        d4 = Location(4, 'd').index
+        occupied = 1 << Location(6, 'd').index | 1 << Location(4, 'b').index
+        rook = {'d5', 'd6', 'd3', 'd2', 'd1', 'c4', 'b4', 'e4', 'f4', 'g4', 'h4'}
+        attacks = sliding_attacks(d4, ROOK_RAYS, occupied)
+        self.assertEqual({str(SQUARES[sq]) for sq in squares(attacks)}, rook)
+        self.assertEqual(population(sliding_attacks(d4, BISHOP_RAYS, 0)), 13)
+
+    def test_initial_bitboards(self):
+        self.assertEqual(self.board.bitboard(Pawn, Player.WHITE), 0xff00)
+        self.assertEqual(self.board.bitboard(King, Player.BLACK), 1 << 60)
+        self.assertEqual(self.board.occupied(Player.WHITE), 0xffff)
+        self.assertEqual(self.board.occupied(), 0xffff00000000ffff)
+
+    def test_move_undo_move(self):
+        self.batch_move(['e2 e4', 'd7 d5', 'e4 d5'])
+        self.assertEqual(self.board.bitboard(Pawn, Player.BLACK), 0x00f7000000000000)
+        self.assertFalse(self.board.occupied(Player.WHITE) & 1 << Location(4, 'e').index)
+        self.board.undo_move()
+        self.assertEqual(self.board.bitboard(Pawn, Player.BLACK), 0x00f7000800000000)
+        self.assertTrue(self.board.occupied(Player.WHITE) & 1 << Location(4, 'e').index)
+
+    def test_castle_through_pawn_attack(self):
+        board = BitBoard(False)
+        King(Location(1, 'e'), Player.WHITE, board)
+        Rook(Location(1, 'h'), Player.WHITE, board)
+        King(Location(8, 'e'), Player.BLACK, board)
+        Pawn(Location(2, 'g'), Player.BLACK, board)  # attacks f1
+        with self.assertRaises(IOError):
+            parse(board, 'e1 g1')
+
+    def test_pinned_piece(self):
+        board = BitBoard(False)
+        King(Location(1, 'e'), Player.WHITE, board)
+        Knight(Location(2, 'e'), Player.WHITE, board)
+        Queen(Location(8, 'e'), Player.BLACK, board)
+        King(Location(8, 'a'), Player.BLACK, board)
+        self.assertFalse(any(m.piece.__class__ is Knight for m in board.valid_moves()))
+        king, checkers, blocks, pins = board.legality(Player.WHITE)
+        self.assertEqual((checkers, blocks), (0, 0))
+        self.assertEqual(list(pins), [Location(2, 'e').index])
+        self.assertEqual([SQUARES[sq] for sq in squares(pins[Location(2, 'e').index])],
+                         [Location(row, 'e') for row in range(2, 9)])
+
+    def test_legality_checks(self):
+        # a bishop check is captured or blocked, and the king can't castle out of it
+        board = BitBoard.from_fen('4k3/8/8/8/1b6/6N1/8/4K2R w K - 0 1')
+        king, checkers, blocks, pins = board.legality(Player.WHITE)
+        self.assertEqual(list(squares(checkers)), [Location(4, 'b').index])
+        self.assertEqual(sorted(str(SQUARES[sq]) for sq in squares(blocks)), ['b4', 'c3', 'd2'])
+        moves = sorted(str(m) for m in board.valid_moves())
+        self.assertEqual(moves, sorted(str(m) for m in Board.from_fen(board.to_fen()).valid_moves()))
+        self.assertFalse(any(m.castle for m in board.valid_moves()))
+
+    def test_valid_moves_match_board(self):
+        board = Board()
+        moves = ['e2 e4', 'e7 e5', 'g1 f3', 'b8 c6', 'f1 c4', 'g8 f6', 'e1 g1', 'f6 e4']
+        for text in moves:
+            expected = sorted(str(m) for m in board.valid_moves())
+            self.assertEqual(sorted(str(m) for m in self.board.valid_moves()), expected)
+            self.assertEqual(self.board.score(Player.WHITE, False), board.score(Player.WHITE, False))
+            board.move(parse(board, text))
+            self.board.move(parse(self.board, text))
+
+    def test_two_move_checkmate_recommend_move(self):
+        self.batch_move(['f2 f3', 'e7 e5', 'g2 g4'])
+        move = self.board.recommended_move(1)
+        self.assertEqual(move, parse(self.board, 'd8 h4'))
@@ -1,10 +1,16 @@
+import tracemalloc
 from unittest import TestCase
 
 from board import Board
+from board.bitboard import BitBoard
 from util.input_parser import parse
 from util.enums import Player, Side
 from piece import Pawn, Queen, Rook, Bishop, Knight, King
+from piece.base import MultipleMovePiece
 from board.location import Location
+from board import evaluation
+from ai.minimax import SearchStats
+from benchmark.positions import PERFT, SEARCH
 
 
 class TestBoard(TestCase):
@@ -128,6 +134,69 @@ class TestBoard(TestCase):
         with self.assertRaises(IOError):
             parse(self.board2, 'e1 c1')
 
+    def test_castle_out_of_check(self):
+        Rook(Location(1, 'h'), Player.WHITE, self.board2)
+        Rook(Location(5, 'e'), Player.BLACK, self.board2)
+        with self.assertRaises(IOError):
+            parse(self.board2, 'e1 g1')
+
+    def test_pinned_piece(self):
+        Bishop(Location(2, 'e'), Player.WHITE, self.board2)
+        Rook(Location(2, 'd'), Player.WHITE, self.board2)
+        Rook(Location(6, 'e'), Player.BLACK, self.board2)
+        Bishop(Location(4, 'b'), Player.BLACK, self.board2)
+        pieces = {str(m.piece.location) for m in self.board2.valid_moves()}
+        self.assertNotIn('e2', pieces)
+        # the rook is pinned along the diagonal so it can't move at all
+        self.assertNotIn('d2', pieces)
+        Rook(Location(3, 'e'), Player.WHITE, self.board2)
+        # the bishop is no longer pinned by the rook
+        pieces = {str(m.piece.location) for m in self.board2.valid_moves()}
+        self.assertIn('e2', pieces)
+
+    def test_pinned_piece_moves_along_pin(self):
+        Rook(Location(3, 'e'), Player.WHITE, self.board2)
+        Queen(Location(6, 'e'), Player.BLACK, self.board2)
+        moves = {str(m.new_location) for m in self.board2.valid_moves() if m.piece.__class__ is Rook}
+        self.assertEquals(moves, {'e2', 'e4', 'e5', 'e6'})
+
+    def test_check_evasions(self):
+        Rook(Location(4, 'e'), Player.BLACK, self.board2)
+        Knight(Location(1, 'b'), Player.WHITE, self.board2)
+        Bishop(Location(1, 'f'), Player.WHITE, self.board2)
+        Queen(Location(1, 'h'), Player.WHITE, self.board2)
+        moves = {str(m) for m in self.board2.valid_moves()}
+        # block with the bishop, capture with the queen or move the king off of the file
+        self.assertEquals(moves, {'Bf1-e2', 'Qh1xe4', 'Ke1-d1', 'Ke1-d2', 'Ke1-f2'})
+
+    def test_double_check(self):
+        Rook(Location(4, 'e'), Player.BLACK, self.board2)
+        Knight(Location(3, 'd'), Player.BLACK, self.board2)
+        Queen(Location(4, 'h'), Player.WHITE, self.board2)
+        # only the king can move (the queen can't capture the rook) and the knight covers f2
+        moves = {str(m) for m in self.board2.valid_moves()}
+        self.assertEquals(moves, {'Ke1-d1', 'Ke1-d2', 'Ke1-f1'})
+
+    def test_king_cannot_retreat_along_check(self):
+        Rook(Location(5, 'h'), Player.BLACK, self.board2)
+        self.board2.move(parse(self.board2, 'e1 e2'))
+        self.board2.move(parse(self.board2, 'h5 h2'))
+        moves = {str(m.new_location) for m in self.board2.valid_moves()}
+        self.assertEquals(moves, {'d1', 'e1', 'f1', 'd3', 'e3', 'f3'})
+
+    def test_en_passant_discovered_check(self):
+        self.board2.undo_add_piece(self.board2.piece(Location(1, 'e')))
+        King(Location(5, 'a'), Player.WHITE, self.board2)
+        Pawn(Location(2, 'b'), Player.WHITE, self.board2)  # filler so the ranks are not empty
+        Pawn(Location(5, 'd'), Player.WHITE, self.board2)
+        Pawn(Location(7, 'e'), Player.BLACK, self.board2)
+        Rook(Location(5, 'h'), Player.BLACK, self.board2)
+        self.board2.move(parse(self.board2, 'b2 b3'))
+        self.board2.move(parse(self.board2, 'e7 e5'))
+        moves = {str(m) for m in self.board2.valid_moves()}
+        self.assertNotIn('d5xe6', moves)
+        self.assertIn('d5-d6', moves)
+
     def test_promotion(self):
         moves = [
             'a2 a4',
@@ -178,6 +247,232 @@ class TestBoard(TestCase):
             move = self.board.random_move()
             self.board.move(move)
 
+    def test_attack_maps(self):
+        moves = [
+            'e2 e4',
+            'd7 d5',
+            'e4 d5',
+            'd8 d5',
+            'b1 c3',
+            'd5 e5',
+            'd1 e2',
+            'e5 e2',
+        ]
+        self.batch_move(self.board, moves)
+        for i in range(len(moves) + 1):
+            for player in Player:
+                expected = [0] * 64
+                for p in self.board.pieces(player=player):
+                    for loc in p.controlled_locations():
+                        expected[loc.index] += 1
+                self.assertEquals(self.board._attack_counts[player.value], expected)
+            if i < len(moves):
+                self.board.undo_move()
+
+    def test_attacked(self):
+        self.assertTrue(self.board.attacked(Location(3, 'a'), Player.WHITE))
+        self.assertTrue(self.board.attacked(Location(2, 'a'), Player.WHITE))  # defended by the rook
+        self.assertFalse(self.board.attacked(Location(4, 'a'), Player.WHITE))
+        self.assertTrue(self.board.attacked(Location(6, 'h'), Player.BLACK))
+        self.batch_move(self.board, ['e2 e4'])
+        self.assertTrue(self.board.attacked(Location(4, 'g'), Player.WHITE))  # queen on the opened diagonal
+        self.board.undo_move()
+        self.assertFalse(self.board.attacked(Location(4, 'g'), Player.WHITE))
+
+    def test_hash_undo(self):
+        moves = [
+            'e2 e4',
+            'd7 d5',
+            'e4 d5',
+            'g8 f6',
+            'f1 b5',
+            'c7 c6',
+            'g1 f3',
+            'c6 b5',
+            'e1 g1',
+        ]
+        hashes = []
+        for move in moves:
+            hashes.append(self.board.hash)
+            self.batch_move(self.board, [move])
+            self.assertNotIn(self.board.hash, hashes)
+        for h in reversed(hashes):
+            self.board.undo_move()
+            self.assertEquals(self.board.hash, h)
+
+    def test_hash_transposition(self):
+        h = self.board.hash
+        self.batch_move(self.board, ['g1 f3', 'g8 f6', 'f3 g1', 'f6 g8'])
+        self.assertEquals(self.board.hash, h)
+        self.batch_move(self.board, ['e2 e4', 'e7 e5', 'd2 d4'])
+        h = self.board.hash
+        board = Board()
+        for move in ['d2 d4', 'e7 e5', 'e2 e4']:
+            board.move(parse(board, move))
+        self.assertEquals(board.hash, h)
+
+    def test_hash_side_to_move(self):
+        h = self.board.hash
+        self.batch_move(self.board, ['g1 f3', 'g8 f6', 'f3 g1'])
+        self.batch_move(self.board, ['f6 g8', 'g1 f3', 'g8 f6'])
+        self.assertNotEquals(self.board.hash, h)
+
+    def test_hash_castling(self):
+        self.batch_move(self.board, ['e2 e4', 'e7 e5'])
+        h = self.board.hash
+        self.batch_move(self.board, ['e1 e2', 'e8 e7', 'e2 e1', 'e7 e8'])
+        self.assertNotEquals(self.board.hash, h)
+
+    def test_hash_en_passant(self):
+        self.batch_move(self.board, ['e2 e4', 'a7 a6', 'e4 e5', 'd7 d5'])
+        h = self.board.hash
+        self.batch_move(self.board, ['g1 f3', 'g8 f6', 'f3 g1', 'f6 g8'])
+        self.assertNotEquals(self.board.hash, h)  # en passant is no longer possible
+
+    def test_hash_promotion(self):
+        self.batch_move(self.board, ['a2 a4', 'b7 b5', 'a4 b5', 'h7 h6', 'b5 b6', 'g7 g6', 'b6 a7', 'f7 f6'])
+        queen = parse(self.board, 'a7 b8 q')
+        knight = parse(self.board, 'a7 b8 n')
+        self.board.move(queen)
+        h = self.board.hash
+        self.board.undo_move()
+        self.board.move(knight)
+        self.assertNotEquals(self.board.hash, h)
+
+    def assertEvaluationTotals(self, board):
+        for player in Player:
+            pieces = list(board.pieces(player=player))
+            self.assertEquals(board.score(player, False), sum(p.VALUE for p in pieces))
+            self.assertEquals(board.positional_score(player), sum(evaluation.positional_value(p) for p in pieces))
+
+    def test_evaluation_totals(self):
+        self.assertEquals(self.board.positional_score(Player.WHITE), self.board.positional_score(Player.BLACK))
+        moves = ['a2 a4', 'b7 b5', 'a4 b5', 'h7 h6', 'b5 b6', 'g7 g6', 'b6 a7', 'f7 f6', 'a7 b8 q']
+        for move in moves:
+            self.board.move(parse(self.board, move))
+            self.assertEvaluationTotals(self.board)
+        for _ in moves:
+            self.board.undo_move()
+            self.assertEvaluationTotals(self.board)
+        self.assertEquals(self.board.positional_score(Player.WHITE), self.board.positional_score(Player.BLACK))
+
+    def test_positional_value(self):
+        # pieces score the same on mirrored squares and better in the center
+        white = Knight(Location(3, 'c'), Player.WHITE, self.board2)
+        black = Knight(Location(6, 'c'), Player.BLACK, self.board2)
+        self.assertEquals(evaluation.positional_value(white), evaluation.positional_value(black))
+        corner = Knight(Location(1, 'a'), Player.WHITE, self.board2)
+        self.assertGreater(evaluation.positional_value(white), evaluation.positional_value(corner))
+
+    def test_heuristic_value_mobility(self):
+        value = self.board.heuristic_value(Player.WHITE, 0)
+        self.assertEquals(value, 0)
+        self.board.mobility = True
+        self.assertEquals(self.board.heuristic_value(Player.WHITE, 0), value + 20 * evaluation.MOBILITY_WEIGHT)
+
+    def test_encode_decode(self):
+        self.batch_move(self.board, ['e2 e4', 'g8 f6', 'e4 e5', 'h8 g8', 'g1 f3', 'd7 d5'])
+        board = Board.decode(self.board.encode())
+        self.assertEquals(board.hash, self.board.hash)
+        self.assertEquals(str(board), str(self.board))
+        self.assertEquals(board.current_player, self.board.current_player)
+        # en passant and castling rights are kept
+        self.assertEquals(sorted(str(m) for m in board.valid_moves()),
+                          sorted(str(m) for m in self.board.valid_moves()))
+        self.assertIn('e5xd6', [str(m) for m in board.valid_moves()])
+        self.assertTrue(board.piece(Location(8, 'g')).moved)
+        self.assertFalse(board.piece(Location(2, 'a')).moved)
+        self.assertFalse(board.mobility)
+        # the heuristic's mobility term is kept so parallel workers evaluate like the board they search for
+        self.board.mobility = True
+        board = Board.decode(self.board.encode())
+        self.assertTrue(board.mobility)
+        self.assertEqual(board.current_player, self.board.current_player)
+        self.assertEqual(board.heuristic_value(Player.WHITE, 0), self.board.heuristic_value(Player.WHITE, 0))
+
+    def test_encode_piece_order(self):
+        data = self.board.encode()
+        # undoing moves puts pieces back on the board in a different order
+        self.batch_move(self.board, ['g1 f3', 'g8 f6', 'e2 e4'])
+        for _ in range(3):
+            self.board.undo_move()
+        self.assertEquals(self.board.encode(), data)
+
+    def assertPerft(self, name, depth):
+        fen, expected = PERFT[name]
+        board = self.board.__class__.from_fen(fen)
+        self.assertEquals(board.perft(depth), expected[depth - 1], '{} depth {}'.format(name, depth))
+
+    def test_perft(self):
+        self.assertEquals(self.board.perft(3), 8902)
+        self.assertPerft('kiwipete', 2)  # castling, en passant and promotions
+        self.assertPerft('position 3', 3)  # en passant discovered checks along a row
+        self.assertPerft('position 4', 3)
+        self.assertPerft('position 5', 2)
+        self.assertPerft('position 6', 2)
+
+    def test_divide(self):
+        nodes = self.board.divide(2)
+        self.assertEquals(len(nodes), 20)
+        self.assertEquals(nodes['e2e4'], 20)
+        self.assertEquals(sum(nodes.values()), 400)
+        board = self.board.__class__.from_fen(PERFT['position 5'][0])
+        self.assertEquals(board.divide(1)['d7c8q'], 1)
+
+    def test_setup_en_passant(self):
+        board = self.board.__class__.from_fen('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1')
+        self.assertIn('e5d6', board.divide(1))
+        board = self.board.__class__.from_fen('4k3/8/8/3pP3/8/8/8/4K3 w - - 0 1')
+        self.assertNotIn('e5d6', board.divide(1))
+
+    def test_fen_round_trip(self):
+        self.assertEquals(self.board.to_fen(), Board.START_FEN)
+        for fen, _ in PERFT.values():
+            self.assertEquals(self.board.__class__.from_fen(fen).to_fen(), fen)
+
+    def test_fen_matches_moves(self):
+        moves = ['e2 e4', 'c7 c5', 'g1 f3', 'b8 c6', 'f1 b5', 'g8 f6', 'e1 g1', 'a7 a5']
+        fens = [
+            'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1',
+            'rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq c6 0 2',
+            'rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2',
+            'r1bqkbnr/pp1ppppp/2n5/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+            'r1bqkbnr/pp1ppppp/2n5/1Bp5/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',
+            'r1bqkb1r/pp1ppppp/2n2n2/1Bp5/4P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',
+            'r1bqkb1r/pp1ppppp/2n2n2/1Bp5/4P3/5N2/PPPP1PPP/RNBQ1RK1 b kq - 5 4',
+            'r1bqkb1r/1p1ppppp/2n2n2/pBp5/4P3/5N2/PPPP1PPP/RNBQ1RK1 w kq a6 0 5',
+        ]
+        for move, fen in zip(moves, fens):
+            self.board.move(parse(self.board, move))
+            self.assertEquals(self.board.to_fen(), fen)
+            board = self.board.__class__.from_fen(fen)
+            self.assertEquals(board.hash, self.board.hash)
+            self.assertEquals(board._attack_counts, self.board._attack_counts)
+            self.assertEquals(sorted(str(m) for m in board.valid_moves()),
+                              sorted(str(m) for m in self.board.valid_moves()))
+        # the counters continue from the FEN
+        board = self.board.__class__.from_fen(fens[2])
+        board.move(parse(board, 'b8 c6'))
+        self.assertEquals(board.to_fen(), fens[3])
+
+    def test_fen_castling_rights(self):
+        board = self.board.__class__.from_fen('r3k2r/8/8/8/8/8/8/R3K2R w Kq - 0 1')
+        self.assertEquals(board.to_fen(), 'r3k2r/8/8/8/8/8/8/R3K2R w Kq - 0 1')
+        self.assertIn('e1g1', board.divide(1))
+        self.assertNotIn('e1c1', board.divide(1))
+
+    def test_fen_invalid(self):
+        for fen in ['8/8/8/8/8/8/8 w - - 0 1',
+                    '9/8/8/8/8/8/8/8 w - - 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x',
+                    'rnbqkbnr/ppppxppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KX - 0 1',
+                    # each side has exactly one king
+                    '8/8/8/8/8/8/8/4K3 w - - 0 1',
+                    '4k3/8/8/8/8/8/8/4K2K w - - 0 1']:
+            with self.assertRaises(ValueError):
+                Board.from_fen(fen)
+
     def test_score(self):
         self.assertEquals(self.board2.score(Player.BLACK), 0)
         p = Pawn(Location(2, 'a'), Player.WHITE, self.board2)
@@ -197,6 +492,62 @@ class TestBoard(TestCase):
     def test_last_move(self):
         self.assertEquals(self.board2.last_move(), None)
 
+    def test_move_key(self):
+        fens = [fen for fen, _ in PERFT.values()] + ['rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3']
+        kinds = set()
+        for fen in fens:
+            board = Board.from_fen(fen)
+            moves = list(board.valid_moves())
+            self.assertEqual(len({m.key for m in moves}), len(moves))
+            for move in moves:
+                self.assertFalse(hasattr(move, '__dict__'))
+                found = board.move_from_key(move.key)
+                # the key finds an equal move with the same fields
+                self.assertEqual(found, move)
+                self.assertEqual(hash(found), hash(move))
+                self.assertEqual(str(found), str(move))
+                self.assertEqual((found.castle, found.en_passant, found.promotion, found.promotion_piece_class,
+                                  found.rook_piece, found.castle_side),
+                                 (move.castle, move.en_passant, move.promotion, move.promotion_piece_class,
+                                  move.rook_piece, move.castle_side))
+                kinds.add((move.castle, move.en_passant, move.promotion))
+        self.assertEqual(len(kinds), 4)
+
+        # e2e5 and a move of the side not to move have no valid move
+        for key in [12 | 36 << 6, 52 | 44 << 6]:
+            self.assertIsNone(self.board.move_from_key(key))
+        e4 = parse(self.board, 'e2 e4')
+        self.assertEqual(e4.key, 12 | 28 << 6)
+        self.assertNotEqual(e4, parse(self.board, 'e2 e3'))
+        self.assertEqual(len({e4, parse(self.board, 'e2 e4')}), 1)
+
+    def test_memory(self):
+        for obj in [self.board, BitBoard(), Location(1, 'a')] + list(self.board.pieces()):
+            self.assertFalse(hasattr(obj, '__dict__'), obj)
+
+        # a new board took about 32 kB before the slots and attacker lists (19 kB after)
+        Board()
+        tracemalloc.start()
+        try:
+            boards = [Board() for _ in range(20)]
+            per_board = tracemalloc.get_traced_memory()[0] / len(boards)
+        finally:
+            tracemalloc.stop()
+        self.assertLess(per_board, 24000)
+        stats = SearchStats(trace_memory=True)
+        Board.from_fen(SEARCH['rook endgame'][0]).recommended_move(3, stats=stats)
+        # about 250 bytes per node at the peak of the search
+        self.assertLess(stats.memory_peak / stats.nodes, 1000)
+
+    def test_captured(self):
+        self.batch_move(self.board, ['e2 e4', 'd7 d5', 'e4 d5', 'd8 d5', 'b1 c3', 'd5 a2', 'a1 a2'])
+        self.assertEqual((self.board.score(Player.WHITE), self.board.score(Player.BLACK)), (10, 2))
+        for _ in range(3):
+            self.board.undo_move()
+        self.assertEqual((self.board.score(Player.WHITE), self.board.score(Player.BLACK)), (1, 1))
+        self.assertEqual([(p.__class__, p.player) for p in self.board._captured_pieces],
+                         [(Pawn, Player.BLACK), (Pawn, Player.WHITE)])
+
     def test_pieces(self):
         all_pieces = list(self.board.pieces())
         self.assertEquals(all_pieces, self.board._pieces)
@@ -207,6 +558,31 @@ class TestBoard(TestCase):
         white_knights = list(self.board.pieces(piece_class=Knight, player=Player.WHITE))
         self.assertTrue(all([p.player is Player.WHITE and p.__class__ is Knight for p in white_knights]))
 
+    def test_piece_indexes(self):
+        def assertIndexes():
+            for player in Player:
+                self.assertEqual(list(self.board.pieces(player=player)),
+                                  [p for p in self.board._pieces if p.player == player])
+                for piece_class in Board.PIECE_CLASSES:
+                    self.assertEqual(list(self.board.pieces(piece_class, player)),
+                                      [p for p in self.board._pieces if p.player == player and
+                                       p.__class__ is piece_class])
+                self.assertIs(self.board.king(player), next(self.board.pieces(King, player)))
+
+        # captures and a promotion with a capture, then undone
+        moves = ['a2 a4', 'b7 b5', 'a4 b5', 'h7 h6', 'b5 b6', 'g7 g6', 'b6 a7', 'f7 f6', 'a7 b8 q']
+        self.batch_move(self.board, moves)
+        assertIndexes()
+        self.assertEqual(len(list(self.board.pieces(Queen, Player.WHITE))), 2)
+        self.assertEqual(len(list(self.board.pieces(Pawn))), 13)
+        for _ in moves:
+            self.board.undo_move()
+            assertIndexes()
+        # a base class matches the pieces of its subclasses
+        self.assertEqual({p.__class__ for p in self.board.pieces(MultipleMovePiece, Player.BLACK)},
+                          {Queen, Rook, Bishop})
+        self.assertIsNone(Board(False).king(Player.WHITE))
+
     def test_str(self):
         s = "-----------------------------------\n" \
             "8 | R | N | B | Q | K | B | N | R |\n" \
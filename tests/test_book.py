@@ -0,0 +1,101 @@
+import io
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+
+from ai.book import OpeningBook, build, ENTRY
+from board import Board, BitBoard
+from util.pgn import read_games
+
+GAMES = '''[Result "1-0"]
+1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 1-0
+
+[Result "0-1"]
+1. e4 c5 2. Nf3 d6 0-1
+
+[Result "1/2-1/2"]
+1. d4 d5 2. c4 e6 1/2-1/2
+
+[Result "1-0"]
+1. e4 e5 2. Nf3 Nf6 1-0
+
+[Result "1-0"]
+1. e5 e4 1-0
+
+[Result "1-0"]
+1. e4 e5) 2. Nf3 1-0
+'''
+
+
+class TestOpeningBook(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'book.bin')
+        self.entries = build(read_games(io.StringIO(GAMES)), self.path, max_ply=3)
+        self.book = OpeningBook(self.path)
+
+    def tearDown(self):
+        self.book.close()
+        self.directory.cleanup()
+
+    def test_build(self):
+        self.assertEqual(self.entries, 8)
+        self.assertEqual(len(self.book), 8)
+        self.assertEqual(os.path.getsize(self.path), 8 * ENTRY.size)
+        keys = [self.book._keys[i] for i in range(len(self.book))]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_build_bad_games(self):
+        # the moves of a game before an illegal move or a bad FEN are still added
+        text = '[Result "1-0"]\n1. d4 d5 2. Ke3 1-0\n\n[FEN "8/8 w - -"]\n1. e4 *\n'
+        path = os.path.join(self.directory.name, 'bad.bin')
+        self.assertEqual(build(read_games(io.StringIO(text)), path), 2)
+        with OpeningBook(path) as book:
+            self.assertEqual([(str(m), w) for m, w in book.moves(Board())], [('d2-d4', 2)])
+
+    def test_moves(self):
+        board = Board()
+        # e4 won twice and lost once for white, d4 drew once
+        self.assertEqual(sorted((str(m), w) for m, w in self.book.moves(board)), [('d2-d4', 1), ('e2-e4', 4)])
+        board.move(next(m for m, _ in self.book.moves(board) if str(m) == 'e2-e4'))
+        self.assertEqual(sorted((str(m), w) for m, w in self.book.moves(board)), [('c7-c5', 2), ('e7-e5', 0)])
+        self.assertEqual(str(self.book.choose(board)), 'c7-c5')  # moves that only lost are not played
+        self.assertEqual(self.book.hits, 4)
+        board.move(self.book.choose(board))
+        # white lost the only game with this position
+        self.assertEqual([(str(m), w) for m, w in self.book.moves(board)], [('Ng1-f3', 0)])
+        self.assertIsNone(self.book.choose(board))
+        # past the depth of the book
+        board.move(self.book.moves(board)[0][0])
+        self.assertEqual(self.book.moves(board), [])
+        self.assertEqual(self.book.misses, 1)
+
+    def test_choose_seed(self):
+        board = BitBoard()
+        moves = {str(self.book.choose(board, seed)) for seed in range(20)}
+        self.assertEqual(moves, {'d2-d4', 'e2-e4'})
+        self.assertEqual(self.book.choose(board, 5), self.book.choose(board, 5))
+
+    def test_recommended_move(self):
+        board = Board()
+        self.assertIn(str(board.recommended_move(1, book=self.book)), ['d2-d4', 'e2-e4'])
+        board = Board.from_fen('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+        self.assertEqual(str(board.recommended_move(2, book=self.book)), 'Ra1-a8')
+
+    def test_pickle(self):
+        book = pickle.loads(pickle.dumps(self.book))
+        self.assertEqual(book.entries(Board().hash), self.book.entries(Board().hash))
+        self.assertEqual({m.key for m, _ in book.moves(Board())}, {m for m, _ in self.book.entries(Board().hash)})
+        book.close()
+
+    def test_invalid(self):
+        path = os.path.join(self.directory.name, 'bad.bin')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 10)
+        with self.assertRaises(ValueError):
+            OpeningBook(path)
+        open(path, 'wb').close()
+        with OpeningBook(path) as book:
+            self.assertEqual(len(book), 0)
+            self.assertIsNone(book.choose(Board()))
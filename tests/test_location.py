@@ -72,4 +72,32 @@ class TestLocation(TestCase):
 
     def test_from_between_error(self):
         with self.assertRaises(ValueError):
-            list(Location.from_between(Location(1, 'b'), Location(2, 'c')))
\ No newline at end of file
+            list(Location.from_between(Location(1, 'b'), Location(2, 'c')))
+
+    def test_interned(self):
+        self.assertIs(Location(4, 'd'), Location(4, 'd'))
+        self.assertIs(Location(4, 'D'), Location(4, 'd'))
+        self.assertIs(Location.from_string('d4'), Location(4, 'd'))
+        self.assertIs(Location(1, 'a').offset(3, 3), Location(4, 'd'))
+        self.assertEquals(len(list(Location.all())), 64)
+
+    def test_index(self):
+        self.assertEquals(Location(1, 'a').index, 0)
+        self.assertEquals(Location(1, 'h').index, 7)
+        self.assertEquals(Location(8, 'h').index, 63)
+        self.assertIs(Location.SQUARES[Location(5, 'c').index], Location(5, 'c'))
+
+    def test_str_equality(self):
+        self.assertEquals(Location(5, 'c'), 'c5')
+        self.assertEquals({Location(5, 'c'): 1}['c5'], 1)
+
+    def test_targets(self):
+        table = Location.targets([(1, 0), (0, -1)])
+        self.assertEquals(table[Location(1, 'a').index], (Location(2, 'a'),))
+        self.assertEquals(table[Location(4, 'd').index], (Location(5, 'd'), Location(4, 'c')))
+
+    def test_rays(self):
+        table = Location.rays([(1, 1), (-1, 0)])
+        self.assertEquals(table[Location(6, 'c').index], ((Location(7, 'd'), Location(8, 'e')),
+                                                          (Location(5, 'c'), Location(4, 'c'), Location(3, 'c'),
+                                                           Location(2, 'c'), Location(1, 'c'))))
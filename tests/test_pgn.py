@@ -0,0 +1,205 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmark.pgn import SAMPLE
+from benchmark.positions import PERFT
+from board import Board, BitBoard
+from piece import Queen, Knight
+from util.enums import Side
+from util.pgn import Game, PGNError, read_games, open_games, parse_san, san
+from util.validate import validate, validate_game
+
+OPERA = '''[Event "Paris"]
+[White "Paul Morphy"]
+[Black "Duke Karl / Count Isouard"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 {This is a weak move
+already.} 4. dxe5 Bxf3 5. Qxf3 dxe5 6. Bc4 Nf6 7. Qb3 Qe7 8. Nc3 c6 9. Bg5 b5
+10. Nxb5! cxb5 11. Bxb5+ Nbd7 12. O-O-O Rd8 13. Rxd7 Rxd7 14. Rd1 Qe6 (14... Qb4
+{or} (14... Qd6) 15. Bxd7+) 15. Bxd7+ Nxd7 16. Qb8+ $1 Nxb8 17. Rd8# ; checkmate
+1-0
+'''
+
+
+class TestPGN(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_read(self):
+        games = list(read_games(io.StringIO(OPERA * 2)))
+        self.assertEqual(len(games), 2)
+        game = games[0]
+        self.assertEqual(game.headers['White'], 'Paul Morphy')
+        self.assertEqual(game.result, '1-0')
+        self.assertEqual(game.line, 1)
+        self.assertEqual(games[1].line, OPERA.count('\n') + 1)
+        self.assertEqual(len(game.moves), 33)
+        self.assertEqual(game.moves[:4], ['e4', 'e5', 'Nf3', 'd6'])
+        self.assertEqual(game.moves[-1], 'Rd8#')
+        self.assertEqual(game.comments, {6: 'This is a weak move already.', 33: 'checkmate'})
+        self.assertEqual(game.nags, {19: [1], 31: [1]})
+
+    def test_read_without_results(self):
+        text = '%escaped line\n[White "a"]\n1. e4 e5\n[White "b"]\n1.d4 d5 2.c4\n'
+        games = list(read_games(io.StringIO(text)))
+        self.assertEqual([g.headers['White'] for g in games], ['a', 'b'])
+        self.assertEqual([g.moves for g in games], [['e4', 'e5'], ['d4', 'd5', 'c4']])
+        self.assertEqual([g.result for g in games], ['*', '*'])
+
+    def test_read_errors(self):
+        # a bad game is handed back with its error and reading goes on with the next game
+        text = (OPERA + '[White "bad variation"]\n\n1. e4 e5) 2. Nf3 Nc6 1-0\n\n' +
+                '[White "bad tag"]\n[Black\n[Site "x"]\n\n1. d4 d5 *\n' + OPERA)
+        games = list(read_games(io.StringIO(text)))
+        self.assertEqual([g.headers.get('White') for g in games], ['Paul Morphy', 'bad variation', 'bad tag',
+                                                                   'Paul Morphy'])
+        self.assertEqual([g.error is None for g in games], [True, False, False, True])
+        self.assertIn('variation closed', games[1].error)
+        self.assertIn("'[Black' is not a valid tag", games[2].error)
+        self.assertEqual(games[3].moves, games[0].moves)
+        with self.assertRaises(PGNError) as e:
+            list(games[1].replay())
+        self.assertIn('game at line {}'.format(games[1].line), str(e.exception))
+
+        games = list(read_games(io.StringIO('1. e4 e5!!! 2. Nf3')))
+        self.assertEqual(len(games), 1)
+        self.assertIn("'!!!' is not a valid annotation", games[0].error)
+
+    def test_replay(self):
+        game = next(read_games(io.StringIO(OPERA)))
+        positions = [(board.to_fen(), move) for board, move, _ in game.replay()]
+        self.assertEqual(len(positions), 33)
+        self.assertEqual(positions[0][0], 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1')
+        self.assertTrue(positions[22][1].castle)
+        board, _, _ = list(game.replay(BitBoard))[-1]
+        self.assertIsInstance(board, BitBoard)
+        self.assertTrue(board.checkmate())
+
+    def test_replay_fen(self):
+        game = next(read_games(io.StringIO('[SetUp "1"]\n[FEN "{}"]\n\n1. O-O-O Kf8 *'.format(
+            'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1'))))
+        board, _, _ = list(game.replay())[-1]
+        self.assertEqual(board.to_fen(), 'r4k1r/8/8/8/8/8/8/2KR3R w - - 2 2')
+
+    def test_replay_illegal(self):
+        game = next(read_games(io.StringIO('[Site "x"]\n\n1. e4 e5 2. Ke3 *')))
+        with self.assertRaises(PGNError) as e:
+            list(game.replay())
+        self.assertIn('move 3', str(e.exception))
+
+    def test_parse_san(self):
+        board = Board.from_fen('3k4/1P6/8/8/8/8/8/1N1K1N2 w - - 0 1')
+        self.assertEqual(parse_san(board, 'b8=Q+').promotion_piece_class, Queen)
+        self.assertEqual(parse_san(board, 'b8N').promotion_piece_class, Knight)
+        self.assertEqual(str(parse_san(board, 'Nbd2').old_location), 'b1')
+        self.assertEqual(str(parse_san(board, 'Nfd2').old_location), 'f1')
+        for text in ['Nd2', 'b8', 'Ke4', 'Qd4', 'O-O', 'x4', '']:
+            with self.assertRaises(ValueError):
+                parse_san(board, text)
+
+        board = Board.from_fen('r3k2r/8/8/3pP3/8/8/8/4K3 w kq d6 0 1')
+        self.assertTrue(parse_san(board, 'exd6').en_passant)
+        board.move(parse_san(board, 'Kf1'))
+        self.assertEqual(parse_san(board, '0-0-0').castle_side, Side.QUEEN)
+        self.assertEqual(parse_san(board, 'O-O').castle_side, Side.KING)
+
+    def test_san(self):
+        # every move written in SAN reads back as the same move
+        for board_class in [Board, BitBoard]:
+            for fen, _ in PERFT.values():
+                board = board_class.from_fen(fen)
+                written = set()
+                for move in list(board.valid_moves()):
+                    text = san(board, move)
+                    self.assertNotIn(text, written)
+                    written.add(text)
+                    found = parse_san(board, text)
+                    self.assertEqual((found.piece, found.new_location, found.promotion_piece_class, found.castle),
+                                     (move.piece, move.new_location, move.promotion_piece_class, move.castle))
+
+        board = Board.from_fen('2k5/8/8/8/7Q/8/8/K3Q2Q w - - 0 1')
+        self.assertEqual(san(board, parse_san(board, 'Qh1e4')), 'Qh1e4')
+        self.assertEqual(san(board, parse_san(board, 'Qh4e4')), 'Q4e4')
+        self.assertEqual(san(board, parse_san(board, 'Qe1e4')), 'Qee4')
+        self.assertEqual(san(board, parse_san(board, 'Qd8')), 'Qd8+')
+
+    def test_export(self):
+        board = Board.from_fen(PERFT['kiwipete'][0])
+        for text in ['O-O', 'bxc3', 'Bxc3', 'hxg2', 'Kxg2', 'O-O-O', 'Rfd1']:
+            board.move(parse_san(board, text))
+        fen = board.to_fen()
+        game = Game.from_board(board, {'Event': 'test', 'White': 'a "b"'})
+        self.assertEqual(board.to_fen(), fen)
+        self.assertEqual(game.headers['FEN'], PERFT['kiwipete'][0])
+        self.assertEqual(game.moves, ['O-O', 'bxc3', 'Bxc3', 'hxg2', 'Kxg2', 'O-O-O', 'Rfd1'])
+
+        text = game.pgn()
+        self.assertTrue(text.startswith('[Event "test"]\n[White "a \\"b\\""]\n[Result "*"]\n'))
+        self.assertIn('1. O-O bxc3 2. Bxc3 hxg2', text)
+        copy = next(read_games(io.StringIO(text)))
+        self.assertEqual(copy.headers, game.headers)
+        self.assertEqual(list(copy.replay())[-1][0].to_fen(), fen)
+
+    def test_sample(self):
+        games = 0
+        for game in open_games(SAMPLE):
+            board = game.board()
+            for board, _, _ in game.replay():
+                pass
+            if game.result == '1/2-1/2':
+                self.assertTrue(board.draw())
+            elif game.result != '*':
+                self.assertTrue(board.checkmate())
+            games += 1
+        self.assertGreater(games, 100)
+
+    def test_validate(self):
+        path = os.path.join(self.directory.name, 'games.pgn')
+        with open(path, 'w') as f:
+            f.write(OPERA)
+            f.write('[White "illegal"]\n\n1. e4 e5 2. Ke3 *\n\n[White "bad fen"]\n[FEN "8/8 w - -"]\n\n1. e4 *\n')
+            f.write(OPERA)
+        results = list(validate([path, SAMPLE], every=2))
+        self.assertEqual([r['index'] for r in results], list(range(len(results))))
+        self.assertEqual([r['valid'] for r in results[:5]], [True, False, False, True, True])
+        self.assertEqual(results[0]['status'], 'checkmate')
+        self.assertEqual(len(results[0]['positions']), 16)
+        self.assertEqual(results[0]['positions'][0], 'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2')
+        self.assertEqual(results[1]['moves'], 3 - 1)
+        self.assertIn('move 3', results[1]['error'])
+        self.assertEqual(results[4]['file'], SAMPLE)
+
+        # the results come back in the same order from the worker processes
+        self.assertEqual(list(validate([path, SAMPLE], workers=2, every=2, chunk_size=7)), results)
+
+        # a game the reader can't read is a bad game and the games after it are still validated
+        with open(path, 'w') as f:
+            f.write(OPERA + '[White "bad"]\n\n1. e4 e5) 2. Nf3 *\n\n[White "bad tag"]\n[Black\n\n1. d4 *\n' + OPERA)
+        results = list(validate([path], workers=2, chunk_size=1))
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3])
+        self.assertEqual([r['valid'] for r in results], [True, False, False, True])
+        self.assertIn('variation closed', results[1]['error'])
+        self.assertIn('not a valid tag', results[2]['error'])
+        self.assertEqual(results[2]['file'], path)
+
+        # a king-less position is a bad game, while a failure of the engine is reported apart from bad games
+        game = next(read_games(io.StringIO('[FEN "8/8/8/8/8/8/8/4K3 w - - 0 1"]\n\n1. Kd2 *\n')))
+        self.assertIn('one king', validate_game(game)['error'])
+        result = validate_game(next(read_games(io.StringIO(OPERA))), _BrokenBoard)
+        self.assertIsNone(result['valid'])
+        self.assertIsNone(result['error'])
+        self.assertIn('RuntimeError: no status', result['failure'])
+        self.assertIsNone(results[0]['failure'])
+
+
+class _BrokenBoard(Board):
+    __slots__ = ()
+
+    def status(self):
+        raise RuntimeError('no status')
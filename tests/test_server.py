@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmark.load import load
+from util.server import GameServer, Latency
+
+
+async def _serve(test, **kwargs):
+    """ Start a server on a free port with one connection to it
+
+    :param test: coroutine function called with the server, a function sending a line and a function reading one
+    :param kwargs: GameServer arguments
+    :return: what test returns
+    """
+    server = GameServer(1, seed=1, **kwargs)
+    await server.start()
+    reader, writer = await asyncio.open_connection(*server.address[:2])
+
+    def send(line):
+        # surrogate escapes send bytes that are not UTF-8
+        writer.write(line.encode(errors='surrogateescape') + b'\n')
+
+    async def receive():
+        return (await asyncio.wait_for(reader.readline(), 30)).decode().split()
+
+    try:
+        return await test(server, send, receive)
+    finally:
+        writer.close()
+        await server.close()
+
+
+class TestServer(TestCase):
+    def test_protocol(self):
+        async def test(server, send, receive):
+            send('new white 1')
+            words = await receive()
+            self.assertEqual(words[:3], ['game', '1', 'white'])
+            self.assertEqual(' '.join(words[3:]), 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+            send('move 1 e2 e4')
+            self.assertEqual((await receive())[:3], ['moved', '1', 'e2e4'])
+            words = await receive()
+            self.assertEqual(words[:2], ['ai', '1'])
+            self.assertEqual(words[-5], 'w')
+
+            send('move 1 e2 e5')
+            self.assertEqual((await receive())[:2], ['error', '1'])
+            send('move 1 l')
+            self.assertEqual((await receive())[:2], ['moves', '1'])
+            send('move 1 s')
+            self.assertEqual(len(await receive()), 4)
+            send('show 1')
+            self.assertEqual((await receive())[:2], ['board', '1'])
+
+            # the ai moves first when it plays white
+            send('new black')
+            self.assertEqual((await receive())[:3], ['game', '2', 'black'])
+            self.assertEqual((await receive())[:2], ['ai', '2'])
+            for line in ['close 1', 'move 2 q']:
+                send(line)
+            self.assertEqual(await receive(), ['closed', '1'])
+            self.assertEqual(await receive(), ['closed', '2'])
+
+            for line in ['show 1', 'dance', 'new red', 'new white 0', 'new white 3']:
+                send(line)
+                self.assertEqual((await receive())[0], 'error')
+            send('stats')
+            words = await receive()
+            stats = json.loads(' '.join(words[1:]))
+            self.assertEqual(stats['games'], 0)
+            self.assertEqual(stats['counters']['ai moves'], 2)
+            self.assertEqual(stats['latency']['move']['count'], 5)
+
+        asyncio.run(_serve(test))
+
+    def test_max_depth(self):
+        async def test(server, send, receive):
+            send('new none 99999')
+            self.assertEqual(await receive(), ['error', 'the', 'depth', 'must', 'be', 'from', '1', 'to', '3'])
+            send('new none 3')
+            self.assertEqual((await receive())[0], 'game')
+            self.assertEqual(server.games['1'].depth, 3)
+
+        asyncio.run(_serve(test, max_depth=3))
+
+    def test_bad_squares(self):
+        async def test(server, send, receive):
+            send('new none')
+            game = (await receive())[1]
+            for move in ['a9 a8', 'e2 e9', 'a9 a8 q']:
+                send('move {} {}'.format(game, move))
+                self.assertEqual((await receive())[:2], ['error', game])
+            # the connection still answers
+            send('move {} e2 e4'.format(game))
+            self.assertEqual((await receive())[:3], ['moved', game, 'e2e4'])
+
+        asyncio.run(_serve(test))
+
+    def test_bad_input(self):
+        async def test(server, send, receive):
+            send('new none')
+            game = (await receive())[1]
+            send('move {} \udcff\udcfe'.format(game))
+            self.assertEqual((await receive())[:2], ['error', game])
+            # a command that fails is answered with an error and the connection still answers
+            server.stats = lambda: 1 / 0
+            send('stats')
+            self.assertEqual(await receive(), ['error', 'ZeroDivisionError:', 'division', 'by', 'zero'])
+            self.assertEqual(server.counters['errors'], 1)
+            send('new none')
+            self.assertEqual((await receive())[0], 'game')
+
+        asyncio.run(_serve(test))
+
+    def test_over(self):
+        async def test(server, send, receive):
+            send('new none')
+            game = (await receive())[1]
+            for move in ['f2 f3', 'e7 e5', 'g2 g4', 'd8 h4']:
+                send('move {} {}'.format(game, move))
+                self.assertEqual((await receive())[0], 'moved')
+            self.assertEqual(await receive(), ['over', game, '0-1'])
+            send('move {} r'.format(game))
+            self.assertEqual(await receive(), ['error', game, 'the', 'game', 'is', 'over'])
+
+        asyncio.run(_serve(test))
+
+    def test_evict(self):
+        async def test(server, send, receive):
+            send('new none')
+            game = (await receive())[1]
+            await asyncio.sleep(0.3)
+            send('show {}'.format(game))
+            self.assertEqual((await receive())[0], 'error')
+            self.assertEqual(server.counters['evicted'], 1)
+
+            send('new none')
+            await receive()
+            send('new none')
+            self.assertEqual(await receive(), ['error', 'the', 'server', 'has', '1', 'games'])
+
+        asyncio.run(_serve(test, idle_timeout=0.05, max_games=1))
+
+    def test_back_pressure(self):
+        async def test(server, send, receive):
+            for _ in range(4):
+                send('new black 2')
+            answers = [(await receive())[0] for _ in range(8)]
+            self.assertEqual(answers.count('ai'), 4)
+            # a game waits for the ai turn before it is searched
+            self.assertEqual(server.counters['peak pending'], 1)
+            self.assertEqual(server.latency['queue'].count, 4)
+
+        asyncio.run(_serve(test, max_pending=1))
+
+    def test_load(self):
+        async def test():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'server.sock')
+                server = GameServer(1, depth=1)
+                await server.start(path=path)
+                try:
+                    return await load(path=path, connections=2, games=2, plies=6)
+                finally:
+                    await server.close()
+
+        results = asyncio.run(test())
+        self.assertEqual(results['games'], 4)
+        self.assertGreater(results['moves'], 0)
+        self.assertEqual(results['latency']['count'], results['server']['counters']['ai moves'])
+        self.assertEqual(results['server']['counters']['connections'], 2)
+
+    def test_latency(self):
+        latency = Latency(window=10)
+        for ms in range(1, 21):
+            latency.add(ms / 1000)
+        summary = latency.summary()
+        self.assertEqual(summary['count'], 20)
+        self.assertAlmostEqual(summary['mean'], 10.5)
+        self.assertEqual((summary['p50'], summary['p99'], summary['max']), (16, 20, 20))
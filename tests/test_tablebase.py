@@ -0,0 +1,129 @@
+import os
+import pickle
+import random
+import tempfile
+from unittest import TestCase
+
+from ai.minimax import SearchStats
+from ai.tablebase import Tablebases, build, parse, name, dependencies, HEADER
+from board import Board
+from piece import Queen, Rook, Knight, Pawn
+
+
+class TestTablebase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.generated = build(['KPK'], cls.directory.name)
+        cls.tablebases = Tablebases(cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebases.close()
+        cls.directory.cleanup()
+
+    def test_signatures(self):
+        self.assertEqual(parse('kqk'), (Queen,))
+        self.assertEqual(parse('KNRK'), (Rook, Knight))
+        self.assertEqual(name((Knight, Rook)), 'KRNK')
+        self.assertEqual(dependencies((Pawn,)), {(Queen,), (Rook,)})
+        for signature in ['KQ', 'KQKR', 'KQRBK']:
+            with self.assertRaises(ValueError):
+                parse(signature)
+
+    def test_build(self):
+        # the tables a promotion leads to are generated first
+        self.assertEqual([signature for signature, _, _ in self.generated], ['KQK', 'KRK', 'KPK'])
+        self.assertEqual(build(['KQK'], self.directory.name), [])
+        # the longest mates are 10 moves with a queen, 16 with a rook and 28 with a pawn
+        for signature, plies in [('KQK', 19), ('KRK', 31), ('KPK', 55)]:
+            with open(os.path.join(self.directory.name, signature + '.tb'), 'rb') as f:
+                data = f.read()[HEADER.size:]
+            self.assertEqual(max(data[:len(data) // 2]) - 1, plies)
+
+    def test_probe(self):
+        for fen, probed in [
+                ('4k3/8/4K3/8/8/8/8/7R w - - 0 1', (1, 1)),
+                ('4k3/8/4K3/8/8/8/8/7R b - - 0 1', (-1, 4)),
+                ('8/4k3/8/8/8/8/4P3/4K3 w - - 0 1', (0, 0)),
+                ('4k3/8/4K3/4P3/8/8/8/8 b - - 0 1', (-1, 24)),
+                ('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1', (0, 0)),
+                ('8/8/4k3/8/8/2KB4/8/8 w - - 0 1', (0, 0))]:
+            self.assertEqual(self.tablebases.probe(Board.from_fen(fen)), probed, fen)
+        # the colours are swapped when the side with the pieces is black
+        self.assertEqual(self.tablebases.probe(Board.from_fen('8/8/8/8/4p3/4k3/8/4K3 w - - 0 1')), (-1, 24))
+        for fen in ['4k3/8/4K3/8/8/8/8/6RR w - - 0 1', '4k3/8/4K3/8/8/8/8/r6R w - - 0 1', Board().to_fen()]:
+            self.assertIsNone(self.tablebases.probe(Board.from_fen(fen)))
+
+    def test_moves(self):
+        # every position is scored from the positions its valid moves lead to
+        rng = random.Random(5)
+        for pieces in ['QK', 'RK', 'PK', 'qk', 'pk']:
+            checked = 0
+            while checked < 40:
+                fen = _fen(zip('K' + pieces, rng.sample(range(64), 3)), rng.choice('wb'))
+                if fen is None:
+                    continue
+                board = Board.from_fen(fen)
+                if board.check(board.current_player.opponent()):
+                    continue
+                probed = self.tablebases.probe(board)
+                children = []
+                for move in list(board.valid_moves()):
+                    board.move(move)
+                    result, plies = self.tablebases.probe(board)
+                    children.append((-result, result * (plies + 1)))
+                    board.undo_move()
+                if not children:
+                    expected = (-1, 0) if board.check(board.current_player) else (0, 0)
+                else:
+                    result, plies = max(children)
+                    expected = (result, -result * plies)
+                self.assertEqual(probed, expected, board.to_fen())
+                checked += 1
+
+    def test_best_moves(self):
+        # playing the best moves for both sides mates in the number of plies the table gives
+        board = Board.from_fen('8/8/3k4/8/8/8/8/R3K3 w - - 0 1')
+        result, plies = self.tablebases.probe(board)
+        self.assertEqual(result, 1)
+        for _ in range(plies):
+            board.move(board.recommended_move(seed=1, tablebases=self.tablebases))
+        self.assertTrue(board.checkmate())
+
+    def test_search(self):
+        # winning the rook leads to a won ending with the queen
+        board = Board.from_fen('8/8/3k4/8/8/2r5/8/2Q1K3 w - - 0 1')
+        stats = SearchStats()
+        move = board.recommended_move(2, stats=stats, tablebases=self.tablebases)
+        self.assertEqual(str(move.new_location), 'c3')
+        self.assertGreater(stats.tablebase_hits, 0)
+
+        copy = pickle.loads(pickle.dumps(self.tablebases))
+        self.assertEqual(copy.directory, self.tablebases.directory)
+        self.assertEqual(copy.probe(Board.from_fen('4k3/8/4K3/8/8/8/8/7R w - - 0 1')), (1, 1))
+        copy.close()
+
+    def test_bad_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'KQK.tb'), 'wb') as f:
+                f.write(b'TBv1KQK     ')
+            with Tablebases(directory) as tablebases, self.assertRaises(ValueError):
+                tablebases.probe(Board.from_fen('4k3/8/4K3/8/8/8/8/7Q w - - 0 1'))
+
+
+def _fen(placed, side):
+    """ Write the FEN of kings and pieces on squares (or None when a pawn is on the first or last rank)
+
+    :param placed: iterable of (letter, square index) starting with the white king and ending with the black king
+    :param side: 'w' or 'b'
+    :return: str
+    """
+    rows = [['1'] * 8 for _ in range(8)]
+    placed = list(placed)
+    placed[-1] = ('k', placed[-1][1])
+    for letter, square in placed:
+        if letter in 'Pp' and not 8 <= square < 56:
+            return None
+        rows[7 - square // 8][square % 8] = letter
+    return '/'.join(''.join(row) for row in rows) + ' {} - - 0 1'.format(side)
@@ -0,0 +1,56 @@
+from unittest import TestCase
+
+from benchmark.tournament import Engine, play_game, match, elo, insufficient_material
+from board import Board
+from util.pgn import read_games
+
+
+class TestTournament(TestCase):
+    def test_engine_options(self):
+        engine = Engine.from_string('depth=3,quiescence=0,mobility=1,table=1')
+        self.assertEqual((engine.depth, engine.quiescence, engine.mobility, engine.table), (3, 0, True, 1))
+        engine = Engine.from_string('time=0.5')
+        self.assertEqual((engine.depth, engine.time_limit), (None, 0.5))
+        with self.assertRaises(ValueError):
+            Engine.from_string('speed=3')
+
+    def test_elo(self):
+        self.assertEqual(elo(5, 0, 5)[0], 0)
+        difference, low, high = elo(6, 2, 2)
+        self.assertAlmostEqual(difference, 147.2, 1)
+        self.assertLess(low, difference)
+        self.assertGreater(high, difference)
+        # more games give a narrower interval
+        _, more_low, more_high = elo(60, 20, 20)
+        self.assertLess(more_high - more_low, high - low)
+        self.assertEqual(elo(3, 0, 0)[0], float('inf'))
+
+    def test_insufficient_material(self):
+        self.assertTrue(insufficient_material(Board.from_fen('8/8/4k3/8/8/2KB4/8/8 w - - 0 1')))
+        self.assertFalse(insufficient_material(Board.from_fen('8/8/4k3/8/8/2KR4/8/8 w - - 0 1')))
+        self.assertFalse(insufficient_material(Board()))
+
+    def test_play_game(self):
+        engine = Engine('a', depth=1)
+        result = play_game(engine, Engine('b', depth=1, quiescence=0), seed=3, max_moves=30, adjudicate=0)
+        self.assertLessEqual(result['plies'], 30)
+        self.assertIn(result['result'], ['1-0', '0-1', '1/2-1/2'])
+        if result['reason'] == 'move cap':
+            self.assertEqual(result['result'], '1/2-1/2')
+        self.assertEqual(result['moves']['a'] + result['moves']['b'], result['plies'] - 4)
+        game = next(read_games(result['pgn'].splitlines()))
+        self.assertEqual(len(game.moves), result['plies'])
+        self.assertEqual(game.result, result['result'])
+
+        # the same seed plays the same game
+        again = play_game(engine, Engine('b', depth=1, quiescence=0), seed=3, max_moves=30, adjudicate=0)
+        self.assertEqual(again['pgn'], result['pgn'])
+
+    def test_match(self):
+        a, b = Engine('a', depth=1), Engine('b', depth=1)
+        results = list(match(a, b, 4, seed=7, max_moves=12))
+        self.assertEqual([(r['white'], r['seed']) for r in results], [('a', 7), ('b', 7), ('a', 8), ('b', 8)])
+        # both games of a pair start with the same opening
+        self.assertEqual(results[0]['pgn'].split('\n\n')[1][:20], results[1]['pgn'].split('\n\n')[1][:20])
+        self.assertEqual([r['pgn'] for r in match(a, b, 4, seed=7, workers=2, max_moves=12)],
+                         [r['pgn'] for r in results])
@@ -0,0 +1,79 @@
+from unittest import TestCase
+
+from ai.transposition import TranspositionTable
+from ai.minimax import alphabeta
+from board import Board
+from util.enums import Bound
+from util.input_parser import parse
+
+
+class TestTranspositionTable(TestCase):
+    def setUp(self):
+        self.table = TranspositionTable(1)
+
+    def test_size(self):
+        self.assertEqual(self.table.buckets, 1024 * 1024 // (TranspositionTable.ENTRY_SIZE * 2))
+        self.assertEqual(TranspositionTable(2).buckets, self.table.buckets * 2)
+
+    def test_store_probe(self):
+        self.assertIsNone(self.table.probe(12345))
+        self.table.store(12345, 3, Bound.LOWER, 1.5, 42)
+        entry = self.table.probe(12345)
+        self.assertEqual((entry.depth, entry.bound, entry.score, entry.move), (3, Bound.LOWER, 1.5, 42))
+        self.assertEqual(self.table.hits, 1)
+        self.assertEqual(self.table.misses, 1)
+
+    def test_depth_preferred(self):
+        n = self.table.buckets
+        self.table.store(1, 5, Bound.EXACT, 1)
+        self.table.store(1 + n, 2, Bound.EXACT, 2)  # same bucket, shallower: goes to the always replace slot
+        self.table.store(1 + 2 * n, 1, Bound.EXACT, 3)  # replaces the always replace slot
+        self.assertEqual(self.table.probe(1).score, 1)
+        self.assertIsNone(self.table.probe(1 + n))
+        self.assertEqual(self.table.probe(1 + 2 * n).score, 3)
+        self.assertEqual(self.table.collisions, 1)
+        self.table.store(1 + 3 * n, 6, Bound.EXACT, 4)  # deeper: replaces the depth preferred slot
+        self.assertIsNone(self.table.probe(1))
+        self.assertEqual(self.table.collisions, 2)
+
+    def test_new_search_replaces_old(self):
+        n = self.table.buckets
+        self.table.store(1, 5, Bound.EXACT, 1)
+        self.table.new_search()
+        self.table.store(1 + n, 2, Bound.EXACT, 2)
+        self.assertIsNone(self.table.probe(1))
+        self.assertEqual(self.table.probe(1 + n).score, 2)
+
+    def test_clear(self):
+        self.table.store(1, 5, Bound.EXACT, 1)
+        self.table.probe(1)
+        self.table.clear()
+        self.assertEqual(len(self.table), 0)
+        self.assertEqual(self.table.stats()['hits'], 0)
+
+
+class TestAlphaBetaTable(TestCase):
+    def setUp(self):
+        self.board = Board()
+        for move in ['e2 e4', 'e7 e5', 'g1 f3', 'b8 c6']:
+            self.board.move(parse(self.board, move))
+
+    def test_same_score(self):
+        table = TranspositionTable(1)
+        expected, _ = alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'))
+        score, moves = alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'), table)
+        self.assertEqual(score, expected)
+        self.assertTrue(moves)
+        self.assertGreater(table.stores, 0)
+
+        # the second search reuses the stored results
+        score, moves = alphabeta(self.board, self.board.current_player, 0, 2, -float('inf'), float('inf'), table)
+        self.assertEqual(score, expected)
+        self.assertGreater(table.hits, 0)
+
+    def test_recommended_move(self):
+        board = Board()
+        for move in ['f2 f3', 'e7 e5', 'g2 g4']:
+            board.move(parse(board, move))
+        move = board.recommended_move(2, table=TranspositionTable(1))
+        self.assertEqual(move, parse(board, 'd8 h4'))
@@ -0,0 +1,139 @@
+import io
+import os
+import subprocess
+import sys
+import time
+from unittest import TestCase, mock
+
+from util.uci import Engine, Limits, allocate, score_text, uci_move, parse_move
+from board import Board
+
+
+class TestUCI(TestCase):
+    def setUp(self):
+        self.output = io.StringIO()
+        self.engine = Engine(self.output)
+
+    def tearDown(self):
+        self.engine.handle('quit')
+
+    def lines(self):
+        return self.output.getvalue().splitlines()
+
+    def test_handshake(self):
+        self.engine.handle('uci')
+        self.engine.handle('isready')
+        lines = self.lines()
+        self.assertEqual(lines[0], 'id name command-line-chess')
+        self.assertIn('option name Hash type spin default 16 min 1 max 1024', lines)
+        self.assertEqual(lines[-2:], ['uciok', 'readyok'])
+        self.engine.handle('setoption name Hash value 2')
+        self.assertEqual(self.engine.options['Hash'], 2)
+        self.engine.handle('setoption name Colour value red')
+        self.assertTrue(self.lines()[-1].startswith('info string'))
+        # a file that can't be opened is reported instead of ending the engine
+        self.engine.handle('setoption name BookFile value /nonexistent/book.bin')
+        self.assertTrue(self.lines()[-1].startswith('info string'))
+        self.engine.handle('isready')
+        self.assertEqual(self.lines()[-1], 'readyok')
+        self.assertFalse(self.engine.handle('quit'))
+
+    def test_position(self):
+        self.engine.handle('position startpos moves e2e4 e7e5 g1f3')
+        self.assertEqual(self.engine.board.to_fen(), 'rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2')
+        self.engine.handle('position fen r6k/4P3/8/8/8/8/8/4K2R w K - 0 1 moves e1g1 a8a1 e7e8q')
+        self.assertEqual(self.engine.board.to_fen(), '4Q2k/8/8/8/8/8/8/r4RK1 b - - 0 2')
+        self.engine.handle('position startpos moves e2e5')
+        self.assertIn("'e2e5' is not a valid move", self.lines()[-1])
+
+        board = Board.from_fen('4k3/1P6/8/8/8/8/8/4K3 w - - 0 1')
+        self.assertEqual(uci_move(parse_move(board, 'b7b8N')), 'b7b8n')
+
+    def test_go_depth(self):
+        self.engine.handle('position startpos moves e2e4')
+        self.engine.handle('go depth 2')
+        self.engine.wait()
+        lines = self.lines()
+        self.assertTrue(lines[0].startswith('info depth 1 score cp '))
+        self.assertIn(' nodes ', lines[1])
+        self.assertIn(' nps ', lines[1])
+        self.assertIn(' pv ', lines[1])
+        self.assertTrue(lines[-1].startswith('bestmove '))
+        parse_move(self.engine.board, lines[-1].split()[1])
+
+    def test_search_error(self):
+        # the best move is still sent when the search fails
+        self.engine.board = _BrokenBoard()
+        errors = []
+        with mock.patch('threading.excepthook', errors.append):
+            self.engine.handle('go depth 2')
+            self.engine.wait()
+        self.assertEqual(self.lines()[-1], 'bestmove 0000')
+        self.assertIsInstance(errors[0].exc_value, RuntimeError)
+
+    def test_mate(self):
+        self.engine.handle('position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+        self.engine.handle('go depth 3')
+        self.engine.wait()
+        self.assertIn('score mate 1', self.lines()[-2])
+        self.assertEqual(self.lines()[-1], 'bestmove a1a8')
+
+        self.engine.handle('position fen 7k/5Q2/6K1/8/8/8/8/8 b - - 0 1')
+        self.engine.handle('go depth 3')
+        self.engine.wait()
+        self.assertEqual(self.lines()[-1], 'bestmove 0000')
+
+    def test_stop(self):
+        self.engine.handle('go infinite')
+        time.sleep(0.3)
+        # an infinite search only answers when it is stopped
+        self.engine.handle('isready')
+        self.assertFalse(any(line.startswith('bestmove') for line in self.lines()))
+        self.assertIn('readyok', self.lines())
+        start = time.perf_counter()
+        self.engine.handle('stop')
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertTrue(self.lines()[-1].startswith('bestmove '))
+
+    def test_ponderhit(self):
+        self.engine.handle('setoption name Ponder value true')
+        self.engine.handle('go ponder wtime 3000 btime 3000')
+        time.sleep(0.3)
+        self.assertFalse(any(line.startswith('bestmove') for line in self.lines()))
+        self.engine.handle('ponderhit')
+        self.engine.wait()
+        self.assertTrue(self.lines()[-1].startswith('bestmove '))
+
+    def test_limits(self):
+        limits = Limits.from_tokens('wtime 60000 btime 30000 winc 1000 movestogo 10 searchmoves e2e4'.split())
+        self.assertEqual((limits.wtime, limits.btime, limits.winc, limits.movestogo), (60000, 30000, 1000, 10))
+        self.assertAlmostEqual(limits.seconds(True), 6.7)
+        self.assertAlmostEqual(limits.seconds(False), 2.95)
+        self.assertEqual(Limits.from_tokens(['movetime', '250']).seconds(True), 0.25)
+        self.assertIsNone(Limits.from_tokens(['infinite']).seconds(True))
+        self.assertEqual(allocate(40), 0)
+        # a missing or bad value is skipped without losing the arguments after it
+        limits = Limits.from_tokens('depth x movetime infinite nodes'.split())
+        self.assertEqual((limits.depth, limits.movetime, limits.nodes, limits.infinite), (None, None, None, True))
+        self.assertIsNone(Limits.from_tokens(['depth']).depth)
+
+        self.assertEqual(score_text(10 / 3, 2), 'cp 100')
+        self.assertEqual(score_text(-10, 0), 'cp -100')
+        self.assertEqual(score_text(1000000 / 2, 3), 'mate 1')
+        self.assertEqual(score_text(-1000000 / 3, 3), 'mate -1')
+
+    def test_process(self):
+        commands = 'uci\nisready\nposition startpos moves d2d4\ngo depth 1\n'
+        # the engine stops its search and answers when its input ends
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, '-m', 'util.uci'], input=commands, capture_output=True, text=True,
+                                timeout=60, cwd=root).stdout.splitlines()
+        self.assertIn('uciok', output)
+        self.assertTrue(output[-1].startswith('bestmove '))
+
+
+class _BrokenBoard(Board):
+    __slots__ = ()
+
+    def valid_moves(self):
+        raise RuntimeError('no moves')
@@ -16,4 +16,10 @@ class Color(enum.Enum):
 
 class Side(enum.Enum):
     KING = 0
-    QUEEN = 1
\ No newline at end of file
+    QUEEN = 1
+
+
+class Bound(enum.Enum):
+    EXACT = 0  # score is the exact value of the position
+    LOWER = 1  # score is a lower bound (search failed high)
+    UPPER = 2  # score is an upper bound (search failed low)
@@ -0,0 +1,360 @@
+import re
+
+from board import Board, Location
+from piece import King, Queen, Rook, Bishop, Knight, Pawn
+from util.enums import Player, Side
+
+SAN_PIECES = {'N': Knight, 'B': Bishop, 'R': Rook, 'Q': Queen, 'K': King}
+SAN_LETTERS = {piece_class: c for c, piece_class in SAN_PIECES.items()}
+# tags written first in export format
+ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+# move suffix annotations and the numeric annotation glyphs they stand for
+GLYPHS = {'!': 1, '?': 2, '!!': 3, '??': 4, '!?': 5, '?!': 6}
+
+_SAN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+_SQUARES = {str(location): location for location in Location.SQUARES}
+_CASTLES = {'O-O': Side.KING, 'O-O-O': Side.QUEEN, '0-0': Side.KING, '0-0-0': Side.QUEEN}
+_ESCAPE = re.compile(r'\\(.)')
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# movetext tokens: comments, glyphs, variations, results, move numbers (skipped) and moves (with any suffix annotation)
+_TOKEN = re.compile(r'\{[^}]*\}?|;.*|\$\d+|[()]|(?:1-0|0-1|1/2-1/2|\*)(?=[\s(){};]|$)|\d+\.+|([^\s{}();$!?]+)([!?]*)')
+
+
+class PGNError(ValueError):
+    pass
+
+
+class Game:
+    """
+    Game read from a PGN file: its tags, the SAN of its moves and their annotations (variations are skipped)
+    """
+    def __init__(self, line=None):
+        """ initializer
+
+        :param line: line number the game starts on in its file
+        :return:
+        """
+        self.headers = {}
+        self.moves = []  # SAN of the moves as written (without annotation suffixes)
+        self.comments = {}  # comments keyed by the number of moves played before them (0 is before the first move)
+        self.nags = {}  # numeric annotation glyphs keyed by the number of moves played before them
+        self.result = '*'
+        self.line = line
+        self.error = None  # why the rest of the game could not be read (its moves are then incomplete)
+
+    def __repr__(self):
+        return 'Game({} vs {}, {} moves, {})'.format(self.headers.get('White', '?'), self.headers.get('Black', '?'),
+                                                    len(self.moves), self.result)
+
+    @classmethod
+    def from_board(cls, board, headers=None, result=None):
+        """ Create a game from the moves played on a board
+
+        The moves are taken back to find the starting position and then played again from their SAN, so the board
+        ends in the same position but its history holds new moves (a promoted piece is a new piece once replayed).
+
+        :param board: Board class
+        :param headers: dict of tags
+        :param result: result of the game (defaults to the result of the position or * when it is not over)
+        :return: Game
+        """
+        game = cls()
+        game.headers.update(headers or {})
+        # each move is written just after it is taken back so it is made on the same pieces it was made on
+        for _ in range(len(board._moves) - board._history_start):
+            move = board.last_move()
+            board.undo_move()
+            game.moves.append(san(board, move))
+        game.moves.reverse()
+        fen = board.to_fen()
+        if fen != board.START_FEN:
+            game.headers['SetUp'] = '1'
+            game.headers['FEN'] = fen
+        for text in game.moves:
+            board.move(parse_san(board, text))
+        if result is None:
+            check, draw, checkmate = board.status()
+            if checkmate:
+                result = '0-1' if board.current_player == Player.WHITE else '1-0'
+            else:
+                result = '1/2-1/2' if draw else '*'
+        game.result = result
+        game.headers['Result'] = result
+        return game
+
+    def pgn(self):
+        """ Write the game in PGN export format (the seven tag roster first and movetext lines of at most 80 characters)
+
+        :return: str
+        """
+        tags = [tag for tag in ROSTER if tag in self.headers] + [tag for tag in self.headers if tag not in ROSTER]
+        lines = ['[{} "{}"]'.format(tag, self.headers[tag].replace('\\', '\\\\').replace('"', '\\"'))
+                 for tag in tags]
+        lines.append('')
+
+        # a move number goes before white's moves and before black's move after a comment or at the start
+        board = self.board()
+        number = int(board.to_fen().split()[-1])
+        black = board.current_player == Player.BLACK
+        tokens = []
+        if 0 in self.comments:
+            tokens.append('{{{}}}'.format(self.comments[0]))
+        for ply, text in enumerate(self.moves, 1):
+            if not black:
+                text = '{}. {}'.format(number, text)
+            elif ply == 1 or ply - 1 in self.comments:
+                text = '{}... {}'.format(number, text)
+            tokens.append(text)
+            tokens.extend('${}'.format(nag) for nag in self.nags.get(ply, []))
+            if ply in self.comments:
+                tokens.append('{{{}}}'.format(self.comments[ply]))
+            number += black
+            black = not black
+        tokens.append(self.result)
+
+        line = ''
+        for token in tokens:
+            if line and len(line) + len(token) >= 80:
+                lines.append(line)
+                line = token
+            else:
+                line = '{} {}'.format(line, token) if line else token
+        lines.append(line)
+        return '\n'.join(lines) + '\n'
+
+    def board(self, board_class=Board):
+        """ Create a board with the starting position of the game (the FEN tag or the standard position)
+
+        :param board_class: class of board to create
+        :return: Board
+        """
+        fen = self.headers.get('FEN')
+        return board_class() if fen is None else board_class.from_fen(fen)
+
+    def replay(self, board_class=Board):
+        """ Play the moves of the game on a new board one at a time
+
+        The same board is yielded after each move so copy anything needed from it before asking for the next move.
+
+        :param board_class: class of board to play on
+        :return: generator of (board, move, san) after each move is made
+        """
+        if self.error is not None:
+            raise PGNError('game at line {}: {}'.format(self.line, self.error))
+        board = self.board(board_class)
+        for ply, text in enumerate(self.moves):
+            try:
+                move = parse_san(board, text)
+            except ValueError as e:
+                raise PGNError('game at line {}: move {} {}'.format(self.line, ply + 1, e)) from None
+            board.move(move)
+            yield board, move, text
+
+
+def read_games(lines):
+    """ Read the games of a PGN file one at a time without keeping the rest of the file in memory
+
+    A game that can't be read is yielded with its error set (see Game.error) and the rest of it is skipped up to the
+    tags of the next game, so one bad game does not end the reading of the file.
+
+    :param lines: iterable of lines (e.g. an open text file)
+    :return: Game generator
+    """
+    game = None
+    comment = None  # text of a comment that continues on the next line
+    depth = 0  # nesting depth of the variation being skipped
+    skipping = None  # whether the movetext of a game that can't be read has been reached while skipping it
+    for number, line in enumerate(lines, 1):
+        if comment is None:
+            if line.startswith('%'):
+                # escaped line
+                continue
+            stripped = line.strip()
+            if skipping is not None:
+                if not stripped.startswith('['):
+                    skipping = skipping or bool(stripped)
+                    continue
+                if not skipping:
+                    # the other tags of the bad game
+                    continue
+                yield game
+                game, depth, skipping = None, 0, None
+            if stripped.startswith('['):
+                # a tag after the moves of a game without a result starts the next game
+                if game is not None and (game.moves or game.comments):
+                    yield game
+                    game = None
+                if game is None:
+                    game = Game(number)
+                tag = _TAG.match(stripped)
+                if tag is None:
+                    game.error = "line {}: '{}' is not a valid tag".format(number, stripped)
+                    skipping = False
+                    continue
+                game.headers[tag.group(1)] = _ESCAPE.sub(r'\1', tag.group(2))
+                continue
+            if not stripped:
+                continue
+            if game is None:
+                game = Game(number)
+            pos = 0
+        else:
+            end = line.find('}')
+            if end < 0:
+                comment.append(line.strip())
+                continue
+            comment.append(line[:end].strip())
+            if not depth:
+                _add(game.comments, len(game.moves), ' '.join(c for c in comment if c))
+            comment = None
+            pos = end + 1
+
+        for token in _TOKEN.finditer(line, pos):
+            text = token.group()
+            c = text[0]
+            if c == '{':
+                if text[-1] != '}':
+                    comment = [text[1:].strip()]
+                elif not depth:
+                    _add(game.comments, len(game.moves), text[1:-1].strip())
+            elif c == ';':
+                if not depth:
+                    _add(game.comments, len(game.moves), text[1:].strip())
+            elif c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+                if depth < 0:
+                    game.error = 'line {}: variation closed without being opened'.format(number)
+                    skipping = True
+                    break
+            elif depth:
+                continue
+            elif c == '$':
+                game.nags.setdefault(len(game.moves), []).append(int(text[1:]))
+            elif text in RESULTS:
+                game.result = text
+                yield game
+                game = None
+                break
+            elif token.group(1):
+                game.moves.append(token.group(1))
+                if token.group(2):
+                    glyph = GLYPHS.get(token.group(2))
+                    if glyph is None:
+                        game.error = "line {}: '{}' is not a valid annotation".format(number, token.group(2))
+                        skipping = True
+                        break
+                    game.nags.setdefault(len(game.moves), []).append(glyph)
+    if game is not None and (game.moves or game.headers or game.error is not None):
+        yield game
+
+
+def _add(comments, ply, text):
+    """ Add a comment to the comments of a game
+
+    :param comments: dict of comments keyed by the number of moves played
+    :param ply: number of moves played before the comment
+    :param text: comment
+    :return: None
+    """
+    comments[ply] = text if ply not in comments else '{} {}'.format(comments[ply], text)
+
+
+def open_games(path):
+    """ Read the games of a PGN file one at a time
+
+    :param path: path of the PGN file
+    :return: Game generator
+    """
+    with open(path, encoding='utf-8-sig', errors='replace') as f:
+        yield from read_games(f)
+
+
+def parse_san(board, text):
+    """ Find the valid move of the current player written in standard algebraic notation (e.g. Nf3, exd5, e8=Q, O-O)
+
+    Only the moves of the pieces that can match the notation are generated.
+
+    :param board: Board class
+    :param text: str SAN (check and annotation suffixes are ignored)
+    :return: Move
+    """
+    text = text.rstrip('+#!?')
+    player = board.current_player
+    legality = board.legality(player)
+    side = _CASTLES.get(text)
+    if side is not None:
+        king = legality[0]
+        for move in king.moves():
+            if move.castle and move.castle_side == side and board.legal(move, legality):
+                return move
+        raise ValueError("'{}' is not a valid move for {}".format(text, player))
+
+    match = _SAN.match(text)
+    if match is None:
+        raise ValueError("'{}' is not standard algebraic notation".format(text))
+    letter, col, row, destination, promotion = match.groups()
+    piece_class = SAN_PIECES[letter] if letter else Pawn
+    if piece_class is Pawn and col is None:
+        # a pawn that does not capture stays on its column
+        col = destination[0]
+    destination = _SQUARES[destination]
+    promotion_class = SAN_PIECES[promotion] if promotion else None
+    found = None
+    # testing an en passant capture makes the move which reorders the pieces so take the list of pieces first
+    for p in list(board.pieces(piece_class=piece_class, player=player)):
+        location = p.location
+        if (col is not None and location.col != col) or (row is not None and location.row != int(row)):
+            continue
+        for move in p.moves():
+            if move.new_location is not destination or move.castle or move.promotion_piece_class is not promotion_class:
+                continue
+            if board.legal(move, legality):
+                if found is not None:
+                    raise ValueError("'{}' is ambiguous for {}".format(text, player))
+                found = move
+    if found is None:
+        raise ValueError("'{}' is not a valid move for {}".format(text, player))
+    return found
+
+
+def san(board, move):
+    """ Write a valid move of the current player in standard algebraic notation with its check or checkmate suffix
+
+    :param board: Board class
+    :param move: Move
+    :return: str
+    """
+    piece = move.piece
+    if move.castle:
+        text = 'O-O' if move.castle_side == Side.KING else 'O-O-O'
+    else:
+        piece_class = piece.__class__
+        capture = 'x' if move.captured_piece is not None else ''
+        if piece_class is Pawn:
+            text = '{}{}{}'.format(piece.location.col if capture else '', capture, move.new_location)
+            if move.promotion:
+                text += '=' + SAN_LETTERS[move.promotion_piece_class]
+        else:
+            # tell apart the other pieces of the same type that can move to the same location
+            others = [m.piece for m in board.valid_moves()
+                      if m.piece is not piece and m.piece.__class__ is piece_class and
+                      m.new_location is move.new_location]
+            prefix = ''
+            if others:
+                if all(p.location.col != piece.location.col for p in others):
+                    prefix = piece.location.col
+                elif all(p.location.row != piece.location.row for p in others):
+                    prefix = str(piece.location.row)
+                else:
+                    prefix = str(piece.location)
+            text = '{}{}{}{}'.format(SAN_LETTERS[piece_class], prefix, capture, move.new_location)
+
+    board.move(move)
+    try:
+        check, _, checkmate = board.status()
+    finally:
+        board.undo_move()
+    return text + ('#' if checkmate else '+' if check else '')
@@ -0,0 +1,470 @@
+"""
+Host many games from one process over a line protocol on a TCP or Unix socket
+
+Each line is a command and each response is a line starting with the command's kind; a connection can play any number
+of games at once.  Moves are read like the interactive game reads them (see util.input_parser.parse) and ai turns are
+searched in a bounded process pool so the event loop never waits on a search.
+
+    new [white|black|none] [depth]   start a game as the given side against the ai (none for no ai), searching at
+                                     most the server's --max-depth
+                                     -> game <id> <side> <fen>
+    move <id> <command>              play a move (e2 e4, a7 a8 q) or r, l, s, q like the interactive game
+                                     -> moved <id> <move> <fen>, moves <id> ..., score <id> <white> <black>
+    show <id>                        -> board <id> <fen>
+    close <id>                       -> closed <id>
+    stats                            -> stats <json of counters and latencies>
+    quit                             close the connection
+
+The ai answers a move with ai <id> <move> <fen> when it has searched, and a finished game sends over <id> <result>.
+Errors are sent as error [<id>] <message>.
+
+    python -m util.server --port 8765 --workers 4 --depth 2
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import os
+import random
+import time
+
+import ai.parallel
+from board import Board
+from util.enums import Player
+from util.input_parser import parse
+from util.uci import uci_move
+
+SIDES = {'white': Player.WHITE, 'black': Player.BLACK, 'none': None}
+
+
+class Latency:
+    """
+    Count of timed events with a window of the latest samples for percentiles
+    """
+    def __init__(self, window=1000):
+        """ initializer
+
+        :param window: number of latest samples kept for the percentiles
+        :return:
+        """
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = collections.deque(maxlen=window)
+
+    def add(self, seconds):
+        """ Record one event
+
+        :param seconds: time the event took
+        :return: None
+        """
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def summary(self):
+        """ Get the count, mean, percentiles of the window and maximum in milliseconds
+
+        :return: dict
+        """
+        samples = sorted(self.samples)
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3) if samples else 0
+
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+            'p99': percentile(0.99),
+            'max': round(self.max * 1000, 3),
+        }
+
+
+class Game:
+    """
+    Board hosted by the server with the side the ai plays
+    """
+    def __init__(self, id, board, ai_player, depth):
+        """ initializer
+
+        :param id: game number
+        :param board: Board
+        :param ai_player: Player the ai plays (None for no ai)
+        :param depth: depth the ai searches
+        :return:
+        """
+        self.id = id
+        self.board = board
+        self.ai_player = ai_player
+        self.depth = depth
+        self.thinking = False  # an ai turn is being searched
+        self.active = time.monotonic()  # last time the game was used
+
+    def result(self):
+        """ Get the result when the game is over
+
+        :return: '1-0', '0-1', '1/2-1/2' or None
+        """
+        check, draw, checkmate = self.board.status()
+        if checkmate:
+            return '0-1' if self.board.current_player == Player.WHITE else '1-0'
+        return '1/2-1/2' if draw else None
+
+
+def _ai_move(board_class, data, depth, seed):
+    """ Search an ai turn in a worker process
+
+    :param board_class: class of the board to decode
+    :param data: position encoded with Board.encode
+    :param depth: depth to search
+    :param seed: seed for choosing between equally good moves
+    :return: move key of the chosen move
+    """
+    return board_class.decode(data).recommended_move(depth, seed=seed).key
+
+
+class GameServer:
+    """
+    Server of many games whose ai turns are searched in worker processes
+
+    At most max_pending ai turns are searched or waiting for a worker at once; a connection that asks for another one
+    is not read from until one finishes, so clients that send faster than the workers search are slowed down instead
+    of queueing work without bound.  Games that are not used for idle_timeout seconds are removed.
+    """
+    def __init__(self, workers=None, depth=2, max_games=10000, max_pending=None, idle_timeout=300,
+                 board_class=Board, seed=None, max_depth=None):
+        """ initializer
+
+        :param workers: number of worker processes (defaults to the number of cpus)
+        :param depth: default depth the ai searches
+        :param max_games: maximum number of games hosted at once
+        :param max_pending: maximum ai turns searched or waiting at once (defaults to twice the workers)
+        :param idle_timeout: seconds after which a game that is not used is removed
+        :param board_class: class of board to play on
+        :param seed: seed for the ai's choices between equally good moves (random when None)
+        :param max_depth: deepest search a client can ask for (defaults to depth)
+        :return:
+        """
+        self.workers = workers
+        self.depth = depth
+        self.max_depth = depth if max_depth is None else max(depth, max_depth)
+        self.max_games = max_games
+        self.max_pending = 2 * (workers or os.cpu_count()) if max_pending is None else max_pending
+        self.idle_timeout = idle_timeout
+        self.board_class = board_class
+        self.games = {}
+        self.latency = collections.defaultdict(Latency)  # command or 'ai' or 'queue' to Latency
+        self.counters = collections.Counter()
+        self._ids = itertools.count(1)
+        self._rng = random.Random(seed)
+        self._slots = None  # semaphore of the ai turns, made in the server's event loop
+        self._pending = set()  # ai turn tasks
+        self._connections = {}  # tasks serving the open connections to their writers
+        self._server = None
+        self._evictor = None
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """ Start listening
+
+        :param host: host to listen on
+        :param port: TCP port (0 picks a free port, see address)
+        :param path: Unix socket path to listen on instead of TCP
+        :return: None
+        """
+        self._slots = asyncio.Semaphore(self.max_pending)
+        # start the workers before any connection is accepted: workers forked later would inherit the connections'
+        # sockets and keep them open after the server closes them
+        await asyncio.get_running_loop().run_in_executor(ai.parallel.executor(self.workers), int)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            self._server = await asyncio.start_server(self.handle, host, port)
+        self._evictor = asyncio.ensure_future(self._evict())
+
+    @property
+    def address(self):
+        """ Get the address the server listens on
+
+        :return: (host, port) or Unix socket path
+        """
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        """ Stop listening, wait for the ai turns being searched and close the connections
+
+        :return: None
+        """
+        self._evictor.cancel()
+        self._server.close()
+        if self._pending:
+            await asyncio.wait(self._pending)
+        for writer in self._connections.values():
+            writer.close()
+        if self._connections:
+            await asyncio.wait(list(self._connections))
+        await self._server.wait_closed()
+
+    async def _evict(self):
+        """ Remove games that are not used for idle_timeout seconds (runs until the server closes)
+
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(max(0.01, self.idle_timeout / 4))
+            now = time.monotonic()
+            for game in list(self.games.values()):
+                if not game.thinking and now - game.active > self.idle_timeout:
+                    del self.games[game.id]
+                    self.counters['evicted'] += 1
+
+    def stats(self):
+        """ Get the counters and latencies
+
+        :return: dict
+        """
+        return {
+            'games': len(self.games),
+            'pending': len(self._pending),
+            'counters': dict(self.counters),
+            'latency': {name: latency.summary() for name, latency in sorted(self.latency.items())},
+        }
+
+    async def handle(self, reader, writer):
+        """ Serve one connection
+
+        :param reader: StreamReader
+        :param writer: StreamWriter
+        :return: None
+        """
+        self.counters['connections'] += 1
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start = time.perf_counter()
+                words = line.decode(errors='replace').split(None, 2)
+                if not words:
+                    continue
+                if words[0] == 'quit':
+                    break
+                try:
+                    await self.command(words, writer)
+                except Exception as e:
+                    # a failing command must not end the connection and the other games on it
+                    self.counters['errors'] += 1
+                    _send(writer, 'error {}: {}'.format(e.__class__.__name__, e))
+                # wait while the client does not read its responses
+                await writer.drain()
+                self.latency[words[0]].add(time.perf_counter() - start)
+        except ConnectionError:
+            pass
+        finally:
+            del self._connections[asyncio.current_task()]
+            writer.close()
+
+    async def command(self, words, writer):
+        """ Carry out one command
+
+        :param words: command, then the game number and the rest of the line
+        :param writer: StreamWriter the responses are written to
+        :return: None
+        """
+        command = words[0]
+        self.counters[command] += 1
+        if command == 'new':
+            await self._new(words[1:], writer)
+            return
+        if command == 'stats':
+            _send(writer, 'stats ' + json.dumps(self.stats()))
+            return
+        if command not in ('move', 'show', 'close'):
+            _send(writer, "error '{}' is not a command".format(command))
+            return
+
+        game = self.games.get(words[1]) if len(words) > 1 else None
+        if game is None:
+            _send(writer, "error '{}' is not a game".format(' '.join(words[1:2])))
+            return
+        game.active = time.monotonic()
+        if command == 'show':
+            _send(writer, 'board {} {}'.format(game.id, game.board.to_fen()))
+        elif command == 'close':
+            del self.games[game.id]
+            _send(writer, 'closed {}'.format(game.id))
+        else:
+            await self._move(game, words[2] if len(words) > 2 else '', writer)
+
+    async def _new(self, arguments, writer):
+        """ Start a game (the ai moves first when it plays white)
+
+        :param arguments: side and depth
+        :param writer: StreamWriter
+        :return: None
+        """
+        if len(self.games) >= self.max_games:
+            _send(writer, 'error the server has {} games'.format(self.max_games))
+            return
+        arguments = ' '.join(arguments).split()
+        side = arguments[0] if arguments else 'white'
+        if side not in SIDES or len(arguments) > 2 or (len(arguments) == 2 and not arguments[1].isdigit()):
+            _send(writer, "error 'new' takes white, black or none and a depth")
+            return
+        depth = int(arguments[1]) if len(arguments) > 1 else self.depth
+        # a search's time grows exponentially with its depth so one client must not tie up a worker for hours
+        if not 1 <= depth <= self.max_depth:
+            _send(writer, 'error the depth must be from 1 to {}'.format(self.max_depth))
+            return
+        human = SIDES[side]
+        game = Game(str(next(self._ids)), self.board_class(), None if human is None else human.opponent(), depth)
+        self.games[game.id] = game
+        _send(writer, 'game {} {} {}'.format(game.id, side, game.board.to_fen()))
+        if game.ai_player == game.board.current_player:
+            await self._schedule(game, writer)
+
+    async def _move(self, game, text, writer):
+        """ Play a command of the interactive game
+
+        :param game: Game
+        :param text: move or command (see util.input_parser.parse)
+        :param writer: StreamWriter
+        :return: None
+        """
+        if game.thinking or game.board.current_player == game.ai_player:
+            _send(writer, 'error {} the ai is moving'.format(game.id))
+            return
+        if game.result() is not None:
+            _send(writer, 'error {} the game is over'.format(game.id))
+            return
+        try:
+            cmd = parse(game.board, text)
+        except IOError as e:
+            _send(writer, 'error {} {}'.format(game.id, e))
+            return
+        except (ValueError, KeyError):
+            # a square off the board (e.g. a9)
+            _send(writer, "error {} '{}' command is invalid".format(game.id, text.strip()))
+            return
+
+        if cmd == 'l':
+            _send(writer, 'moves {} {}'.format(game.id, ' '.join(uci_move(m) for m in game.board.valid_moves())))
+            return
+        if cmd == 's':
+            _send(writer, 'score {} {} {}'.format(game.id, game.board.score(Player.WHITE),
+                                                  game.board.score(Player.BLACK)))
+            return
+        if cmd == 'q':
+            del self.games[game.id]
+            _send(writer, 'closed {}'.format(game.id))
+            return
+
+        move = game.board.random_move() if cmd == 'r' else cmd
+        game.board.move(move)
+        _send(writer, 'moved {} {} {}'.format(game.id, uci_move(move), game.board.to_fen()))
+        if not self._over(game, writer) and game.board.current_player == game.ai_player:
+            await self._schedule(game, writer)
+
+    async def _schedule(self, game, writer):
+        """ Search the ai turn of a game in a worker process once an ai slot is free
+
+        :param game: Game
+        :param writer: StreamWriter the ai's move is sent to
+        :return: None
+        """
+        game.thinking = True
+        # back-pressure: the connection is not read while every ai slot is taken
+        start = time.perf_counter()
+        await self._slots.acquire()
+        self.latency['queue'].add(time.perf_counter() - start)
+        task = asyncio.ensure_future(self._ai_turn(game, writer))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        task.add_done_callback(lambda _: self._slots.release())
+        self.counters['peak pending'] = max(self.counters['peak pending'], len(self._pending))
+
+    async def _ai_turn(self, game, writer):
+        """ Search and play an ai turn (holds an ai slot that is released when the task is done)
+
+        :param game: Game
+        :param writer: StreamWriter
+        :return: None
+        """
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            key = await loop.run_in_executor(ai.parallel.executor(self.workers), _ai_move, self.board_class,
+                                             game.board.encode(), game.depth, self._rng.getrandbits(32))
+        except Exception as e:
+            _send(writer, 'error {} the ai failed: {}'.format(game.id, e))
+            return
+        finally:
+            game.thinking = False
+            game.active = time.monotonic()
+        self.latency['ai'].add(time.perf_counter() - start)
+        self.counters['ai moves'] += 1
+        move = game.board.move_from_key(key)
+        game.board.move(move)
+        if game.id in self.games and not writer.is_closing():
+            _send(writer, 'ai {} {} {}'.format(game.id, uci_move(move), game.board.to_fen()))
+            self._over(game, writer)
+
+    def _over(self, game, writer):
+        """ Tell the client when the game is over
+
+        :param game: Game
+        :param writer: StreamWriter
+        :return: boolean if the game is over
+        """
+        result = game.result()
+        if result is not None:
+            self.counters['games over'] += 1
+            _send(writer, 'over {} {}'.format(game.id, result))
+        return result is not None
+
+
+def _send(writer, line):
+    """ Write a response line
+
+    :param writer: StreamWriter
+    :param line: str
+    :return: None
+    """
+    writer.write(line.encode() + b'\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='host to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port to listen on')
+    parser.add_argument('--unix', help='Unix socket path to listen on instead of TCP')
+    parser.add_argument('--workers', type=int, help='number of worker processes searching ai turns (default cpus)')
+    parser.add_argument('--depth', type=int, default=2, help='default depth the ai searches')
+    parser.add_argument('--max-depth', type=int, help='deepest search a client can ask for (default --depth)')
+    parser.add_argument('--max-games', type=int, default=10000, help='maximum number of games hosted at once')
+    parser.add_argument('--max-pending', type=int, help='maximum ai turns at once (default twice the workers)')
+    parser.add_argument('--idle', type=float, default=300, help='seconds after which an unused game is removed')
+    args = parser.parse_args()
+
+    async def serve():
+        server = GameServer(args.workers, args.depth, args.max_games, args.max_pending, args.idle,
+                            max_depth=args.max_depth)
+        await server.start(args.host, args.port, args.unix)
+        print('listening on {}'.format(server.address), flush=True)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,419 @@
+"""
+Universal Chess Interface engine so GUIs and match managers can drive the minimax ai
+
+Commands are read on the main thread while the search runs on a worker thread, so stop, ponderhit and isready are
+answered during a search.  The search deepens iteratively and sends an info line after every completed depth.
+
+    python -m util.uci
+"""
+import sys
+import threading
+import time
+
+from ai.book import OpeningBook
+from ai.minimax import Quiescence, MoveOrdering, SearchStats, SearchTimeout, iterative_deepening, principal_variation
+from ai.tablebase import Tablebases
+from ai.transposition import TranspositionTable
+from board import Board, evaluation
+from piece import Queen, Rook, Bishop, Knight
+from util.enums import Player
+
+NAME = 'command-line-chess'
+AUTHOR = 'command-line-chess contributors'
+PROMOTIONS = {Queen: 'q', Rook: 'r', Bishop: 'b', Knight: 'n'}
+CHECKMATE = 1000000  # heuristic value of a checkmate before it is divided by the depth
+MOVES_TO_GO = 30  # moves the remaining time is split between when the GUI does not say
+MOVE_OVERHEAD = 0.05  # seconds kept back from each move for the GUI and the process to respond
+
+# name: (type, default, minimum, maximum)
+OPTIONS = {
+    'Hash': ('spin', 16, 1, 1024),
+    'Quiescence': ('spin', 8, 0, 32),
+    'Ponder': ('check', False, None, None),
+    'BookFile': ('string', '', None, None),
+    'TablebasePath': ('string', '', None, None),
+}
+
+
+def uci_move(move):
+    """ Write a move in the long algebraic notation of UCI (e.g. e2e4, e1g1 for castling and e7e8q)
+
+    :param move: Move class
+    :return: str
+    """
+    text = '{}{}'.format(move.old_location, move.new_location)
+    return text + PROMOTIONS[move.promotion_piece_class] if move.promotion else text
+
+
+def parse_move(board, text):
+    """ Find the valid move written in UCI notation
+
+    :param board: Board class
+    :param text: str
+    :return: Move
+    """
+    for move in list(board.valid_moves()):
+        if uci_move(move) == text.lower():
+            return move
+    raise ValueError("'{}' is not a valid move".format(text))
+
+
+def allocate(remaining, increment=0, moves_to_go=None):
+    """ Decide how long to search a move from the clock
+
+    :param remaining: milliseconds left on the clock
+    :param increment: milliseconds added after each move
+    :param moves_to_go: moves until the next time control (defaults to MOVES_TO_GO)
+    :return: seconds
+    """
+    seconds = remaining / 1000 / (moves_to_go or MOVES_TO_GO) + increment / 1000 * 3 / 4
+    return max(0.0, min(seconds, remaining / 1000 / 2) - MOVE_OVERHEAD)
+
+
+def score_text(score, depth):
+    """ Write a search score as a UCI score
+
+    Scores of positions at the horizon are divided by their depth plus one, so the score is multiplied back before it
+    is converted to centipawns.  A checkmate found by the search is given in moves.
+
+    :param score: score for the side to move
+    :param depth: depth of the search
+    :return: str
+    """
+    if score:
+        plies = round(CHECKMATE / abs(score)) - 1
+        if plies <= depth and abs(abs(score) * (plies + 1) - CHECKMATE) < CHECKMATE / 100:
+            return 'mate {}'.format((plies + 1) // 2 if score > 0 else -(plies // 2))
+    return 'cp {}'.format(round(score * (depth + 1) * 100 / evaluation.MATERIAL_WEIGHT))
+
+
+class Limits:
+    """
+    Limits of a search given by the go command
+    """
+    def __init__(self, depth=None, movetime=None, nodes=None, wtime=None, btime=None, winc=0, binc=0,
+                 movestogo=None, infinite=False, ponder=False):
+        """ initializer
+
+        :param depth: maximum depth to search
+        :param movetime: milliseconds to search for
+        :param nodes: maximum nodes to search
+        :param wtime: milliseconds left on white's clock
+        :param btime: milliseconds left on black's clock
+        :param winc: white's increment in milliseconds
+        :param binc: black's increment in milliseconds
+        :param movestogo: moves until the next time control
+        :param infinite: search until stopped
+        :param ponder: search the opponent's time until ponderhit or stop
+        :return:
+        """
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+        self.wtime = wtime
+        self.btime = btime
+        self.winc = winc
+        self.binc = binc
+        self.movestogo = movestogo
+        self.infinite = infinite
+        self.ponder = ponder
+
+    @classmethod
+    def from_tokens(cls, tokens):
+        """ Read the arguments of a go command (unknown arguments and missing or non-integer values are skipped)
+
+        :param tokens: list of str after go
+        :return: Limits
+        """
+        limits = cls()
+        tokens = list(tokens)
+        for i, token in enumerate(tokens):
+            if token in ('infinite', 'ponder'):
+                setattr(limits, token, True)
+            elif token in ('depth', 'movetime', 'nodes', 'wtime', 'btime', 'winc', 'binc', 'movestogo'):
+                try:
+                    setattr(limits, token, int(tokens[i + 1]))
+                except (IndexError, ValueError):
+                    pass
+        return limits
+
+    def seconds(self, white):
+        """ Get the time to search for
+
+        :param white: boolean if white is to move
+        :return: seconds or None for no limit
+        """
+        if self.movetime is not None:
+            return self.movetime / 1000
+        remaining, increment = (self.wtime, self.winc) if white else (self.btime, self.binc)
+        if remaining is None:
+            return None
+        return allocate(remaining, increment, self.movestogo)
+
+
+class Engine:
+    """
+    State of the UCI engine: the options, the current position and the search thread
+    """
+    def __init__(self, output=sys.stdout, board_class=Board):
+        """ initializer
+
+        :param output: file the responses are written to
+        :param board_class: class of board to search on
+        :return:
+        """
+        self.output = output
+        self.board_class = board_class
+        self.board = board_class.from_fen(board_class.START_FEN)
+        self.options = {name: default for name, (_, default, _, _) in OPTIONS.items()}
+        self.table = TranspositionTable(self.options['Hash'])
+        self.book = None
+        self.tablebases = None
+        self._lock = threading.Lock()  # one line is written at a time
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._pondering = False
+        self._waiting = False  # infinite search that waits for stop after it completes
+        self._deadline = None
+        self._seconds = None  # time to search for once pondering ends
+        self._nodes = None
+        self._completed = False  # the search has a move to play
+        self._stats = None  # SearchStats of the running search
+
+    def send(self, line):
+        """ Write a line to the GUI
+
+        :param line: str
+        :return: None
+        """
+        with self._lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def handle(self, line):
+        """ Carry out a command
+
+        :param line: command line
+        :return: False after quit, otherwise True
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        try:
+            if command == 'uci':
+                self.send('id name ' + NAME)
+                self.send('id author ' + AUTHOR)
+                for name, (kind, default, minimum, maximum) in OPTIONS.items():
+                    if kind == 'spin':
+                        self.send('option name {} type spin default {} min {} max {}'.format(
+                            name, default, minimum, maximum))
+                    elif kind == 'check':
+                        self.send('option name {} type check default {}'.format(name, str(default).lower()))
+                    else:
+                        self.send('option name {} type string default {}'.format(name, default or '<empty>'))
+                self.send('uciok')
+            elif command == 'isready':
+                self.send('readyok')
+            elif command == 'setoption':
+                self.stop()
+                self.set_option(arguments)
+            elif command == 'ucinewgame':
+                self.stop()
+                self.table.clear()
+            elif command == 'position':
+                self.stop()
+                self.set_position(arguments)
+            elif command == 'go':
+                self.stop()
+                self.go(Limits.from_tokens(arguments))
+            elif command == 'stop':
+                self.stop()
+            elif command == 'ponderhit':
+                self.ponderhit()
+            elif command == 'quit':
+                self.stop()
+                return False
+            elif command not in ('debug', 'register'):
+                self.send('info string unknown command ' + command)
+        except (ValueError, OSError) as e:
+            # a bad argument or a book or tablebase file that can't be opened
+            self.send('info string {}'.format(e))
+        return True
+
+    def set_option(self, arguments):
+        """ Set an option from the arguments of a setoption command
+
+        :param arguments: list of str (name <name> [value <value>])
+        :return: None
+        """
+        text = ' '.join(arguments)
+        name, _, value = text.partition(' value ')
+        name = name.replace('name', '', 1).strip()
+        if name not in OPTIONS:
+            raise ValueError("'{}' is not an option".format(name))
+        kind, _, minimum, maximum = OPTIONS[name]
+        value = value.strip()
+        if kind == 'spin':
+            value = min(max(int(value), minimum), maximum)
+        elif kind == 'check':
+            value = value.lower() == 'true'
+        elif value == '<empty>':
+            value = ''
+        self.options[name] = value
+
+        if name == 'Hash':
+            self.table = TranspositionTable(value)
+        elif name == 'BookFile':
+            if self.book is not None:
+                self.book.close()
+            self.book = OpeningBook(value) if value else None
+        elif name == 'TablebasePath':
+            if self.tablebases is not None:
+                self.tablebases.close()
+            self.tablebases = Tablebases(value) if value else None
+
+    def set_position(self, arguments):
+        """ Set up the position from the arguments of a position command
+
+        :param arguments: list of str (startpos or fen <fen>, then optionally moves <move>...)
+        :return: None
+        """
+        moves = arguments.index('moves') if 'moves' in arguments else len(arguments)
+        if arguments[:1] == ['startpos']:
+            fen = self.board_class.START_FEN
+        elif arguments[:1] == ['fen']:
+            fen = ' '.join(arguments[1:moves])
+        else:
+            raise ValueError('position needs startpos or fen')
+        board = self.board_class.from_fen(fen)
+        for text in arguments[moves + 1:]:
+            board.move(parse_move(board, text))
+        self.board = board
+
+    def go(self, limits):
+        """ Start searching the current position on the search thread
+
+        :param limits: Limits
+        :return: None
+        """
+        seconds = limits.seconds(self.board.current_player == Player.WHITE)
+        with self._condition:
+            self._stopped = False
+            self._pondering = limits.ponder
+            self._waiting = limits.infinite
+            self._seconds = seconds
+            self._deadline = None if seconds is None or limits.ponder else time.monotonic() + seconds
+            self._nodes = limits.nodes
+            self._completed = False
+        self._thread = threading.Thread(target=self._search, args=(limits,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the search (it sends its best move) and wait for the search thread
+
+        :return: None
+        """
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def wait(self):
+        """ Wait for a search that ends by itself (a depth, time or node limit) to send its best move
+
+        :return: None
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def ponderhit(self):
+        """ The opponent played the expected move so keep searching on the clock
+
+        :return: None
+        """
+        with self._condition:
+            if self._pondering:
+                self._pondering = False
+                self._deadline = None if self._seconds is None else time.monotonic() + self._seconds
+                self._condition.notify_all()
+
+    def _check(self, game, depth, alpha, beta):
+        """ Stop the search once it has a move and it is told to stop or runs out of time or nodes
+
+        :param game: board being searched
+        :param depth: current depth in tree
+        :param alpha: minimum score maximizing player will get
+        :param beta: maximum score minimizing player will get
+        :return: None
+        """
+        if not self._completed:
+            return
+        if self._stopped or (self._deadline is not None and time.monotonic() >= self._deadline) or \
+                (self._nodes is not None and self._stats.nodes >= self._nodes):
+            raise SearchTimeout()
+
+    def _search(self, limits):
+        """ Search the current position and send the best move (runs on the search thread)
+
+        :param limits: Limits
+        :return: None
+        """
+        board = self.board
+        start = time.perf_counter()
+        best = []
+        # the best move is sent even if the search fails so the GUI is not left waiting for it
+        try:
+            move = None
+            if self.book is not None:
+                move = self.book.choose(board, 0)
+            if move is None and self.tablebases is not None:
+                found = self.tablebases.best_moves(board)
+                move = min(found, key=lambda m: m.key) if found else None
+            if move is not None:
+                best = [move]
+            elif any(True for _ in board.valid_moves()):
+                quiescence = Quiescence(self.options['Quiescence'])
+                self._stats = SearchStats(on_enter=self._check)
+                self.table.new_search()
+
+                def report(depth, score, moves):
+                    nodes = self._stats.nodes + quiescence.nodes
+                    seconds = time.perf_counter() - start
+                    pv = principal_variation(board, self.table, depth) or moves[:1]
+                    self.send('info depth {} score {} nodes {} nps {} time {} pv {}'.format(
+                        depth, score_text(score, depth), nodes, int(nodes / seconds) if seconds else 0,
+                        int(seconds * 1000), ' '.join(uci_move(m) for m in pv)))
+                    best[:] = pv
+                    self._completed = True
+
+                iterative_deepening(board, board.current_player, limits.depth, None, self.table, MoveOrdering(),
+                                    quiescence, self._stats, self.tablebases, on_iteration=report)
+        finally:
+            # an infinite search or a ponder search waits to be told before it answers
+            with self._condition:
+                self._condition.wait_for(lambda: self._stopped or not (self._waiting or self._pondering))
+            if not best:
+                self.send('bestmove 0000')
+            elif len(best) > 1 and self.options['Ponder']:
+                self.send('bestmove {} ponder {}'.format(uci_move(best[0]), uci_move(best[1])))
+            else:
+                self.send('bestmove ' + uci_move(best[0]))
+
+
+def main():
+    engine = Engine()
+    # commands are read here while the search runs on its own thread
+    for line in iter(sys.stdin.readline, ''):
+        if not engine.handle(line):
+            break
+    engine.stop()
+
+
+if __name__ == '__main__':
+    main()
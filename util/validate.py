@@ -0,0 +1,161 @@
+"""
+Replay the games of PGN files in worker processes checking that every move is legal, writing one JSON result per game
+(in the order the games are read) and optionally the positions reached
+
+    python -m util.validate games.pgn more.pgn --workers 4 --output results.jsonl --positions positions.fen
+"""
+import argparse
+import collections
+import itertools
+import json
+import sys
+import time
+import traceback
+
+import ai.parallel
+from board import Board, BitBoard
+from util.pgn import open_games, PGNError
+
+BOARDS = {'Board': Board, 'BitBoard': BitBoard}
+
+
+def validate_game(game, board_class=Board, every=0):
+    """ Replay a game checking every move
+
+    :param game: Game
+    :param board_class: class of board to replay on
+    :param every: extract the position after every this many moves (0 for none)
+    :return: dict of results (valid is False with the error for a bad game and None with the traceback in failure
+             when replaying fails inside the engine)
+    """
+    moves = 0
+    positions = []
+    board = None
+    error = None
+    failure = None
+    status = None
+    try:
+        for board, _, _ in game.replay(board_class):
+            moves += 1
+            if every and moves % every == 0:
+                positions.append(board.to_fen())
+        if board is not None:
+            check, draw, checkmate = board.status()
+            status = 'checkmate' if checkmate else 'stalemate' if draw else None
+    except PGNError as e:
+        error = str(e)
+    except ValueError as e:
+        # a bad FEN tag
+        error = 'game at line {}: {}'.format(game.line, e)
+    except Exception:
+        # anything else is a bug in the engine rather than a bad game: report it apart so it is not hidden
+        failure = 'game at line {}: {}'.format(game.line, traceback.format_exc())
+    return {
+        'line': game.line,
+        'white': game.headers.get('White'),
+        'black': game.headers.get('Black'),
+        'result': game.result,
+        'moves': moves,
+        'valid': None if failure is not None else error is None,
+        'error': error,
+        'failure': failure,
+        'status': status,
+        'fen': None if board is None else board.to_fen(),
+        'positions': positions,
+    }
+
+
+def _validate_games(board_class, games, every):
+    """ Validate a chunk of games in a worker process
+
+    :param board_class: class of board to replay on
+    :param games: list of (index, file, Game)
+    :param every: extract the position after every this many moves (0 for none)
+    :return: list of dicts of results
+    """
+    results = []
+    for index, path, game in games:
+        result = validate_game(game, board_class, every)
+        result['index'] = index
+        result['file'] = path
+        results.append(result)
+    return results
+
+
+def validate(paths, workers=None, board_class=Board, every=0, chunk_size=64):
+    """ Validate the games of PGN files split into chunks between worker processes
+
+    Games are read one at a time and only a few chunks per worker are waiting at once so memory does not grow with
+    the number of games; results are yielded in the order the games are read whichever worker finishes first.
+
+    :param paths: list of paths of PGN files
+    :param workers: number of worker processes (validates in this process when None)
+    :param board_class: class of board to replay on
+    :param every: extract the position after every this many moves (0 for none)
+    :param chunk_size: number of games sent to a worker at once
+    :return: generator of dicts of results with the index of the game and the file it is from
+    """
+    games = enumerate((path, game) for path in paths for game in open_games(path))
+    chunks = iter(lambda: [(index, path, game) for index, (path, game) in itertools.islice(games, chunk_size)], [])
+    if workers is None:
+        for chunk in chunks:
+            yield from _validate_games(board_class, chunk, every)
+        return
+
+    pool = ai.parallel.executor(workers)
+    pending = collections.deque()
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(_validate_games, board_class, chunk, every))
+            # keep two chunks per worker waiting so the workers stay busy while results are written
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='PGN files')
+    parser.add_argument('--workers', type=int, help='number of worker processes (default validate in this process)')
+    parser.add_argument('--board', choices=sorted(BOARDS), default='Board', help='board class to replay on')
+    parser.add_argument('--chunk-size', type=int, default=64, help='number of games sent to a worker at once')
+    parser.add_argument('--output', help='write the results to this file as JSON lines (default stdout)')
+    parser.add_argument('--positions', help='write the extracted positions to this file as FEN lines')
+    parser.add_argument('--every', type=int, default=1,
+                        help='extract the position after every this many moves (with --positions)')
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    positions = None if args.positions is None else open(args.positions, 'w')
+    games = invalid = failed = moves = 0
+    start = time.perf_counter()
+    try:
+        for result in validate(args.paths, args.workers, BOARDS[args.board], args.every if positions else 0,
+                               args.chunk_size):
+            games += 1
+            moves += result['moves']
+            invalid += result['valid'] is False
+            failed += result['failure'] is not None
+            if positions is not None:
+                positions.writelines(fen + '\n' for fen in result['positions'])
+            del result['positions']
+            output.write(json.dumps(result) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if positions is not None:
+            positions.close()
+    seconds = time.perf_counter() - start
+    print('{} games ({} invalid, {} failed), {} moves in {:.2f} seconds: {:.0f} games/sec, {:.0f} moves/sec'.format(
+        games, invalid, failed, moves, seconds, games / seconds if seconds else 0, moves / seconds if seconds else 0),
+        file=sys.stderr)
+    if invalid or failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()